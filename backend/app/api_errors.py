@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-from typing import Any, Optional
+from typing import Any, Optional, Tuple
 
 from fastapi import HTTPException, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 
 def _request_id(request: Request) -> Optional[str]:
@@ -85,8 +86,8 @@ def _extract_pgcode(exc: IntegrityError | SQLAlchemyError) -> Optional[str]:
     return getattr(orig, "pgcode", None)
 
 
-def handle_integrity_error(request: Request, exc: IntegrityError) -> JSONResponse:
-    rid = _request_id(request)
+def describe_integrity_error(exc: IntegrityError) -> Tuple[int, str, str, dict[str, Any]]:
+    """HTTP-статус, код, сообщение и подробности (pgcode, constraint) для ошибки целостности."""
     pgcode = _extract_pgcode(exc)
     constraint = _extract_constraint_name(exc)
 # PostgreSQL error codes: https://www.postgresql.org/docs/current/errcodes-appendix.html
@@ -116,7 +117,12 @@ def handle_integrity_error(request: Request, exc: IntegrityError) -> JSONRespons
         details["pgcode"] = pgcode
     if constraint:
         details["constraint"] = constraint
+    return status_code, code, message, details
 
+
+def handle_integrity_error(request: Request, exc: IntegrityError) -> JSONResponse:
+    rid = _request_id(request)
+    status_code, code, message, details = describe_integrity_error(exc)
     return JSONResponse(
         status_code=status_code,
         content=error_payload(code=code, message=message, request_id=rid, details=details or None),
@@ -131,9 +137,17 @@ def handle_sqlalchemy_error(request: Request, exc: SQLAlchemyError) -> JSONRespo
         details["pgcode"] = pgcode
     details["type"] = exc.__class__.__name__
 
+    if isinstance(exc, PoolTimeoutError):
+        # Все соединения пула заняты дольше DB_POOL_TIMEOUT
+        status_code, code, message = 503, "DB_POOL_TIMEOUT", "Нет свободных соединений с базой данных"
+    elif pgcode == "57014":  # query_canceled (statement_timeout)
+        status_code, code, message = 504, "DB_STATEMENT_TIMEOUT", "Превышено время выполнения запроса"
+    else:
+        status_code, code, message = 500, "DB_ERROR", "Ошибка базы данных"
+
     return JSONResponse(
-        status_code=500,
-        content=error_payload(code="DB_ERROR", message="Ошибка базы данных", request_id=rid, details=details or None),
+        status_code=status_code,
+        content=error_payload(code=code, message=message, request_id=rid, details=details or None),
     )
 
 
@@ -145,4 +159,14 @@ def handle_unexpected_error(request: Request, exc: Exception) -> JSONResponse:
     )
 
 
-
+def statement_budget_exceeded(request: Request, statements: int, budget: int, route: Optional[str]) -> JSONResponse:
+    rid = _request_id(request)
+    return JSONResponse(
+        status_code=500,
+        content=error_payload(
+            code="SQL_STATEMENT_BUDGET_EXCEEDED",
+            message="Запрос выполнил больше SQL-операторов, чем допускает SQL_STATEMENT_BUDGET (возможен N+1)",
+            request_id=rid,
+            details={"statements": statements, "budget": budget, "route": route},
+        ),
+    )
@@ -0,0 +1,115 @@
+"""Перенос очереди аудита (screentime.audit_queue) в audit_log.
+
+При AUDIT_ASYNC=true триггеры аудита только дописывают события в нежурналируемую очередь
+без индексов; фоновая задача раз в AUDIT_DRAIN_INTERVAL_SECONDS переносит их пачками по
+AUDIT_DRAIN_BATCH_SIZE строк (screentime.fn_drain_audit_queue), каждую пачку — отдельной
+короткой транзакцией. Несколько процессов приложения могут переносить очередь одновременно
+(SKIP LOCKED). Без фоновой задачи очередь переносит app.scripts.drain_audit_queue (cron).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from .config import get_settings
+from .db import async_engine
+
+logger = logging.getLogger(__name__)
+
+DRAIN_SQL = text("SELECT screentime.fn_drain_audit_queue(:batch)")
+QUEUE_LENGTH_SQL = text("SELECT count(*) FROM screentime.audit_queue")
+
+
+# Наибольшая пауза между попытками переноса после ошибок подряд, с
+MAX_BACKOFF_SECONDS = 60
+
+
+class AuditDrainer:
+    """Фоновая задача переноса очереди аудита и ее счетчики."""
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.runs = 0
+        self.drained = 0
+        self.last_drained_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def drain(self) -> int:
+        """Переносит очередь, пока пачки заполнены целиком; возвращает число перенесенных событий."""
+        total = 0
+        while True:
+            async with async_engine.begin() as conn:
+                moved = (await conn.execute(DRAIN_SQL, {"batch": self.batch_size})).scalar_one()
+            total += moved
+            if moved < self.batch_size:
+                break
+        self.runs += 1
+        self.drained += total
+        self.last_drained_at = time.monotonic()
+        self.error = None
+        return total
+
+    async def _run(self) -> None:
+        # Любая ошибка не останавливает задачу: иначе UNLOGGED-очередь растет без ограничения.
+        # После ошибок подряд пауза удваивается до MAX_BACKOFF_SECONDS
+        failures = 0
+        while True:
+            await asyncio.sleep(min(self.interval * 2 ** min(failures, 16), max(self.interval, MAX_BACKOFF_SECONDS)))
+            try:
+                await self.drain()
+                failures = 0
+            except (SQLAlchemyError, OSError) as e:
+                failures += 1
+                self.error = f"{type(e).__name__}: {e}"
+                logger.warning("Could not drain audit queue: %s", e)
+            except Exception as e:  # noqa: BLE001
+                failures += 1
+                self.error = f"{type(e).__name__}: {e}"
+                logger.exception("Unexpected error while draining audit queue")
+
+    def start(self) -> None:
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="audit-drainer")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # События, накопленные с последнего переноса
+        try:
+            await self.drain()
+        except Exception as e:  # noqa: BLE001
+            logger.warning("Could not drain audit queue on shutdown: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "interval_seconds": self.interval,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "drained": self.drained,
+            "seconds_since_drain": round(time.monotonic() - self.last_drained_at, 3) if self.last_drained_at else None,
+            "error": self.error,
+        }
+
+
+_settings = get_settings()
+
+audit_drainer = AuditDrainer(_settings.audit_drain_interval_seconds, _settings.audit_drain_batch_size)
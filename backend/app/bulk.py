@@ -0,0 +1,219 @@
+"""Массовые операции со справочниками: создание (upsert), обновление и удаление списком.
+
+Все элементы запроса обрабатываются в одной транзакции несколькими многострочными
+операторами вместо отдельного запроса и commit на каждый элемент:
+
+- ссылки (department_id и т.п.) и дубликаты внутри запроса проверяются заранее,
+  по одному запросу на поле;
+- создание — один ``INSERT ... ON CONFLICT (ключ) ... RETURNING``;
+- обновление — UPDATE по первичному ключу (executemany) и один SELECT результата;
+- удаление — один ``DELETE ... WHERE id IN (...) RETURNING id``.
+
+Ошибки отдельных элементов возвращаются в ответе, корректные элементы сохраняются.
+Если многострочный оператор нарушает ограничение, не проверенное заранее (например,
+уникальность hostname в отделе или RESTRICT при удалении), элементы повторяются
+по одному в точках сохранения (SAVEPOINT), чтобы найти ошибочные.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import delete, literal_column, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from .api_errors import describe_integrity_error
+from .config import get_settings
+
+
+@dataclass(frozen=True)
+class BulkSpec:
+    model: Any
+    # Уникальное поле для ON CONFLICT (email, inventory_number, code)
+    key: str
+    # Поле -> модель, на первичный ключ которой оно ссылается
+    references: Mapping[str, Any] = field(default_factory=dict)
+
+    @property
+    def table(self):
+        return self.model.__table__
+
+
+class BulkOutcome:
+    """Результаты по элементам запроса (в порядке элементов) и итоговые счетчики."""
+
+    def __init__(self, size: int):
+        self.items: List[Optional[Dict[str, Any]]] = [None] * size
+
+    def pending(self, indexes: Optional[Iterable[int]] = None) -> List[int]:
+        indexes = range(len(self.items)) if indexes is None else indexes
+        return [i for i in indexes if self.items[i] is None]
+
+    def set(self, index: int, status: str, row: Optional[Mapping[str, Any]] = None, id: Optional[int] = None) -> None:
+        data = {k: v for k, v in row.items() if k != "inserted"} if row is not None else None
+        self.items[index] = {"index": index, "status": status, "id": row["id"] if row is not None else id, "data": data}
+
+    def fail(self, index: int, code: str, message: str, id: Optional[int] = None) -> None:
+        self.items[index] = {"index": index, "status": "failed", "id": id, "error": {"code": code, "message": message}}
+
+    def ids(self, *statuses: str) -> List[int]:
+        return [item["id"] for item in self.items if item is not None and item["status"] in statuses]
+
+    def response(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"created": 0, "updated": 0, "skipped": 0, "deleted": 0, "failed": 0}
+        for item in self.items:
+            result[item["status"]] += 1
+        result["items"] = self.items
+        return result
+
+
+def check_size(count: int) -> None:
+    max_items = get_settings().bulk_max_items
+    if count > max_items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many items: {count} (max {max_items})",
+        )
+
+
+def _check_duplicates(values: Sequence[Any], name: str, outcome: BulkOutcome) -> None:
+    seen: Dict[Any, int] = {}
+    for i in outcome.pending():
+        value = values[i]
+        if value is None:
+            continue
+        if value in seen:
+            outcome.fail(i, "DUPLICATE_IN_REQUEST", f"{name} {value!r} duplicates item {seen[value]}")
+        else:
+            seen[value] = i
+
+
+def _check_references(db: Session, spec: BulkSpec, rows: Sequence[Mapping[str, Any]], outcome: BulkOutcome) -> None:
+    for name, target in spec.references.items():
+        values = {rows[i][name] for i in outcome.pending() if rows[i].get(name) is not None}
+        if not values:
+            continue
+        existing = set(db.scalars(select(target.id).where(target.id.in_(values))))
+        for i in outcome.pending():
+            value = rows[i].get(name)
+            if value is not None and value not in existing:
+                outcome.fail(i, "FOREIGN_KEY_VIOLATION", f"{name} {value} does not exist")
+
+
+def _run_isolated(db: Session, indexes: List[int], run: Callable[[List[int]], None], outcome: BulkOutcome) -> None:
+    """run(indexes) в точке сохранения; при ошибке целостности или данных — повтор по одному элементу."""
+    if not indexes:
+        return
+    try:
+        with db.begin_nested():
+            run(indexes)
+        return
+    except IntegrityError as e:
+        if len(indexes) == 1:
+            _, code, message, details = describe_integrity_error(e)
+            if details.get("constraint"):
+                message = f"{message} ({details['constraint']})"
+            outcome.fail(indexes[0], code, message)
+            return
+    except DataError as e:
+        # Значение не помещается в тип колонки (22001, 22003 и т. п.): валится только этот элемент
+        if len(indexes) == 1:
+            diag = getattr(e.orig, "diag", None)
+            outcome.fail(indexes[0], "DATA_ERROR", getattr(diag, "message_primary", None) or "Invalid data value")
+            return
+    for index in indexes:
+        _run_isolated(db, [index], run, outcome)
+
+
+def bulk_create(db: Session, spec: BulkSpec, items: Sequence[BaseModel], on_conflict: str) -> BulkOutcome:
+    table = spec.table
+    key = table.c[spec.key]
+    rows = [item.model_dump() for item in items]
+    outcome = BulkOutcome(len(rows))
+    _check_duplicates([row[spec.key] for row in rows], spec.key, outcome)
+    _check_references(db, spec, rows, outcome)
+
+    def run(indexes: List[int]) -> None:
+        stmt = insert(table).values([rows[i] for i in indexes])
+        if on_conflict == "update":
+            # VALUES — полные строки со значениями по умолчанию, а SET — только поля, переданные клиентом:
+            # иначе, например, is_active=True по умолчанию снова активировал бы выключенную запись
+            columns = set().union(*(items[i].model_fields_set for i in indexes)) - {spec.key}
+            stmt = stmt.on_conflict_do_update(index_elements=[key], set_={c: stmt.excluded[c] for c in columns})
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=[key])
+        # xmax = 0 — строка вставлена, иначе обновлена через ON CONFLICT DO UPDATE
+        returned = db.execute(stmt.returning(*table.c, literal_column("xmax = 0").label("inserted"))).mappings().all()
+
+        by_key = {row[spec.key]: row for row in returned if row[spec.key] is not None}
+        # Строки без ключа (NULL email) не конфликтуют и вставляются все; id выдаются в порядке VALUES
+        keyless = iter(sorted((row for row in returned if row[spec.key] is None), key=lambda row: row["id"]))
+        conflicts = []
+        for i in indexes:
+            value = rows[i][spec.key]
+            row = next(keyless) if value is None else by_key.get(value)
+            if row is None:
+                conflicts.append(i)
+            else:
+                outcome.set(i, "created" if row["inserted"] else "updated", row)
+        if not conflicts:
+            return
+
+        existing = dict(db.execute(select(key, table.c.id).where(key.in_([rows[i][spec.key] for i in conflicts]))).all())
+        for i in conflicts:
+            value = rows[i][spec.key]
+            if on_conflict == "skip":
+                outcome.set(i, "skipped", id=existing.get(value))
+            else:
+                outcome.fail(i, "UNIQUE_VIOLATION", f"{spec.key} {value!r} already exists", id=existing.get(value))
+
+    _run_isolated(db, outcome.pending(), run, outcome)
+    return outcome
+
+
+def bulk_update(db: Session, spec: BulkSpec, items: Sequence[BaseModel]) -> BulkOutcome:
+    table = spec.table
+    rows = [item.model_dump(exclude_unset=True) for item in items]
+    outcome = BulkOutcome(len(rows))
+    _check_duplicates([row["id"] for row in rows], "id", outcome)
+    existing = set(db.scalars(select(table.c.id).where(table.c.id.in_([row["id"] for row in rows]))))
+    for i in outcome.pending():
+        if rows[i]["id"] not in existing:
+            outcome.fail(i, "NOT_FOUND", f"id {rows[i]['id']} not found")
+    _check_references(db, spec, rows, outcome)
+
+    def run(indexes: List[int]) -> None:
+        changes = [rows[i] for i in indexes if len(rows[i]) > 1]
+        if changes:
+            # ORM UPDATE по первичному ключу: executemany, элементы с разным набором полей группируются
+            db.execute(update(spec.model), changes)
+        ids = [rows[i]["id"] for i in indexes]
+        fetched = {row["id"]: row for row in db.execute(select(table).where(table.c.id.in_(ids))).mappings()}
+        for i in indexes:
+            outcome.set(i, "updated", fetched[rows[i]["id"]])
+
+    _run_isolated(db, outcome.pending(), run, outcome)
+    return outcome
+
+
+def bulk_delete(db: Session, spec: BulkSpec, ids: Sequence[int]) -> BulkOutcome:
+    table = spec.table
+    outcome = BulkOutcome(len(ids))
+    _check_duplicates(ids, "id", outcome)
+
+    def run(indexes: List[int]) -> None:
+        stmt = delete(table).where(table.c.id.in_([ids[i] for i in indexes])).returning(table.c.id)
+        deleted = set(db.scalars(stmt))
+        for i in indexes:
+            if ids[i] in deleted:
+                outcome.set(i, "deleted", id=ids[i])
+            else:
+                outcome.fail(i, "NOT_FOUND", f"id {ids[i]} not found")
+
+    _run_isolated(db, outcome.pending(), run, outcome)
+    return outcome
@@ -0,0 +1,227 @@
+"""Кэш ответов отчетных эндпоинтов (TTL + LRU) в памяти процесса.
+
+Ключ — имя отчета и нормализованные параметры запроса. Каждая запись помечена
+периодом дат и, если отчет относится к одному сотруднику, его id; эндпоинты,
+изменяющие сессии или сотрудников, сбрасывают пересекающиеся записи через
+``invalidate``. Кэш локален для процесса: при нескольких воркерах uvicorn
+у каждого свой кэш, а изменения, сделанные в обход API, видны после истечения TTL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from .config import get_settings
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    etag: str
+    expires_at: float
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    employee_id: Optional[int] = None
+
+    def matches(
+        self, date_from: Optional[date], date_to: Optional[date], employee_ids: Optional[frozenset]
+    ) -> bool:
+        # Пустая граница — период не ограничен; employee_id записи None — отчет по всем сотрудникам
+        if date_to is not None and self.date_from is not None and self.date_from > date_to:
+            return False
+        if date_from is not None and self.date_to is not None and self.date_to < date_from:
+            return False
+        return employee_ids is None or self.employee_id is None or self.employee_id in employee_ids
+
+
+class ReportCache:
+    def __init__(self, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        # Увеличивается при каждом сбросе: отчет, построенный до сброса, не сохраняется
+        self._generation = 0
+        # Время последнего сброса: отчет с реплики в пределах ее лага после записи может быть устаревшим
+        self._invalidated_at = float("-inf")
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, key: Tuple) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def set(self, key: Tuple, entry: CacheEntry, generation: int, stale_window: float = 0) -> None:
+        """Сохраняет запись, если с момента чтения generation не было сброса.
+
+        stale_window — максимальное отставание источника данных (реплики): пока после
+        последнего сброса прошло меньше, запись не сохраняется.
+        """
+        if len(entry.body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            if stale_window and time.monotonic() - self._invalidated_at < stale_window:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(
+        self,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        employee_ids: Optional[Iterable[int]] = None,
+    ) -> int:
+        """Удаляет записи, период которых пересекается с [date_from, date_to] и которые касаются employee_ids."""
+        ids = frozenset(employee_ids) if employee_ids is not None else None
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.matches(date_from, date_to, ids)]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+            self._generation += 1
+            self._invalidated_at = time.monotonic()
+            return len(stale)
+
+    def invalidate_sessions(self, rows: Iterable[Any]) -> int:
+        """Сброс по набору сессий (объекты с employee_id и started_at): один проход по кэшу на весь набор."""
+        date_from = date_to = None
+        employee_ids = set()
+        for row in rows:
+            day = row.started_at.date()
+            date_from = day if date_from is None or day < date_from else date_from
+            date_to = day if date_to is None or day > date_to else date_to
+            employee_ids.add(row.employee_id)
+        if not employee_ids:
+            return 0
+        return self.invalidate(date_from, date_to, employee_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+            self._invalidated_at = time.monotonic()
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "not_modified": self.not_modified,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Tuple) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+
+_settings = get_settings()
+report_cache = ReportCache(
+    _settings.report_cache_ttl_seconds,
+    _settings.report_cache_max_entries,
+    _settings.report_cache_max_bytes,
+)
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _response(request: Request, entry: CacheEntry, cache_status: str) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "X-Cache": cache_status}
+    if _etag_matches(request, entry.etag):
+        report_cache.record_not_modified()
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+async def cached_report(
+    request: Request,
+    name: str,
+    params: Dict[str, Any],
+    load: Callable[[], Awaitable[bytes]],
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    employee_id: Optional[int] = None,
+    stale_window: float = 0,
+) -> Response:
+    """Отдает отчет из кэша или строит его через await load() (готовый JSON) и сохраняет.
+
+    При совпадении If-None-Match с ETag возвращается 304; для записи из кэша — без обращения к БД.
+    stale_window > 0 — отчет читается с реплики с таким допустимым лагом (см. ``ReportCache.set``).
+    """
+    key = (name,) + tuple(sorted((k, v) for k, v in params.items() if v is not None))
+    entry = report_cache.get(key) if report_cache.enabled else None
+    if entry is not None:
+        return _response(request, entry, "HIT")
+
+    generation = report_cache.generation
+    body = await load()
+    entry = CacheEntry(
+        body=body,
+        etag=_etag(body),
+        expires_at=time.monotonic() + report_cache.ttl_seconds,
+        date_from=date_from,
+        date_to=date_to,
+        employee_id=employee_id,
+    )
+    if report_cache.enabled:
+        report_cache.set(key, entry, generation, stale_window)
+    return _response(request, entry, "MISS")
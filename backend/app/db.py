@@ -1,22 +1,315 @@
+import threading
+import time
+from typing import Any, AsyncGenerator, Dict, Generator, Optional
 
-
-from typing import Generator
-
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 
 from .config import get_settings
 
 
 settings = get_settings()
 
-engine = create_engine(settings.database_url, echo=False, future=True)
+
+class _PoolStatsMixin:
+    """Считает выдачи соединений, время ожидания и таймауты пула."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        # Время включает ожидание свободного соединения и открытие нового (в пределах overflow)
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+class InstrumentedQueuePool(_PoolStatsMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_PoolStatsMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _pool_options(poolclass: type) -> Dict[str, Any]:
+    if settings.db_external_pooler:
+        # Пулер держит соединения сам
+        return {"poolclass": NullPool}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+# Недоступная реплика не должна задерживать запрос дольше этого времени (с)
+REPLICA_CONNECT_TIMEOUT = 3
+
+
+def _server_settings(read_only: bool) -> Dict[str, str]:
+    server_settings = {}
+    if read_only:
+        # Защита от записи через движок чтения, даже если он указывает на основной сервер
+        server_settings["default_transaction_read_only"] = "on"
+    else:
+        server_settings.update(_audit_settings())
+    return server_settings
+
+
+def _audit_settings() -> Dict[str, str]:
+    # Режим триггеров аудита (sql/init.sql, screentime.fn_audit_setting)
+    return {
+        "screentime.audit_values": settings.audit_values,
+        "screentime.audit_sessions": settings.audit_sessions,
+        "screentime.audit_async": "on" if settings.audit_async else "off",
+    }
+
+
+def _sync_connect_args(read_only: bool = False) -> Dict[str, Any]:
+    connect_args: Dict[str, Any] = {"connect_timeout": REPLICA_CONNECT_TIMEOUT} if read_only else {}
+    server_settings = _server_settings(read_only)
+    # Параметры в startup-пакете (options) внешний пулер не пропускает
+    if server_settings and not settings.db_external_pooler:
+        connect_args["options"] = " ".join(f"-c {k}={v}" for k, v in server_settings.items())
+    return connect_args
+
+
+def _async_connect_args(read_only: bool = False) -> Dict[str, Any]:
+    connect_args: Dict[str, Any] = {"timeout": REPLICA_CONNECT_TIMEOUT} if read_only else {}
+    server_settings = _server_settings(read_only)
+    if settings.db_external_pooler:
+        # asyncpg кэширует подготовленные операторы на соединении; в режиме transaction
+        # следующая транзакция может попасть на другое серверное соединение
+        connect_args.update(statement_cache_size=0, prepared_statement_cache_size=0)
+    elif server_settings:
+        connect_args["server_settings"] = server_settings
+    return connect_args
+
+
+def _set_local_statement_timeout(_session, _transaction, conn):
+    # Только для транзакции запроса; в режиме transaction пулера SET без LOCAL и не сработал бы
+    conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(settings.db_statement_timeout_ms)}")
+
+
+def _limit_statement_time(db: Session) -> None:
+    """Ограничивает statement_timeout транзакции сессии обработчика запроса (DB_STATEMENT_TIMEOUT_MS)."""
+    if settings.db_statement_timeout_ms:
+        event.listen(db, "after_begin", _set_local_statement_timeout)
+
+
+def _set_transaction_read_only(conn):
+    conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+
+def _set_local_audit_settings(conn):
+    # Один запрос на все параметры: set_config(..., true) действует до конца транзакции, как SET LOCAL
+    calls = ", ".join(f"set_config('{name}', '{value}', true)" for name, value in _audit_settings().items())
+    conn.exec_driver_sql(f"SELECT {calls}")
+
+
+engine = create_engine(
+    settings.database_url,
+    echo=False,
+    future=True,
+    connect_args=_sync_connect_args(),
+    **_pool_options(InstrumentedQueuePool),
+)
+
+async_engine = create_async_engine(
+    settings.async_database_url,
+    echo=False,
+    connect_args=_async_connect_args(),
+    **_pool_options(InstrumentedAsyncQueuePool),
+)
+
+# Движки чтения (реплика); без READ_DATABASE_URL не создаются, и чтение идет с основного сервера
+read_engine = None
+async_read_engine = None
+if settings.read_database_url:
+    read_engine = create_engine(
+        settings.read_database_url,
+        echo=False,
+        future=True,
+        connect_args=_sync_connect_args(read_only=True),
+        **_pool_options(InstrumentedQueuePool),
+    )
+    async_read_engine = create_async_engine(
+        settings.async_read_database_url,
+        echo=False,
+        connect_args=_async_connect_args(read_only=True),
+        **_pool_options(InstrumentedAsyncQueuePool),
+    )
+
+if settings.db_external_pooler:
+    for _engine in filter(None, (engine, async_engine, read_engine, async_read_engine)):
+        _sync_engine = getattr(_engine, "sync_engine", _engine)
+        if _engine in (read_engine, async_read_engine):
+            event.listen(_sync_engine, "begin", _set_transaction_read_only)
+        else:
+            event.listen(_sync_engine, "begin", _set_local_audit_settings)
+
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, future=True)
 
+# expire_on_commit=False: после commit атрибуты нельзя догрузить неявно (без await)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+# info["replica"] — сессия читает с реплики (данные могут отставать на величину лага)
+ReadSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=read_engine, future=True, info={"replica": True})
+    if read_engine is not None
+    else None
+)
+AsyncReadSessionLocal = (
+    async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False, info={"replica": True})
+    if async_read_engine is not None
+    else None
+)
+
+
+# Отставание реплики: 0, если сервер не в режиме восстановления или применил все полученные WAL
+REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+    """
+)
+
+
+class ReplicaHealth:
+    """Состояние реплики: доступность и отставание, проверяются не чаще раза в check_interval секунд.
+
+    Если проверка не удалась или лаг больше max_lag_seconds, чтение переключается на основной сервер
+    до следующей успешной проверки.
+    """
+
+    def __init__(self, max_lag_seconds: float, check_interval: float):
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.available = False
+        self.lag_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.fallbacks = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.available and self.lag_seconds is not None and self.lag_seconds <= self.max_lag_seconds
+
+    def _due(self) -> bool:
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return False
+        # Отметка до проверки: параллельные запросы не запускают свою проверку
+        self.checked_at = now
+        return True
+
+    def _record(self, lag: Optional[float], error: Optional[Exception]) -> None:
+        self.available = error is None
+        self.lag_seconds = float(lag) if lag is not None else None
+        self.error = f"{type(error).__name__}: {error}" if error is not None else None
+
+    def refresh(self) -> None:
+        if read_engine is not None and self._due():
+            try:
+                with read_engine.connect() as conn:
+                    self._record(conn.execute(REPLICA_LAG_SQL).scalar(), None)
+            except SQLAlchemyError as e:
+                self._record(None, e)
+
+    async def refresh_async(self) -> None:
+        if async_read_engine is not None and self._due():
+            try:
+                async with async_read_engine.connect() as conn:
+                    self._record((await conn.execute(REPLICA_LAG_SQL)).scalar(), None)
+            except (SQLAlchemyError, OSError) as e:
+                self._record(None, e)
+
+    def use_replica(self) -> bool:
+        """Решение для очередного запроса на чтение (после refresh/refresh_async)."""
+        if read_engine is None:
+            return False
+        if not self.healthy:
+            self.fallbacks += 1
+            return False
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": read_engine is not None,
+            "available": self.available,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "seconds_since_check": round(time.monotonic() - self.checked_at, 3) if self.checked_at else None,
+            "fallbacks": self.fallbacks,
+            "error": self.error,
+        }
+
+
+replica_health = ReplicaHealth(settings.replica_max_lag_seconds, settings.replica_check_interval_seconds)
+
+
+def replica_lag_window(db) -> float:
+    """Сколько секунд после записи данные сессии db могут быть устаревшими (0 — основной сервер)."""
+    return settings.replica_max_lag_seconds if db.info.get("replica") else 0
+
+
+def pool_stats(bind=None) -> Dict[str, Any]:
+    pool = (bind if bind is not None else engine).pool
+    stats: Dict[str, Any] = {
+        "pool_class": type(pool).__name__,
+        "external_pooler": settings.db_external_pooler,
+        "pre_ping": settings.db_pool_pre_ping,
+        "statement_timeout_ms": settings.db_statement_timeout_ms,
+    }
+    if isinstance(pool, _PoolStatsMixin):
+        with pool._stats_lock:
+            stats.update(
+                size=pool.size(),
+                max_overflow=settings.db_max_overflow,
+                timeout_seconds=settings.db_pool_timeout,
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+                checkouts=pool.checkouts,
+                timeouts=pool.timeouts,
+                wait_seconds_total=round(pool.wait_seconds_total, 6),
+                wait_seconds_avg=round(pool.wait_seconds_total / pool.checkouts, 6) if pool.checkouts else 0.0,
+                wait_seconds_max=round(pool.wait_seconds_max, 6),
+            )
+    return stats
+
 
 def get_db() -> Generator:
     db = SessionLocal()
+    _limit_statement_time(db)
     try:
         yield db
     except Exception:  
@@ -26,3 +319,44 @@ def get_db() -> Generator:
         raise
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        _limit_statement_time(db.sync_session)
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+
+
+def get_read_db() -> Generator:
+    """Сессия для чтения: реплика, если она доступна и не отстает, иначе основной сервер."""
+    replica_health.refresh()
+    db = ReadSessionLocal() if replica_health.use_replica() else SessionLocal()
+    _limit_statement_time(db)
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def async_read_session_factory() -> async_sessionmaker:
+    """Фабрика асинхронных сессий для чтения: реплика, если она доступна и не отстает, иначе основной сервер."""
+    await replica_health.refresh_async()
+    return AsyncReadSessionLocal if replica_health.use_replica() else AsyncSessionLocal
+
+
+async def get_async_read_db() -> AsyncGenerator[AsyncSession, None]:
+    session_factory = await async_read_session_factory()
+    async with session_factory() as db:
+        _limit_statement_time(db.sync_session)
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
@@ -0,0 +1,442 @@
+"""Загрузка сессий экранного времени для batch-импорта.
+
+Два способа загрузки:
+- ``orm`` — построчно через ORM (по одному INSERT на строку);
+- ``copy`` — COPY во временную staging-таблицу, проверка строк одним
+  UPDATE и перенос корректных строк в screen_sessions одним INSERT ... SELECT.
+
+Использование приложений (applications строки) загружается вместе с сессией:
+ORM — через связь ScreenSession.applications, COPY — через вторую staging-таблицу
+и один INSERT ... SELECT в session_application_usage.
+
+Потоковый импорт (NDJSON/CSV) загружает данные порциями: каждая порция
+коммитится отдельно вместе с прогрессом в batch_import_logs.
+"""
+
+from __future__ import annotations
+
+import csv
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .cache import report_cache
+from .db import SessionLocal
+from .utils.pg_copy import copy_rows
+
+
+SESSION_COLUMNS = ("employee_id", "workstation_id", "started_at", "ended_at", "active_seconds")
+STAGE_TABLE = "batch_sessions_stage"
+USAGE_STAGE_TABLE = "batch_usage_stage"
+
+# Сколько сообщений об ошибках хранить в журнале; остальные только считаются.
+MAX_STORED_ERRORS = 1000
+
+
+@dataclass
+class ImportResult:
+    success_rows: int = 0
+    error_rows: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def add_error(self, row_no: int, message: str) -> None:
+        self.error_rows += 1
+        if len(self.errors) < MAX_STORED_ERRORS:
+            self.errors.append(f"Row {row_no}: {message}")
+
+    def merge(self, other: "ImportResult") -> None:
+        self.success_rows += other.success_rows
+        self.error_rows += other.error_rows
+        self.errors.extend(other.errors[: MAX_STORED_ERRORS - len(self.errors)])
+
+    def error_message(self) -> Optional[str]:
+        if not self.error_rows:
+            return None
+        message = "\n".join(self.errors)
+        if self.error_rows > len(self.errors):
+            message += f"\n... and {self.error_rows - len(self.errors)} more errors"
+        return message
+
+
+def validate_row(row: schemas.BatchSessionRow | schemas.ScreenSessionCreate) -> Optional[str]:
+    """Сообщение об ошибке строки или None; те же проверки выполняет POST /api/sessions/."""
+    if row.ended_at <= row.started_at:
+        return "ended_at must be greater than started_at"
+    if row.active_seconds < 0:
+        return "active_seconds must be non-negative"
+    if row.applications:
+        application_ids = {a.application_id for a in row.applications}
+        if len(application_ids) != len(row.applications):
+            return "applications must not repeat application_id"
+        if any(a.active_seconds < 0 for a in row.applications):
+            return "applications active_seconds must be non-negative"
+        if sum(a.active_seconds for a in row.applications) > row.active_seconds:
+            return "applications active_seconds must not exceed session active_seconds"
+    return None
+
+
+def session_model(row: schemas.BatchSessionRow | schemas.ScreenSessionCreate) -> models.ScreenSession:
+    """ORM-объект сессии вместе со строками использования приложений."""
+    return models.ScreenSession(
+        **row.model_dump(exclude={"applications"}),
+        applications=[models.SessionApplicationUsage(**a.model_dump()) for a in row.applications],
+    )
+
+
+def _row_numbers(rows: Sequence[schemas.BatchSessionRow], row_nos: Optional[Sequence[int]]) -> Sequence[int]:
+    return row_nos if row_nos is not None else range(1, len(rows) + 1)
+
+
+def ensure_partitions(db: Session, rows: Sequence[schemas.BatchSessionRow]) -> None:
+    """Создает месячные секции screen_sessions за период строк, чтобы они не попадали в DEFAULT-секцию.
+
+    Выполняется в отдельной короткой транзакции: создание секции блокирует родительскую таблицу,
+    и держать эту блокировку до конца импорта нельзя.
+    """
+    if not rows:
+        return
+    started = [r.started_at for r in rows]
+    with db.get_bind().begin() as conn:
+        conn.execute(
+            text("SELECT screentime.fn_ensure_screen_sessions_partitions(:date_from, :date_to)"),
+            {"date_from": min(started).date(), "date_to": max(started).date()},
+        )
+
+
+def import_rows_orm(
+    db: Session, rows: Sequence[schemas.BatchSessionRow], row_nos: Optional[Sequence[int]] = None
+) -> ImportResult:
+    ensure_partitions(db, rows)
+    result = ImportResult()
+    for row_no, row in zip(_row_numbers(rows, row_nos), rows):
+        error = validate_row(row)
+        if error:
+            result.add_error(row_no, error)
+            continue
+        db.add(session_model(row))
+        result.success_rows += 1
+    db.flush()
+    return result
+
+
+def import_rows_copy(
+    db: Session, rows: Sequence[schemas.BatchSessionRow], row_nos: Optional[Sequence[int]] = None
+) -> ImportResult:
+    ensure_partitions(db, rows)
+    db.execute(
+        text(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (
+                row_no          INTEGER NOT NULL,
+                id              BIGINT,
+                employee_id     INTEGER NOT NULL,
+                workstation_id  INTEGER NOT NULL,
+                started_at      TIMESTAMP NOT NULL,
+                ended_at        TIMESTAMP NOT NULL,
+                active_seconds  INTEGER NOT NULL,
+                error           TEXT
+            ) ON COMMIT DROP
+            """
+        )
+    )
+    copy_rows(
+        db,
+        STAGE_TABLE,
+        ("row_no",) + SESSION_COLUMNS,
+        (
+            (row_no, r.employee_id, r.workstation_id, r.started_at, r.ended_at, r.active_seconds)
+            for row_no, r in zip(_row_numbers(rows, row_nos), rows)
+        ),
+    )
+    with_usage = any(r.applications for r in rows)
+    if with_usage:
+        db.execute(
+            text(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {USAGE_STAGE_TABLE} (
+                    row_no          INTEGER NOT NULL,
+                    application_id  INTEGER NOT NULL,
+                    active_seconds  INTEGER NOT NULL
+                ) ON COMMIT DROP
+                """
+            )
+        )
+        copy_rows(
+            db,
+            USAGE_STAGE_TABLE,
+            ("row_no", "application_id", "active_seconds"),
+            (
+                (row_no, a.application_id, a.active_seconds)
+                for row_no, r in zip(_row_numbers(rows, row_nos), rows)
+                for a in r.applications
+            ),
+        )
+
+    # Проверка всех строк одним проходом (те же правила, что и в validate_row,
+    # плюс наличие сотрудника и рабочей станции).
+    db.execute(
+        text(
+            f"""
+            UPDATE {STAGE_TABLE} s
+            SET error = CASE
+                WHEN s.ended_at <= s.started_at THEN 'ended_at must be greater than started_at'
+                WHEN s.active_seconds < 0 THEN 'active_seconds must be non-negative'
+                WHEN NOT EXISTS (SELECT 1 FROM screentime.employees e WHERE e.id = s.employee_id)
+                    THEN 'employee_id ' || s.employee_id || ' does not exist'
+                WHEN NOT EXISTS (SELECT 1 FROM screentime.workstations w WHERE w.id = s.workstation_id)
+                    THEN 'workstation_id ' || s.workstation_id || ' does not exist'
+            END
+            """
+        )
+    )
+    if with_usage:
+        # Проверки использования приложений (те же, что и в validate_row, плюс наличие приложения)
+        # по агрегатам строк каждой сессии; ошибка записывается в строку сессии, если та еще корректна.
+        db.execute(
+            text(
+                f"""
+                UPDATE {STAGE_TABLE} s
+                SET error = CASE
+                    WHEN u.rows_count <> u.applications_count THEN 'applications must not repeat application_id'
+                    WHEN u.min_seconds < 0 THEN 'applications active_seconds must be non-negative'
+                    WHEN u.total_seconds > s.active_seconds
+                        THEN 'applications active_seconds must not exceed session active_seconds'
+                    WHEN u.missing_application_id IS NOT NULL
+                        THEN 'application_id ' || u.missing_application_id || ' does not exist'
+                END
+                FROM (
+                    SELECT u.row_no,
+                           COUNT(*) AS rows_count,
+                           COUNT(DISTINCT u.application_id) AS applications_count,
+                           MIN(u.active_seconds) AS min_seconds,
+                           SUM(u.active_seconds) AS total_seconds,
+                           MIN(u.application_id) FILTER (WHERE a.id IS NULL) AS missing_application_id
+                    FROM {USAGE_STAGE_TABLE} u
+                    LEFT JOIN screentime.applications a ON a.id = u.application_id
+                    GROUP BY u.row_no
+                ) u
+                WHERE u.row_no = s.row_no AND s.error IS NULL
+                """
+            )
+        )
+
+    result = ImportResult()
+    for row_no, error in db.execute(text(f"SELECT row_no, error FROM {STAGE_TABLE} WHERE error IS NOT NULL ORDER BY row_no")):
+        result.add_error(row_no, error)
+
+    columns = ", ".join(SESSION_COLUMNS)
+    if with_usage:
+        # id сессий выдаются заранее, чтобы связать с ними строки использования по row_no
+        db.execute(
+            text(
+                f"""
+                UPDATE {STAGE_TABLE} s
+                SET id = n.id
+                FROM (
+                    SELECT row_no, nextval('screentime.screen_sessions_id_seq') AS id
+                    FROM (SELECT row_no FROM {STAGE_TABLE} WHERE error IS NULL ORDER BY row_no) r
+                ) n
+                WHERE n.row_no = s.row_no
+                """
+            )
+        )
+        columns = "id, " + columns
+    inserted = db.execute(
+        text(
+            f"""
+            INSERT INTO screentime.screen_sessions ({columns})
+            SELECT {columns} FROM {STAGE_TABLE} WHERE error IS NULL ORDER BY row_no
+            """
+        )
+    )
+    result.success_rows = inserted.rowcount
+    if with_usage:
+        db.execute(
+            text(
+                f"""
+                INSERT INTO screentime.session_application_usage (session_id, session_started_at, application_id, active_seconds)
+                SELECT s.id, s.started_at, u.application_id, u.active_seconds
+                FROM {USAGE_STAGE_TABLE} u
+                JOIN {STAGE_TABLE} s ON s.row_no = u.row_no
+                WHERE s.error IS NULL
+                """
+            )
+        )
+        db.execute(text(f"TRUNCATE {USAGE_STAGE_TABLE}"))
+
+    # Таблица удаляется при COMMIT, но в пределах одной транзакции ее могут переиспользовать.
+    db.execute(text(f"TRUNCATE {STAGE_TABLE}"))
+    return result
+
+
+Loader = Callable[[Session, Sequence[schemas.BatchSessionRow], Optional[Sequence[int]]], ImportResult]
+
+LOADERS: Dict[str, Loader] = {
+    "orm": import_rows_orm,
+    "copy": import_rows_copy,
+}
+
+
+def finish_log(log: models.BatchImportLog, result: ImportResult) -> None:
+    log.success_rows = result.success_rows
+    log.error_rows = result.error_rows
+    log.finished_at = datetime.utcnow()
+    if result.error_rows == 0:
+        log.status = "SUCCESS"
+    else:
+        log.status = "FAILED"
+        log.error_message = result.error_message()
+
+
+def fail_interrupted_logs(db: Session, ids: Optional[Sequence[int]], message: str) -> int:
+    """Завершает как FAILED импорты IN_PROGRESS: с указанными id или, если ids is None, все."""
+    result = db.execute(
+        text(
+            """
+            UPDATE screentime.batch_import_logs
+            SET status = 'FAILED',
+                finished_at = NOW(),
+                error_message = COALESCE(error_message || E'\\n', '') || :message
+            WHERE status = 'IN_PROGRESS' AND (CAST(:all_logs AS BOOLEAN) OR id = ANY(:ids))
+            """
+        ),
+        {"message": message, "all_logs": ids is None, "ids": list(ids or [])},
+    )
+    db.commit()
+    return result.rowcount
+
+
+def fail_log(db: Session, log: models.BatchImportLog, message: str) -> None:
+    """Завершает прерванный импорт со статусом FAILED; загруженные порции и счетчики остаются."""
+    db.rollback()
+    log.status = "FAILED"
+    log.error_message = message
+    log.finished_at = datetime.utcnow()
+    db.commit()
+
+
+# Потоковый импорт
+
+
+def parse_ndjson_line(line: str) -> schemas.BatchSessionRow:
+    return schemas.BatchSessionRow.model_validate_json(line)
+
+
+class CsvRowParser:
+    """Разбор CSV построчно; первая строка — заголовок с именами полей (кавычки внутри строки поддерживаются, переносы — нет)."""
+
+    def __init__(self, header: str):
+        self.columns = [c.strip() for c in next(csv.reader([header]))]
+
+    def __call__(self, line: str) -> schemas.BatchSessionRow:
+        values = next(csv.reader([line]))
+        return schemas.BatchSessionRow.model_validate(dict(zip(self.columns, values)))
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc']) or 'row'}: {e['msg']}" for e in exc.errors())
+
+
+def start_log(db: Session, import_type: str, file_name: Optional[str], total_rows: int = 0) -> models.BatchImportLog:
+    log = models.BatchImportLog(import_type=import_type, file_name=file_name, total_rows=total_rows)
+    db.add(log)
+    db.commit()
+    return log
+
+
+def import_chunk(
+    db: Session,
+    log: models.BatchImportLog,
+    loader: Loader,
+    parse: Callable[[Any], schemas.BatchSessionRow],
+    lines: Sequence[Any],
+    first_row_no: int,
+    progress: ImportResult,
+) -> None:
+    """Разбирает и загружает порцию строк в отдельной транзакции и фиксирует прогресс в журнале.
+
+    При ошибке загрузки откатывается только эта порция: ее строки считаются ошибочными,
+    ранее загруженные порции остаются в базе.
+    """
+    chunk = ImportResult()
+    rows: List[schemas.BatchSessionRow] = []
+    row_nos: List[int] = []
+    for row_no, line in enumerate(lines, start=first_row_no):
+        try:
+            rows.append(parse(line))
+            row_nos.append(row_no)
+        except ValidationError as e:
+            chunk.add_error(row_no, _validation_message(e))
+        except (ValueError, csv.Error) as e:
+            chunk.add_error(row_no, str(e))
+
+    try:
+        if rows:
+            chunk.merge(loader(db, rows, row_nos))
+        _write_progress(log, progress, chunk)
+        db.commit()
+        if chunk.success_rows:
+            report_cache.invalidate_sessions(rows)
+    except Exception as e:  # noqa: BLE001
+        db.rollback()
+        chunk = ImportResult(error_rows=len(lines))
+        chunk.errors.append(f"Rows {first_row_no}-{first_row_no + len(lines) - 1}: chunk failed: {e}")
+        _write_progress(log, progress, chunk)
+        db.commit()
+    progress.merge(chunk)
+
+
+def _write_progress(log: models.BatchImportLog, progress: ImportResult, chunk: ImportResult) -> None:
+    total = ImportResult(progress.success_rows, progress.error_rows, list(progress.errors))
+    total.merge(chunk)
+    # Для фоновых задач total_rows известен заранее, для потокового импорта растет по мере чтения
+    log.total_rows = max(log.total_rows or 0, total.success_rows + total.error_rows)
+    log.success_rows = total.success_rows
+    log.error_rows = total.error_rows
+    log.error_message = total.error_message()
+
+
+# Фоновые задачи импорта
+
+
+def _already_parsed(row: schemas.BatchSessionRow) -> schemas.BatchSessionRow:
+    return row
+
+
+def run_import_job(log_id: int, rows: Sequence[schemas.BatchSessionRow], mode: str, chunk_size: int) -> None:
+    """Выполняет импорт в фоновом потоке с собственной сессией БД, порциями по chunk_size строк."""
+    db = SessionLocal()
+    try:
+        log = db.get(models.BatchImportLog, log_id)
+        # Время ожидания в очереди не входит в длительность импорта и оценку eta_seconds
+        log.started_at = datetime.utcnow()
+        db.commit()
+        progress = ImportResult()
+        loader = LOADERS[mode]
+        for start in range(0, len(rows), chunk_size):
+            import_chunk(db, log, loader, _already_parsed, rows[start : start + chunk_size], start + 1, progress)
+        finish_log(log, progress)
+        db.commit()
+    except Exception as e:  # noqa: BLE001
+        db.rollback()
+        log = db.get(models.BatchImportLog, log_id)
+        if log is not None:
+            log.status = "FAILED"
+            log.error_message = f"Fatal error: {e}"
+            log.finished_at = datetime.utcnow()
+            db.commit()
+    finally:
+        db.close()
+
+
+def estimate_eta_seconds(log: models.BatchImportLog) -> Optional[float]:
+    processed = log.success_rows + log.error_rows
+    if log.status != "IN_PROGRESS" or not processed or log.total_rows <= processed:
+        return None
+    elapsed = (datetime.utcnow() - log.started_at).total_seconds()
+    return round(elapsed / processed * (log.total_rows - processed), 1)
@@ -0,0 +1,77 @@
+"""Ограниченный пул фоновых задач (batch-импорт)."""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import get_settings
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobPool:
+    """Пул потоков с ограничением на число выполняемых и ожидающих задач.
+
+    Каждая задача держит одно соединение из пула SQLAlchemy, поэтому число
+    рабочих потоков должно быть заметно меньше размера пула соединений —
+    иначе импорт вытеснит обычные CRUD-запросы.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, name: str):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._capacity = max_workers + max_pending
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        # Задачи в пуле -> ключ задачи (например, id журнала импорта)
+        self._futures: Dict[Future, Any] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def has_capacity(self) -> bool:
+        return self._in_flight < self._capacity
+
+    def submit(self, fn: Callable[..., Any], *args: Any, key: Optional[Any] = None) -> None:
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull()
+        with self._lock:
+            self._in_flight += 1
+            future = self._executor.submit(fn, *args)
+            self._futures[future] = key
+        future.add_done_callback(self._release)
+
+    def _release(self, future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self._futures.pop(future, None)
+        self._slots.release()
+
+    def shutdown(self, timeout: float = 0) -> List[Any]:
+        """Отменяет ожидающие задачи и до timeout секунд ждет выполняемые.
+
+        Возвращает ключи отмененных задач; задачи, не успевшие завершиться за timeout,
+        продолжают выполняться до выхода процесса.
+        """
+        with self._lock:
+            futures = dict(self._futures)
+        cancelled = [key for future, key in futures.items() if future.cancel()]
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        running = [future for future in futures if not future.cancelled()]
+        if running and timeout > 0:
+            wait(running, timeout=timeout)
+        return cancelled
+
+
+_settings = get_settings()
+
+import_pool = JobPool(
+    max_workers=_settings.import_workers,
+    max_pending=_settings.import_queue_size,
+    name="batch-import",
+)
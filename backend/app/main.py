@@ -1,16 +1,27 @@
+import logging
+import time
+from typing import AsyncIterator
 from uuid import uuid4
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
-from .routers import employees, departments, workstations, applications, sessions, reports, batch_import
+from .audit import audit_drainer
+from .config import get_settings
+from .db import SessionLocal, async_engine, engine
+from .importer import fail_interrupted_logs
+from .jobs import import_pool
+from .metrics import RequestMetrics, current_metrics, metrics_response, registry
+from .routers import employees, departments, workstations, applications, sessions, reports, batch_import, export, audit, system
 from .api_errors import (
     handle_http_exception,
     handle_integrity_error,
     handle_sqlalchemy_error,
     handle_unexpected_error,
     handle_validation_error,
+    statement_budget_exceeded,
 )
 
 app = FastAPI(
@@ -20,6 +31,128 @@ app = FastAPI(
 )
 
 
+logger = logging.getLogger(__name__)
+
+
+@app.on_event("startup")
+def ensure_partitions():
+    # Секции сессий и журнала аудита на ближайшие месяцы; удаление старых — app.scripts.maintain_partitions (cron)
+    months_ahead = {"months_ahead": get_settings().partition_months_ahead}
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT * FROM screentime.fn_maintain_screen_sessions_partitions(:months_ahead)"), months_ahead)
+            conn.execute(text("SELECT * FROM screentime.fn_maintain_audit_log_partitions(:months_ahead)"), months_ahead)
+    except SQLAlchemyError as e:
+        logger.warning("Could not create screen_sessions/audit_log partitions: %s", e)
+
+
+@app.on_event("startup")
+def recover_import_logs():
+    # Импорты, прерванные остановкой процесса, иначе навсегда остаются IN_PROGRESS
+    if not get_settings().import_recover_on_startup:
+        return
+    db = SessionLocal()
+    try:
+        recovered = fail_interrupted_logs(db, None, "Interrupted by server restart")
+        if recovered:
+            logger.warning("Marked %d interrupted batch imports as FAILED", recovered)
+    except SQLAlchemyError as e:
+        logger.warning("Could not recover interrupted batch imports: %s", e)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def start_audit_drainer():
+    # Перенос очереди аудита в audit_log (только при асинхронном аудите)
+    settings = get_settings()
+    if settings.audit_async and settings.audit_drain_interval_seconds > 0:
+        audit_drainer.start()
+
+
+@app.on_event("shutdown")
+def shutdown_job_pools():
+    cancelled = import_pool.shutdown(get_settings().import_shutdown_timeout_seconds)
+    if not cancelled:
+        return
+    db = SessionLocal()
+    try:
+        fail_interrupted_logs(db, cancelled, "Cancelled on server shutdown")
+    except SQLAlchemyError as e:
+        logger.warning("Could not mark cancelled batch imports as FAILED: %s", e)
+    finally:
+        db.close()
+
+
+@app.on_event("shutdown")
+async def stop_audit_drainer():
+    await audit_drainer.stop()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+
+
+def _finish_request_metrics(request: Request, metrics: RequestMetrics, status_code: int) -> float:
+    """Учитывает запрос в /metrics и проверяет SQL_STATEMENT_BUDGET; возвращает общее время обработки."""
+    # Маршруты без TimedRoute (например, /metrics) — по шаблону, найденному роутером
+    metrics.route = metrics.route or getattr(request.scope.get("route"), "path_format", None)
+    total = time.perf_counter() - metrics.started
+    registry.observe_request(request.method, status_code, metrics, total)
+    budget = get_settings().sql_statement_budget
+    if budget and metrics.statements > budget:
+        logger.error(
+            "Request %s %s (request_id=%s) executed %d SQL statements, budget is %d",
+            request.method,
+            metrics.route,
+            metrics.request_id,
+            metrics.statements,
+            budget,
+        )
+    return total
+
+
+async def _finish_after_stream(
+    request: Request, metrics: RequestMetrics, body: AsyncIterator[bytes], status_code: int
+) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        _finish_request_metrics(request, metrics, status_code)
+
+
+# Объявлен раньше request_id_middleware, поэтому выполняется внутри него и видит request_id
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    metrics = RequestMetrics(request_id=getattr(request.state, "request_id", None))
+    token = current_metrics.set(metrics)
+    try:
+        response = await call_next(request)
+    except BaseException:
+        _finish_request_metrics(request, metrics, 500)
+        raise
+    finally:
+        current_metrics.reset(token)
+
+    # Ответы без тела (204, 304) тоже приходят без Content-Length
+    if "content-length" not in response.headers and response.status_code not in (204, 304):
+        # StreamingResponse (выгрузки /api/export) выполняет SQL уже при отправке тела: метрики и проверка
+        # бюджета — по окончании потока. Ответ к этому времени отправлен, поэтому превышение бюджета только
+        # записывается в журнал, а Server-Timing не добавляется (заголовки уходят до тела)
+        response.body_iterator = _finish_after_stream(request, metrics, response.body_iterator, response.status_code)
+        return response
+
+    total = _finish_request_metrics(request, metrics, response.status_code)
+    budget = get_settings().sql_statement_budget
+    if budget and metrics.statements > budget:
+        response = statement_budget_exceeded(request, metrics.statements, budget, metrics.route)
+    if get_settings().server_timing_enabled:
+        response.headers["Server-Timing"] = metrics.server_timing(total)
+    return response
+
+
 @app.middleware("http")
 async def request_id_middleware(request: Request, call_next):
     request.state.request_id = uuid4().hex
@@ -60,3 +193,12 @@ app.include_router(applications.router, prefix="/api/applications", tags=["Appli
 app.include_router(sessions.router, prefix="/api/sessions", tags=["Sessions"])
 app.include_router(reports.router, prefix="/api/reports", tags=["Reports"])
 app.include_router(batch_import.router, prefix="/api/batch-import", tags=["BatchImport"])
+app.include_router(export.router, prefix="/api/export", tags=["Export"])
+app.include_router(audit.router, prefix="/api/audit", tags=["Audit"])
+app.include_router(system.router, prefix="/api/system", tags=["System"])
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    # Текстовый формат Prometheus: гистограммы задержек по шаблону маршрута, время в БД, число SQL-операторов
+    return metrics_response()
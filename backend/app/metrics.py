@@ -0,0 +1,249 @@
+"""Метрики запросов: время обработки, время в БД, число SQL-операторов и строк, сериализация.
+
+Счетчики текущего запроса хранятся в ``RequestMetrics`` (contextvar ``current_metrics``):
+middleware ``timing_middleware`` в main.py создает его, обработчики событий SQLAlchemy
+``before_cursor_execute``/``after_cursor_execute`` (подключены ко всем движкам) добавляют
+время и число операторов, ``TimedRoute`` отделяет время сериализации ответа. По завершении
+запроса значения уходят в заголовок ``Server-Timing`` и в гистограммы ``/metrics``
+(текстовый формат Prometheus), сгруппированные по шаблону маршрута.
+
+Метрики локальны для процесса: при нескольких воркерах uvicorn каждый отдает свои.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import get_settings
+
+
+settings = get_settings()
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class RequestMetrics:
+    request_id: Optional[str] = None
+    route: Optional[str] = None
+    started: float = field(default_factory=time.perf_counter)
+    db_seconds: float = 0.0
+    statements: int = 0
+    rows: int = 0
+    # Момент, когда эндпоинт вернул результат (дальше — сериализация и формирование ответа)
+    endpoint_finished: Optional[float] = None
+    serialization_seconds: float = 0.0
+
+    def server_timing(self, total_seconds: float) -> str:
+        return ", ".join(
+            (
+                f"app;dur={total_seconds * 1000:.2f}",
+                f'db;dur={self.db_seconds * 1000:.2f};desc="{self.statements} statements, {self.rows} rows"',
+                f"serialize;dur={self.serialization_seconds * 1000:.2f}",
+            )
+        )
+
+
+current_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar("current_metrics", default=None)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Значения меток -> (счетчики по корзинам, сумма, количество)
+        self._series: Dict[Tuple[str, ...], Tuple[list, float, int]] = {}
+
+    def observe(self, label_values: Tuple[str, ...], value: float) -> None:
+        counts, total, count = self._series.get(label_values) or ([0] * len(self.buckets), 0.0, 0)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        self._series[label_values] = (counts, total + value, count + 1)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, label_values: Tuple[str, ...], value: float = 1) -> None:
+        self._series[label_values] = self._series.get(label_values, 0) + value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._series.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value:g}")
+        return lines
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Request latency", ("method", "route", "status")
+        )
+        self.db_duration = Histogram("http_request_db_duration_seconds", "Time spent in SQL per request", ("method", "route"))
+        self.serialization_duration = Histogram(
+            "http_request_serialization_seconds", "Response serialization time per request", ("method", "route")
+        )
+        self.db_statements = Counter("http_request_db_statements_total", "SQL statements executed", ("method", "route"))
+        self.db_rows = Counter("http_request_db_rows_total", "Rows returned or affected by SQL statements", ("method", "route"))
+        self.slow_queries = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ("route",))
+
+    def observe_request(self, method: str, status_code: int, metrics: RequestMetrics, total_seconds: float) -> None:
+        route = metrics.route or "unmatched"
+        with self._lock:
+            self.request_duration.observe((method, route, str(status_code)), total_seconds)
+            self.db_duration.observe((method, route), metrics.db_seconds)
+            self.serialization_duration.observe((method, route), metrics.serialization_seconds)
+            self.db_statements.inc((method, route), metrics.statements)
+            self.db_rows.inc((method, route), metrics.rows)
+
+    def observe_slow_query(self, route: Optional[str]) -> None:
+        with self._lock:
+            self.slow_queries.inc((route or "background",))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = (
+                self.request_duration,
+                self.db_duration,
+                self.serialization_duration,
+                self.db_statements,
+                self.db_rows,
+                self.slow_queries,
+            )
+            return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def metrics_response() -> Response:
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append((statement, time.perf_counter()))
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # Оператор завершился ошибкой (after_cursor_execute не вызывается): иначе его отметка времени
+    # осталась бы на соединении пула, и следующие операторы считали бы время от нее
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started and started[-1][0] is context.statement:
+        _, started_at = started.pop()
+        metrics = current_metrics.get()
+        if metrics is not None:
+            metrics.db_seconds += time.perf_counter() - started_at
+            metrics.statements += 1
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()[1]
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.db_seconds += elapsed
+        metrics.statements += 1
+        # rowcount у SELECT — число полученных строк, у DML — число измененных; -1, если неизвестно
+        if cursor.rowcount is not None and cursor.rowcount > 0:
+            metrics.rows += cursor.rowcount
+    if settings.slow_query_ms and elapsed * 1000 >= settings.slow_query_ms:
+        route = metrics.route if metrics is not None else None
+        registry.observe_slow_query(route)
+        slow_query_logger.warning(
+            "Slow query %.1f ms (request_id=%s, route=%s): %s",
+            elapsed * 1000,
+            metrics.request_id if metrics is not None else None,
+            route,
+            " ".join(statement.split())[: settings.slow_query_log_max_chars],
+        )
+
+
+class TimedRoute(APIRoute):
+    """Маршрут, который отмечает момент возврата из эндпоинта, чтобы отделить время сериализации ответа."""
+
+    def get_route_handler(self) -> Callable:
+        # Вызывается из APIRoute.__init__, когда dependant уже построен по исходной функции
+        self.dependant.call = _mark_endpoint_finished(self.dependant.call)
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            metrics = current_metrics.get()
+            if metrics is not None:
+                metrics.route = route
+            response = await handler(request)
+            if metrics is not None and metrics.endpoint_finished is not None:
+                metrics.serialization_seconds = time.perf_counter() - metrics.endpoint_finished
+            return response
+
+        return timed_handler
+
+
+def _mark_endpoint_finished(call: Callable) -> Callable:
+    # FastAPI выбирает способ вызова (await или пул потоков) по типу функции, поэтому обертка сохраняет его
+    if asyncio.iscoroutinefunction(call):
+
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                _set_endpoint_finished()
+
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        try:
+            return call(*args, **kwargs)
+        finally:
+            _set_endpoint_finished()
+
+    return wrapper
+
+
+def _set_endpoint_finished() -> None:
+    metrics = current_metrics.get()
+    if metrics is not None:
+        metrics.endpoint_finished = time.perf_counter()
@@ -1,12 +1,14 @@
 from datetime import date, datetime
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     CheckConstraint,
     Column,
     Date,
     DateTime,
     ForeignKey,
+    ForeignKeyConstraint,
     Integer,
     Numeric,
     String,
@@ -14,6 +16,7 @@ from sqlalchemy import (
     UniqueConstraint,
     PrimaryKeyConstraint,
 )
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import declarative_base, relationship
 
 
@@ -143,9 +146,11 @@ class ScreenSession(Base):
     __tablename__ = "screen_sessions"
     __table_args__ = (
         CheckConstraint("ended_at > started_at", name="chk_session_time"),
-        {"schema": SCHEMA},
+        {"schema": SCHEMA, "postgresql_partition_by": "RANGE (started_at)"},
     )
 
+    # В БД первичный ключ (id, started_at) из-за секционирования; id уникален сам по себе,
+    # поэтому ORM идентифицирует сессию только по id.
     id = Column(Integer, primary_key=True)
     employee_id = Column(Integer, ForeignKey(f"{SCHEMA}.employees.id", onupdate="CASCADE", ondelete="CASCADE"), nullable=False)
     workstation_id = Column(Integer, ForeignKey(f"{SCHEMA}.workstations.id", onupdate="CASCADE", ondelete="CASCADE"), nullable=False)
@@ -156,17 +161,29 @@ class ScreenSession(Base):
 
     employee = relationship("Employee", back_populates="sessions")
     workstation = relationship("Workstation", back_populates="sessions")
-    applications = relationship("SessionApplicationUsage", back_populates="session")
+    # Строки использования создаются вместе с сессией, а удаляются каскадом в БД (ON DELETE CASCADE):
+    # passive_deletes — при удалении сессии через ORM не обнулять session_id/session_started_at строк
+    # (это часть их первичного ключа)
+    applications = relationship(
+        "SessionApplicationUsage", back_populates="session", cascade="all, delete-orphan", passive_deletes=True
+    )
 
 
 class SessionApplicationUsage(Base):
     __tablename__ = "session_application_usage"
     __table_args__ = (
-        PrimaryKeyConstraint("session_id", "application_id"),
-        {"schema": SCHEMA},
+        PrimaryKeyConstraint("session_id", "session_started_at", "application_id"),
+        ForeignKeyConstraint(
+            ["session_id", "session_started_at"],
+            [f"{SCHEMA}.screen_sessions.id", f"{SCHEMA}.screen_sessions.started_at"],
+            onupdate="CASCADE",
+            ondelete="CASCADE",
+        ),
+        {"schema": SCHEMA, "postgresql_partition_by": "RANGE (session_started_at)"},
     )
 
-    session_id = Column(Integer, ForeignKey(f"{SCHEMA}.screen_sessions.id", onupdate="CASCADE", ondelete="CASCADE"))
+    session_id = Column(Integer)
+    session_started_at = Column(DateTime)
     application_id = Column(Integer, ForeignKey(f"{SCHEMA}.applications.id", onupdate="CASCADE", ondelete="RESTRICT"))
     active_seconds = Column(Integer, nullable=False)
 
@@ -189,6 +206,55 @@ class DailyEmployeeStat(Base):
     avg_session_seconds = Column(Numeric(10, 2), nullable=False, default=0)
 
 
+class DailyDepartmentStat(Base):
+    # Заполняется триггерами на daily_employee_stats и employees
+    __tablename__ = "daily_department_stats"
+    __table_args__ = (
+        PrimaryKeyConstraint("department_id", "stat_date"),
+        {"schema": SCHEMA},
+    )
+
+    department_id = Column(Integer, ForeignKey(f"{SCHEMA}.departments.id", onupdate="CASCADE", ondelete="CASCADE"), nullable=False)
+    stat_date = Column(Date, nullable=False)
+    total_seconds = Column(BigInteger, nullable=False, default=0)
+    sessions_count = Column(Integer, nullable=False, default=0)
+    employee_days = Column(Integer, nullable=False, default=0)
+
+
+class EmployeeLastActivity(Base):
+    # Заполняется триггерами на screen_sessions
+    __tablename__ = "employee_last_activity"
+    __table_args__ = {"schema": SCHEMA}
+
+    employee_id = Column(Integer, ForeignKey(f"{SCHEMA}.employees.id", onupdate="CASCADE", ondelete="CASCADE"), primary_key=True)
+    session_id = Column(Integer, nullable=False)
+    workstation_id = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    ended_at = Column(DateTime, nullable=False)
+    active_seconds = Column(Integer, nullable=False)
+
+
+class AuditLog(Base):
+    # Заполняется триггерами аудита (sql/init.sql); секционирована по месяцам changed_at
+    __tablename__ = "audit_log"
+    __table_args__ = (
+        CheckConstraint("operation IN ('INSERT','UPDATE','DELETE')", name="audit_log_operation_check"),
+        {"schema": SCHEMA, "postgresql_partition_by": "RANGE (changed_at)"},
+    )
+
+    # В БД первичный ключ (id, changed_at), id уникален сам по себе
+    id = Column(BigInteger, primary_key=True)
+    table_name = Column(Text, nullable=False)
+    operation = Column(String(10), nullable=False)
+    # Для записей уровня оператора — '*'
+    record_id = Column(Text, nullable=False)
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    changed_by = Column(Text)
+    old_values = Column(JSONB)
+    new_values = Column(JSONB)
+    row_count = Column(Integer)
+
+
 class BatchImportLog(Base):
     __tablename__ = "batch_import_logs"
     __table_args__ = {"schema": SCHEMA}
@@ -1,12 +1,20 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
-from ..db import get_db
+from .. import bulk, models, schemas
+from ..cache import report_cache
+from ..db import get_db, get_read_db
+from ..metrics import TimedRoute
+from ..utils.fast_json import RowSerializer
+from ..utils.pagination import KeysetPaginator
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+application_bulk = bulk.BulkSpec(models.Application, key="code")
+application_rows = RowSerializer(models.Application, schemas.ApplicationRead)
 
 
 @router.get(
@@ -15,8 +23,20 @@ router = APIRouter()
     summary="Список приложений",
     description="Возвращает постраничный список приложений, по которым учитывается экранное время.",
 )
-def list_applications(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Application).offset(skip).limit(limit).all()
+def list_applications(skip: int = 0, limit: int = 100, db: Session = Depends(get_read_db)):
+    stmt = application_rows.select().order_by(models.Application.id).offset(skip).limit(limit)
+    return application_rows.response(db.execute(stmt).all())
+
+
+@router.get(
+    "/page",
+    response_model=schemas.CursorPage[schemas.ApplicationRead],
+    summary="Список приложений (курсорная пагинация)",
+    description="Keyset-пагинация по id: передайте next_cursor или prev_cursor из предыдущего ответа в параметре cursor.",
+)
+def page_applications(cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_read_db)):
+    paginator = KeysetPaginator([models.Application.id], cursor, limit)
+    return application_rows.page_response(paginator.page(db.execute(paginator.apply(application_rows.select())).all()))
 
 
 @router.get(
@@ -44,6 +64,8 @@ def create_application(payload: schemas.ApplicationCreate, db: Session = Depends
     db.add(application)
     db.commit()
     db.refresh(application)
+    # Название, категория и продуктивность приложения входят в отчеты по приложениям
+    report_cache.invalidate()
     return application
 
 
@@ -63,6 +85,8 @@ def update_application(application_id: int, payload: schemas.ApplicationBase, db
 
     db.commit()
     db.refresh(application)
+    # Название, категория и продуктивность приложения входят в отчеты по приложениям
+    report_cache.invalidate()
     return application
 
 
@@ -78,4 +102,63 @@ def delete_application(application_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Application not found")
     db.delete(application)
     db.commit()
+    # Агрегаты по приложению удаляются каскадом
+    report_cache.invalidate()
     return None
+
+
+@router.post(
+    "/bulk",
+    response_model=schemas.BulkResponse[schemas.ApplicationRead],
+    summary="Массовое создание приложений",
+    description=(
+        "Создает приложения списком в одной транзакции (один INSERT ... ON CONFLICT (code) ... RETURNING). "
+        "on_conflict задает действие, если code уже существует: error — ошибка элемента, skip — пропустить, "
+        "update — обновить запись. Ошибки отдельных элементов (несуществующие ссылки, дубликаты) возвращаются "
+        "в items, корректные элементы сохраняются."
+    ),
+)
+def bulk_create_applications(payload: schemas.BulkCreateRequest[schemas.ApplicationCreate], db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.items))
+    outcome = bulk.bulk_create(db, application_bulk, payload.items, payload.on_conflict)
+    db.commit()
+    # on_conflict=update может изменить название и продуктивность существующих приложений
+    if outcome.ids("updated"):
+        report_cache.invalidate()
+    return outcome.response()
+
+
+@router.patch(
+    "/bulk",
+    response_model=schemas.BulkResponse[schemas.ApplicationRead],
+    summary="Массовое обновление приложений",
+    description=(
+        "Изменяет приложения списком в одной транзакции: каждый элемент содержит id и изменяемые поля. "
+        "Несуществующие id и ошибки отдельных элементов возвращаются в items."
+    ),
+)
+def bulk_update_applications(payload: schemas.BulkUpdateRequest[schemas.ApplicationBulkUpdateItem], db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.items))
+    outcome = bulk.bulk_update(db, application_bulk, payload.items)
+    db.commit()
+    if outcome.ids("updated"):
+        report_cache.invalidate()
+    return outcome.response()
+
+
+@router.post(
+    "/bulk/delete",
+    response_model=schemas.BulkResponse[schemas.ApplicationRead],
+    summary="Массовое удаление приложений",
+    description=(
+        "Удаляет приложения по списку id одним DELETE ... RETURNING. "
+        "Несуществующие id и элементы, удаление которых запрещено ограничениями, возвращаются в items с ошибкой."
+    ),
+)
+def bulk_delete_applications(payload: schemas.BulkDeleteRequest, db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.ids))
+    outcome = bulk.bulk_delete(db, application_bulk, payload.ids)
+    db.commit()
+    if outcome.ids("deleted"):
+        report_cache.invalidate()
+    return outcome.response()
@@ -0,0 +1,98 @@
+import json
+from datetime import datetime
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import Select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, schemas
+from ..db import get_async_read_db
+from ..metrics import TimedRoute
+from ..utils.fast_json import RowSerializer
+from ..utils.pagination import KeysetPaginator
+
+router = APIRouter(route_class=TimedRoute)
+
+
+class AuditFilters:
+    """Фильтры журнала аудита. Таблица и период — индекс (table_name, changed_at, id) и отсечение
+    месячных секций, запись — (record_id, table_name, changed_at, id), ключ и содержимое
+    old_values/new_values — GIN-индексы; операция проверяется поверх них."""
+
+    def __init__(
+        self,
+        table_name: Annotated[
+            Optional[Literal["employees", "workstations", "screen_sessions", "applications"]],
+            Query(description="Таблица"),
+        ] = None,
+        record_id: Annotated[Optional[str], Query(description="id записи; '*' — записи уровня оператора")] = None,
+        operation: Optional[Literal["INSERT", "UPDATE", "DELETE"]] = None,
+        changed_from: Annotated[Optional[datetime], Query(description="Изменение не раньше (включительно)")] = None,
+        changed_to: Annotated[Optional[datetime], Query(description="Изменение раньше (не включительно)")] = None,
+        changed_key: Annotated[
+            Optional[str],
+            Query(description="Ключ есть в old_values или new_values (при AUDIT_VALUES=diff — измененная колонка)"),
+        ] = None,
+        contains: Annotated[
+            Optional[str],
+            Query(description='JSON-объект, содержащийся в old_values или new_values, например {"employee_id": 5}'),
+        ] = None,
+    ):
+        self.table_name = table_name
+        self.record_id = record_id
+        self.operation = operation
+        self.changed_from = changed_from
+        self.changed_to = changed_to
+        self.changed_key = changed_key
+        self.contains = None
+        if contains is not None:
+            try:
+                self.contains = json.loads(contains)
+            except ValueError:
+                self.contains = None
+            if not isinstance(self.contains, dict):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="contains must be a JSON object")
+
+    def apply(self, stmt: Select) -> Select:
+        a = models.AuditLog
+        if self.table_name is not None:
+            stmt = stmt.where(a.table_name == self.table_name)
+        if self.record_id is not None:
+            stmt = stmt.where(a.record_id == self.record_id)
+        if self.operation is not None:
+            stmt = stmt.where(a.operation == self.operation)
+        if self.changed_from is not None:
+            stmt = stmt.where(a.changed_at >= self.changed_from)
+        if self.changed_to is not None:
+            stmt = stmt.where(a.changed_at < self.changed_to)
+        if self.changed_key is not None:
+            stmt = stmt.where(or_(a.old_values.has_key(self.changed_key), a.new_values.has_key(self.changed_key)))
+        if self.contains is not None:
+            stmt = stmt.where(or_(a.old_values.contains(self.contains), a.new_values.contains(self.contains)))
+        return stmt
+
+
+audit_rows = RowSerializer(models.AuditLog, schemas.AuditLogRead)
+
+
+@router.get(
+    "/",
+    response_model=schemas.CursorPage[schemas.AuditLogRead],
+    summary="Журнал аудита",
+    description=(
+        "Keyset-пагинация журнала аудита по (changed_at, id) от новых к старым: передайте next_cursor или "
+        "prev_cursor из предыдущего ответа в параметре cursor. Фильтры: таблица, id записи, операция, период, "
+        "ключ (changed_key) и JSON-содержимое (contains) в old_values/new_values. Журнал хранится "
+        "AUDIT_RETENTION_MONTHS месяцев (0 — без ограничения)."
+    ),
+)
+async def page_audit_log(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    filters: AuditFilters = Depends(),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    paginator = KeysetPaginator([models.AuditLog.changed_at, models.AuditLog.id], cursor, limit, descending=True)
+    result = await db.execute(paginator.apply(filters.apply(audit_rows.select())))
+    return audit_rows.page_response(paginator.page(result.all()))
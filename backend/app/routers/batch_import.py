@@ -1,19 +1,29 @@
 from datetime import datetime
+from typing import AsyncIterator, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from .. import models, schemas
+from .. import importer, models, schemas
+from ..cache import report_cache
+from ..config import get_settings
 from ..db import get_db
+from ..jobs import JobQueueFull, import_pool
+from ..metrics import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 
 @router.post(
     "/sessions",
     response_model=schemas.BatchImportResponse,
     summary="Массовый импорт сессий экранного времени",
-    description="Принимает список сессий экранного времени и загружает их в базу, записывая ход операции в журнал batch_import_logs.",
+    description=(
+        "Принимает список сессий экранного времени и загружает их в базу, записывая ход операции в журнал batch_import_logs. "
+        "Режим mode=copy загружает строки через COPY во временную таблицу и переносит корректные строки одним запросом. "
+        "applications строки — использование приложений в сессии, загружается вместе с ней."
+    ),
 )
 def batch_import_sessions(payload: schemas.BatchImportRequest, db: Session = Depends(get_db)):
     if not payload.rows:
@@ -23,37 +33,13 @@ def batch_import_sessions(payload: schemas.BatchImportRequest, db: Session = Dep
     db.add(log)
     db.flush()  # получить id без коммита
 
-    total_rows = len(payload.rows)
-    success_rows = 0
-    error_rows = 0
-    error_messages: list[str] = []
-
     try:
-        for idx, row in enumerate(payload.rows, start=1):
-            try:
-                if row.ended_at <= row.started_at:
-                    raise ValueError(f"Row {idx}: ended_at must be greater than started_at")
-                if row.active_seconds < 0:
-                    raise ValueError(f"Row {idx}: active_seconds must be non-negative")
-
-                session = models.ScreenSession(**row.model_dump())
-                db.add(session)
-                success_rows += 1
-            except Exception as e:  # noqa: BLE001
-                error_rows += 1
-                error_messages.append(str(e))
-
-        log.total_rows = total_rows
-        log.success_rows = success_rows
-        log.error_rows = error_rows
-        log.finished_at = datetime.utcnow()
-        if error_rows == 0:
-            log.status = "SUCCESS"
-        else:
-            log.status = "FAILED"
-            log.error_message = "\n".join(error_messages)
-
+        result = importer.LOADERS[payload.mode](db, payload.rows)
+        log.total_rows = len(payload.rows)
+        importer.finish_log(log, result)
         db.commit()
+        if result.success_rows:
+            report_cache.invalidate_sessions(payload.rows)
     except Exception as e:  # noqa: BLE001
         db.rollback()
         log.status = "FAILED"
@@ -70,3 +56,139 @@ def batch_import_sessions(payload: schemas.BatchImportRequest, db: Session = Dep
         error_rows=log.error_rows,
         error_message=log.error_message,
     )
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[str]:
+    """Построчно читает тело запроса, не загружая его в память целиком; пустые строки пропускаются."""
+    tail = b""
+    async for chunk in request.stream():
+        tail += chunk
+        *lines, tail = tail.split(b"\n")
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line.decode("utf-8")
+    tail = tail.strip()
+    if tail:
+        yield tail.decode("utf-8")
+
+
+@router.post(
+    "/sessions/stream",
+    response_model=schemas.BatchImportResponse,
+    summary="Потоковый импорт сессий (NDJSON/CSV)",
+    description=(
+        "Принимает тело запроса в формате NDJSON (одна сессия в строке) или CSV (первая строка — заголовок) "
+        "и загружает его порциями по chunk_size строк. Каждая порция коммитится отдельно, прогресс сохраняется "
+        "в batch_import_logs; ошибка в одной порции не отменяет уже загруженные. Использование приложений "
+        "(applications) передается только в NDJSON."
+    ),
+)
+async def stream_import_sessions(
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    mode: Literal["orm", "copy"] = "copy",
+    chunk_size: Optional[int] = Query(None, ge=1, le=100_000),
+    import_type: str = "sessions",
+    file_name: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    chunk_size = chunk_size or get_settings().batch_import_chunk_size
+    loader = importer.LOADERS[mode]
+    parse = importer.parse_ndjson_line if format == "ndjson" else None
+
+    log: Optional[models.BatchImportLog] = None
+    progress = importer.ImportResult()
+    lines: list[str] = []
+    next_row_no = 1
+
+    try:
+        async for line in _iter_lines(request):
+            if parse is None:
+                parse = importer.CsvRowParser(line)
+                continue
+            if log is None:
+                log = await run_in_threadpool(importer.start_log, db, import_type, file_name)
+            lines.append(line)
+            if len(lines) >= chunk_size:
+                await run_in_threadpool(importer.import_chunk, db, log, loader, parse, lines, next_row_no, progress)
+                next_row_no += len(lines)
+                lines = []
+        if log is not None and lines:
+            await run_in_threadpool(importer.import_chunk, db, log, loader, parse, lines, next_row_no, progress)
+    except Exception as e:
+        # Ошибка чтения тела (кодировка, разрыв соединения клиентом): журнал не должен остаться IN_PROGRESS
+        if log is not None:
+            await run_in_threadpool(importer.fail_log, db, log, f"Fatal error: {e}")
+        raise
+
+    if log is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No rows provided")
+
+    def finish() -> schemas.BatchImportResponse:
+        importer.finish_log(log, progress)
+        db.commit()
+        return schemas.BatchImportResponse(
+            id=log.id,
+            status=log.status,
+            total_rows=log.total_rows,
+            success_rows=log.success_rows,
+            error_rows=log.error_rows,
+            error_message=log.error_message,
+        )
+
+    return await run_in_threadpool(finish)
+
+
+@router.post(
+    "/sessions/jobs",
+    response_model=schemas.BatchImportResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Фоновый импорт сессий",
+    description=(
+        "Ставит импорт в очередь и сразу возвращает id записи batch_import_logs. Импорт выполняется в ограниченном "
+        "пуле фоновых потоков (IMPORT_WORKERS), прогресс доступен через GET /api/batch-import/{id}. "
+        "Если очередь заполнена, возвращается 429."
+    ),
+)
+def submit_import_job(payload: schemas.BatchImportRequest, db: Session = Depends(get_db)):
+    if not payload.rows:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No rows provided")
+    if not import_pool.has_capacity():
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Import queue is full")
+
+    log = importer.start_log(db, payload.import_type, payload.file_name, total_rows=len(payload.rows))
+    try:
+        import_pool.submit(
+            importer.run_import_job, log.id, payload.rows, payload.mode, get_settings().batch_import_chunk_size, key=log.id
+        )
+    except JobQueueFull:
+        log.status = "FAILED"
+        log.error_message = "Import queue is full"
+        log.finished_at = datetime.utcnow()
+        db.commit()
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Import queue is full")
+
+    return schemas.BatchImportResponse(
+        id=log.id,
+        status=log.status,
+        total_rows=log.total_rows,
+        success_rows=log.success_rows,
+        error_rows=log.error_rows,
+        error_message=log.error_message,
+    )
+
+
+@router.get(
+    "/{import_id}",
+    response_model=schemas.BatchImportStatusRead,
+    summary="Состояние импорта",
+    description="Возвращает текущие счетчики импорта из batch_import_logs и оценку оставшегося времени (eta_seconds) для выполняющихся импортов.",
+)
+def get_import_status(import_id: int, db: Session = Depends(get_db)):
+    log = db.query(models.BatchImportLog).get(import_id)
+    if not log:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import not found")
+    result = schemas.BatchImportStatusRead.model_validate(log)
+    result.eta_seconds = importer.estimate_eta_seconds(log)
+    return result
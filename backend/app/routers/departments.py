@@ -1,35 +1,92 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
 
 from .. import models, schemas
-from ..db import get_db
+from ..cache import report_cache
+from ..db import get_db, get_read_db
+from ..metrics import TimedRoute
+from ..utils.expand import Expansion, expand_param
+from ..utils.fast_json import RowSerializer
+from ..utils.pagination import KeysetPaginator
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+department_rows = RowSerializer(models.Department, schemas.DepartmentRead)
+department_expand = expand_param(
+    {
+        "employees": selectinload(models.Department.employees),
+        "workstations": selectinload(models.Department.workstations),
+    }
+)
 
 
 @router.get(
     "/",
-    response_model=List[schemas.DepartmentRead],
+    response_model=List[schemas.DepartmentExpandedRead],
+    response_model_exclude_unset=True,
     summary="Список отделов",
-    description="Возвращает постраничный список подразделений компании.",
+    description=(
+        "Возвращает постраничный список подразделений компании. "
+        "expand=employees,workstations добавляет сотрудников и рабочие станции отделов (по одному запросу на связь)."
+    ),
 )
-def list_departments(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Department).offset(skip).limit(limit).all()
+def list_departments(
+    skip: int = 0,
+    limit: int = 100,
+    expansion: Expansion = Depends(department_expand),
+    db: Session = Depends(get_read_db),
+):
+    if not expansion.fields:
+        # Без связей — быстрый путь: кортежи колонок без ORM-объектов и проверки моделей
+        stmt = department_rows.select().order_by(models.Department.id).offset(skip).limit(limit)
+        return department_rows.response(db.execute(stmt).all())
+    stmt = select(models.Department).options(*expansion.options()).order_by(models.Department.id).offset(skip).limit(limit)
+    return expansion.dump_all(db.execute(stmt).scalars().all(), schemas.DepartmentExpandedRead)
+
+
+@router.get(
+    "/page",
+    response_model=schemas.CursorPage[schemas.DepartmentExpandedRead],
+    response_model_exclude_unset=True,
+    summary="Список отделов (курсорная пагинация)",
+    description=(
+        "Keyset-пагинация по id: передайте next_cursor или prev_cursor из предыдущего ответа в параметре cursor. "
+        "Параметр expand — как у списка отделов."
+    ),
+)
+def page_departments(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    expansion: Expansion = Depends(department_expand),
+    db: Session = Depends(get_read_db),
+):
+    paginator = KeysetPaginator([models.Department.id], cursor, limit)
+    if not expansion.fields:
+        return department_rows.page_response(paginator.page(db.execute(paginator.apply(department_rows.select())).all()))
+    rows = db.execute(paginator.apply(select(models.Department).options(*expansion.options()))).scalars().all()
+    page = paginator.page(rows)
+    page["items"] = expansion.dump_all(page["items"], schemas.DepartmentExpandedRead)
+    return page
 
 
 @router.get(
     "/{department_id}",
-    response_model=schemas.DepartmentRead,
+    response_model=schemas.DepartmentExpandedRead,
+    response_model_exclude_unset=True,
     summary="Получить отдел по ID",
-    description="Возвращает сведения о подразделении по его идентификатору.",
+    description=(
+        "Возвращает сведения о подразделении по его идентификатору. "
+        "expand=employees,workstations добавляет сотрудников и рабочие станции отдела."
+    ),
 )
-def get_department(department_id: int, db: Session = Depends(get_db)):
-    department = db.query(models.Department).get(department_id)
+def get_department(department_id: int, expansion: Expansion = Depends(department_expand), db: Session = Depends(get_db)):
+    department = db.get(models.Department, department_id, options=expansion.options())
     if not department:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Department not found")
-    return department
+    return expansion.dump(department, schemas.DepartmentExpandedRead)
 
 
 @router.post(
@@ -63,6 +120,8 @@ def update_department(department_id: int, payload: schemas.DepartmentBase, db: S
 
     db.commit()
     db.refresh(department)
+    # Название отдела есть в отчетах по отделам и сотрудникам
+    report_cache.invalidate()
     return department
 
 
@@ -78,4 +137,5 @@ def delete_department(department_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Department not found")
     db.delete(department)
     db.commit()
+    report_cache.invalidate()
     return None
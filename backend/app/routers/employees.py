@@ -1,35 +1,98 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
 
-from .. import models, schemas
-from ..db import get_db
+from .. import bulk, models, schemas
+from ..cache import report_cache
+from ..db import get_db, get_read_db
+from ..metrics import TimedRoute
+from ..utils.expand import Expansion, expand_param
+from ..utils.fast_json import RowSerializer
+from ..utils.pagination import KeysetPaginator
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+employee_bulk = bulk.BulkSpec(
+    models.Employee,
+    key="email",
+    references={"department_id": models.Department, "position_id": models.Position},
+)
+
+employee_rows = RowSerializer(models.Employee, schemas.EmployeeRead)
+employee_expand = expand_param(
+    {
+        "department": joinedload(models.Employee.department),
+        "position": joinedload(models.Employee.position),
+    }
+)
 
 
 @router.get(
     "/",
-    response_model=List[schemas.EmployeeRead],
+    response_model=List[schemas.EmployeeExpandedRead],
+    response_model_exclude_unset=True,
     summary="Список сотрудников",
-    description="Возвращает постраничный список сотрудников с возможностью задать смещение (skip) и лимит (limit).",
+    description=(
+        "Возвращает постраничный список сотрудников с возможностью задать смещение (skip) и лимит (limit). "
+        "expand=department,position добавляет отдел и должность (в том же запросе к БД)."
+    ),
 )
-def list_employees(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Employee).offset(skip).limit(limit).all()
+def list_employees(
+    skip: int = 0,
+    limit: int = 100,
+    expansion: Expansion = Depends(employee_expand),
+    db: Session = Depends(get_read_db),
+):
+    if not expansion.fields:
+        # Без связей — быстрый путь: кортежи колонок без ORM-объектов и проверки моделей
+        stmt = employee_rows.select().order_by(models.Employee.id).offset(skip).limit(limit)
+        return employee_rows.response(db.execute(stmt).all())
+    stmt = select(models.Employee).options(*expansion.options()).order_by(models.Employee.id).offset(skip).limit(limit)
+    return expansion.dump_all(db.execute(stmt).scalars().all(), schemas.EmployeeExpandedRead)
+
+
+@router.get(
+    "/page",
+    response_model=schemas.CursorPage[schemas.EmployeeExpandedRead],
+    response_model_exclude_unset=True,
+    summary="Список сотрудников (курсорная пагинация)",
+    description=(
+        "Keyset-пагинация по id: передайте next_cursor или prev_cursor из предыдущего ответа в параметре cursor. "
+        "Параметр expand — как у списка сотрудников."
+    ),
+)
+def page_employees(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    expansion: Expansion = Depends(employee_expand),
+    db: Session = Depends(get_read_db),
+):
+    paginator = KeysetPaginator([models.Employee.id], cursor, limit)
+    if not expansion.fields:
+        return employee_rows.page_response(paginator.page(db.execute(paginator.apply(employee_rows.select())).all()))
+    rows = db.execute(paginator.apply(select(models.Employee).options(*expansion.options()))).scalars().all()
+    page = paginator.page(rows)
+    page["items"] = expansion.dump_all(page["items"], schemas.EmployeeExpandedRead)
+    return page
 
 
 @router.get(
     "/{employee_id}",
-    response_model=schemas.EmployeeRead,
+    response_model=schemas.EmployeeExpandedRead,
+    response_model_exclude_unset=True,
     summary="Получить сотрудника по ID",
-    description="Возвращает подробную информацию о сотруднике по его идентификатору.",
+    description=(
+        "Возвращает подробную информацию о сотруднике по его идентификатору. "
+        "expand=department,position добавляет отдел и должность."
+    ),
 )
-def get_employee(employee_id: int, db: Session = Depends(get_db)):
-    employee = db.query(models.Employee).get(employee_id)
+def get_employee(employee_id: int, expansion: Expansion = Depends(employee_expand), db: Session = Depends(get_db)):
+    employee = db.get(models.Employee, employee_id, options=expansion.options())
     if not employee:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Employee not found")
-    return employee
+    return expansion.dump(employee, schemas.EmployeeExpandedRead)
 
 
 @router.post(
@@ -63,6 +126,8 @@ def update_employee(employee_id: int, payload: schemas.EmployeeUpdate, db: Sessi
 
     db.commit()
     db.refresh(employee)
+    # ФИО и отдел входят в отчеты за любые даты
+    report_cache.invalidate(employee_ids=[employee_id])
     return employee
 
 
@@ -78,4 +143,61 @@ def delete_employee(employee_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Employee not found")
     db.delete(employee)
     db.commit()
+    report_cache.invalidate(employee_ids=[employee_id])
     return None
+
+
+@router.post(
+    "/bulk",
+    response_model=schemas.BulkResponse[schemas.EmployeeRead],
+    summary="Массовое создание сотрудников",
+    description=(
+        "Создает сотрудников списком в одной транзакции (один INSERT ... ON CONFLICT (email) ... RETURNING). "
+        "on_conflict задает действие, если email уже существует: error — ошибка элемента, skip — пропустить, "
+        "update — обновить запись. Ошибки отдельных элементов (несуществующие ссылки, дубликаты) возвращаются "
+        "в items, корректные элементы сохраняются."
+    ),
+)
+def bulk_create_employees(payload: schemas.BulkCreateRequest[schemas.EmployeeCreate], db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.items))
+    outcome = bulk.bulk_create(db, employee_bulk, payload.items, payload.on_conflict)
+    db.commit()
+    if outcome.ids("updated"):
+        report_cache.invalidate(employee_ids=outcome.ids("updated"))
+    return outcome.response()
+
+
+@router.patch(
+    "/bulk",
+    response_model=schemas.BulkResponse[schemas.EmployeeRead],
+    summary="Массовое обновление сотрудников",
+    description=(
+        "Изменяет сотрудников списком в одной транзакции: каждый элемент содержит id и изменяемые поля. "
+        "Несуществующие id и ошибки отдельных элементов возвращаются в items."
+    ),
+)
+def bulk_update_employees(payload: schemas.BulkUpdateRequest[schemas.EmployeeBulkUpdateItem], db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.items))
+    outcome = bulk.bulk_update(db, employee_bulk, payload.items)
+    db.commit()
+    if outcome.ids("updated"):
+        report_cache.invalidate(employee_ids=outcome.ids("updated"))
+    return outcome.response()
+
+
+@router.post(
+    "/bulk/delete",
+    response_model=schemas.BulkResponse[schemas.EmployeeRead],
+    summary="Массовое удаление сотрудников",
+    description=(
+        "Удаляет сотрудников по списку id одним DELETE ... RETURNING. "
+        "Несуществующие id и элементы, удаление которых запрещено ограничениями, возвращаются в items с ошибкой."
+    ),
+)
+def bulk_delete_employees(payload: schemas.BulkDeleteRequest, db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.ids))
+    outcome = bulk.bulk_delete(db, employee_bulk, payload.ids)
+    db.commit()
+    if outcome.ids("deleted"):
+        report_cache.invalidate(employee_ids=outcome.ids("deleted"))
+    return outcome.response()
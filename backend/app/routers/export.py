@@ -0,0 +1,111 @@
+from datetime import date
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy import Date, Integer, Numeric, Select, String, column, select, table
+
+from .. import models
+from ..db import async_read_session_factory
+from ..metrics import TimedRoute
+from ..utils.export_stream import export_response
+from .sessions import SessionFilters, session_rows
+
+router = APIRouter(route_class=TimedRoute)
+
+ExportFormat = Annotated[
+    Literal["csv", "ndjson", "arrow", "parquet"],
+    Query(
+        alias="format",
+        description="csv — с заголовком, ndjson — JSON-объект на строку, arrow — Arrow IPC stream, parquet — Parquet (zstd)",
+    ),
+]
+
+_EXPORT_NOTE = (
+    " Ответ передается потоком без загрузки выборки в память; при Accept-Encoding: gzip"
+    " сжимается на лету (кроме Parquet)."
+)
+_RESPONSE_DESCRIPTION = "CSV, NDJSON, Arrow IPC или Parquet (Content-Disposition: attachment)"
+
+v_employee_daily_stats = table(
+    "v_employee_daily_stats",
+    column("employee_id", Integer),
+    column("first_name", String),
+    column("last_name", String),
+    column("department_name", String),
+    column("position_name", String),
+    column("stat_date", Date),
+    column("total_seconds", Integer),
+    column("sessions_count", Integer),
+    column("avg_session_seconds", Numeric),
+    schema=models.SCHEMA,
+)
+
+
+class DailyStatsFilters:
+    """Фильтры суточной статистики: период (включительно), сотрудник, отдел сотрудника."""
+
+    def __init__(
+        self,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        employee_id: Optional[int] = None,
+        department_id: Annotated[Optional[int], Query(description="Отдел сотрудника")] = None,
+    ):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.employee_id = employee_id
+        self.department_id = department_id
+
+    def apply(self, stmt: Select, source) -> Select:
+        if self.date_from is not None:
+            stmt = stmt.where(source.c.stat_date >= self.date_from)
+        if self.date_to is not None:
+            stmt = stmt.where(source.c.stat_date <= self.date_to)
+        if self.employee_id is not None:
+            stmt = stmt.where(source.c.employee_id == self.employee_id)
+        if self.department_id is not None:
+            stmt = stmt.where(
+                source.c.employee_id.in_(
+                    select(models.Employee.id).where(models.Employee.department_id == self.department_id)
+                )
+            )
+        return stmt.order_by(source.c.stat_date, source.c.employee_id)
+
+
+@router.get(
+    "/sessions",
+    summary="Выгрузка сессий",
+    description="Выгружает сессии экрана с теми же фильтрами, что и список сессий, в порядке начала сессии."
+    + _EXPORT_NOTE,
+    response_description=_RESPONSE_DESCRIPTION,
+)
+async def export_sessions(request: Request, fmt: ExportFormat = "csv", filters: SessionFilters = Depends()):
+    s = models.ScreenSession
+    stmt = filters.apply(session_rows.select()).order_by(s.started_at, s.id)
+    return export_response(request, await async_read_session_factory(), stmt, fmt, "sessions")
+
+
+@router.get(
+    "/daily-stats",
+    summary="Выгрузка суточной статистики сотрудников",
+    description="Выгружает daily_employee_stats за период (включительно) по сотруднику или отделу." + _EXPORT_NOTE,
+    response_description=_RESPONSE_DESCRIPTION,
+)
+async def export_daily_stats(request: Request, fmt: ExportFormat = "csv", filters: DailyStatsFilters = Depends()):
+    source = models.DailyEmployeeStat.__table__
+    stmt = filters.apply(select(source), source)
+    return export_response(request, await async_read_session_factory(), stmt, fmt, "daily-stats")
+
+
+@router.get(
+    "/employee-daily-stats",
+    summary="Выгрузка суточной статистики с данными сотрудников",
+    description="Выгружает представление v_employee_daily_stats (имя, отдел и должность сотрудника) за период "
+    "по сотруднику или отделу." + _EXPORT_NOTE,
+    response_description=_RESPONSE_DESCRIPTION,
+)
+async def export_employee_daily_stats(
+    request: Request, fmt: ExportFormat = "csv", filters: DailyStatsFilters = Depends()
+):
+    stmt = filters.apply(select(v_employee_daily_stats), v_employee_daily_stats)
+    return export_response(request, await async_read_session_factory(), stmt, fmt, "employee-daily-stats")
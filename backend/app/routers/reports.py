@@ -1,44 +1,78 @@
 from datetime import date
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import schemas
-from ..db import get_db
+from ..cache import cached_report, report_cache
+from ..db import get_async_read_db, replica_lag_window
+from ..metrics import TimedRoute
 from ..utils import sql as sql_utils
+from ..utils.fast_json import rows_adapter
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+# Строки отчетов сериализуются по TypedDict с полями схем ответа, без создания моделей.
+# Отчеты, число строк которых растет с числом сотрудников, читаются серверным курсором порциями
+# (stream_json_async), остальные — одним запросом (fetch_json_async).
+_employee_daily_adapter = rows_adapter(schemas.EmployeeDailyStatRead)
+_department_daily_adapter = rows_adapter(schemas.DepartmentDailyStatRead)
+_last_activity_adapter = rows_adapter(schemas.EmployeeLastActivityRead)
+_top_overworked_adapter = rows_adapter(schemas.TopOverworkedEmployeeRead)
+_department_load_adapter = rows_adapter(schemas.DepartmentLoadRead)
+_employee_productivity_adapter = rows_adapter(schemas.EmployeeProductivityRead)
+_department_productivity_adapter = rows_adapter(schemas.DepartmentProductivityRead)
+_top_applications_adapter = rows_adapter(schemas.TopApplicationRead)
+
+_CACHE_NOTE = " Ответ кэшируется; поддерживается If-None-Match (304 Not Modified)."
 
 
 @router.get(
     "/employee-daily",
     response_model=List[schemas.EmployeeDailyStatRead],
     summary="Суточная статистика по сотруднику",
-    description="Возвращает агрегированную статистику по сотруднику за указанный день (общее время, число сессий, средняя длительность).",
+    description="Возвращает агрегированную статистику по сотруднику за указанный день (общее время, число сессий, средняя длительность)."
+    + _CACHE_NOTE,
 )
-def employee_daily(employee_id: int, stat_date: date, db: Session = Depends(get_db)):
-    rows = sql_utils.fetch_all(
-        db,
-        "SELECT * FROM screentime.v_employee_daily_stats WHERE employee_id = :employee_id AND stat_date = :stat_date",
-        {"employee_id": employee_id, "stat_date": stat_date},
+async def employee_daily(request: Request, employee_id: int, stat_date: date, db: AsyncSession = Depends(get_async_read_db)):
+    params = {"employee_id": employee_id, "stat_date": stat_date}
+    return await cached_report(
+        request,
+        "employee_daily",
+        params,
+        lambda: sql_utils.fetch_json_async(
+            db,
+            "SELECT * FROM screentime.v_employee_daily_stats WHERE employee_id = :employee_id AND stat_date = :stat_date",
+            params,
+            _employee_daily_adapter,
+        ),
+        date_from=stat_date,
+        date_to=stat_date,
+        employee_id=employee_id,
+        stale_window=replica_lag_window(db),
     )
-    return rows
 
 
 @router.get(
     "/department-daily",
     response_model=List[schemas.DepartmentDailyStatRead],
     summary="Суточная статистика по отделам",
-    description="Возвращает суммарное экранное время и количество сессий по каждому отделу за выбранную дату.",
+    description="Возвращает суммарное экранное время и количество сессий по каждому отделу за выбранную дату." + _CACHE_NOTE,
 )
-def department_daily(stat_date: date, db: Session = Depends(get_db)):
-    rows = sql_utils.fetch_all(
-        db,
-        "SELECT * FROM screentime.v_department_daily_stats WHERE stat_date = :stat_date",
-        {"stat_date": stat_date},
+async def department_daily(request: Request, stat_date: date, db: AsyncSession = Depends(get_async_read_db)):
+    params = {"stat_date": stat_date}
+    return await cached_report(
+        request,
+        "department_daily",
+        params,
+        lambda: sql_utils.fetch_json_async(
+            db, "SELECT * FROM screentime.v_department_daily_stats WHERE stat_date = :stat_date", params, _department_daily_adapter
+        ),
+        date_from=stat_date,
+        date_to=stat_date,
+        stale_window=replica_lag_window(db),
     )
-    return rows
 
 
 @router.get(
@@ -47,36 +81,198 @@ def department_daily(stat_date: date, db: Session = Depends(get_db)):
     summary="Последняя активность сотрудников",
     description="Возвращает последнюю зафиксированную сессию экранного времени для каждого сотрудника.",
 )
-def last_activity(db: Session = Depends(get_db)):
-    rows = sql_utils.fetch_all(db, "SELECT * FROM screentime.v_employee_last_activity")
-    return rows
+async def last_activity(db: AsyncSession = Depends(get_async_read_db)):
+    body = await sql_utils.stream_json_async(db, "SELECT * FROM screentime.v_employee_last_activity", None, _last_activity_adapter)
+    return Response(content=body, media_type="application/json")
 
 
 @router.get(
     "/top-overworked",
     response_model=List[schemas.TopOverworkedEmployeeRead],
     summary="Список перегруженных сотрудников",
-    description="Возвращает сотрудников, у которых среднесуточное экранное время за период превышает заданный порог (min_hours_per_day).",
+    description="Возвращает сотрудников, у которых среднесуточное экранное время за период превышает заданный порог (min_hours_per_day)."
+    + _CACHE_NOTE,
 )
-def top_overworked(date_from: date, date_to: date, min_hours_per_day: float = 8.0, db: Session = Depends(get_db)):
-    rows = sql_utils.fetch_all(
-        db,
-        "SELECT * FROM screentime.fn_top_overworked_employees(:date_from, :date_to, :min_hours_per_day)",
-        {"date_from": date_from, "date_to": date_to, "min_hours_per_day": min_hours_per_day},
+async def top_overworked(
+    request: Request,
+    date_from: date,
+    date_to: date,
+    min_hours_per_day: float = 8.0,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    params = {"date_from": date_from, "date_to": date_to, "min_hours_per_day": min_hours_per_day}
+    return await cached_report(
+        request,
+        "top_overworked",
+        params,
+        lambda: sql_utils.stream_json_async(
+            db,
+            "SELECT * FROM screentime.fn_top_overworked_employees(:date_from, :date_to, :min_hours_per_day)",
+            params,
+            _top_overworked_adapter,
+        ),
+        date_from=date_from,
+        date_to=date_to,
+        stale_window=replica_lag_window(db),
     )
-    return rows
 
 
 @router.get(
     "/department-load",
     response_model=List[schemas.DepartmentLoadRead],
     summary="Нагрузка по отделам за период",
-    description="Возвращает суммарное и среднее экранное время по каждому отделу за указанный период.",
+    description="Возвращает суммарное и среднее экранное время по каждому отделу за указанный период." + _CACHE_NOTE,
+)
+async def department_load(request: Request, date_from: date, date_to: date, db: AsyncSession = Depends(get_async_read_db)):
+    params = {"date_from": date_from, "date_to": date_to}
+    return await cached_report(
+        request,
+        "department_load",
+        params,
+        lambda: sql_utils.fetch_json_async(
+            db, "SELECT * FROM screentime.fn_department_load(:date_from, :date_to)", params, _department_load_adapter
+        ),
+        date_from=date_from,
+        date_to=date_to,
+        stale_window=replica_lag_window(db),
+    )
+
+
+@router.get(
+    "/employee-productivity",
+    response_model=List[schemas.EmployeeProductivityRead],
+    summary="Продуктивность сотрудника за период",
+    description=(
+        "Возвращает время сотрудника в продуктивных и непродуктивных приложениях за период и долю продуктивного "
+        "времени (по daily_employee_app_stats). Пустой список — за период нет данных об использовании приложений."
+    )
+    + _CACHE_NOTE,
+)
+async def employee_productivity(
+    request: Request, employee_id: int, date_from: date, date_to: date, db: AsyncSession = Depends(get_async_read_db)
+):
+    params = {"employee_id": employee_id, "date_from": date_from, "date_to": date_to}
+    return await cached_report(
+        request,
+        "employee_productivity",
+        params,
+        lambda: sql_utils.fetch_json_async(
+            db,
+            "SELECT * FROM screentime.fn_employee_productivity(:employee_id, :date_from, :date_to)",
+            params,
+            _employee_productivity_adapter,
+        ),
+        date_from=date_from,
+        date_to=date_to,
+        employee_id=employee_id,
+        stale_window=replica_lag_window(db),
+    )
+
+
+@router.get(
+    "/department-productivity",
+    response_model=List[schemas.DepartmentProductivityRead],
+    summary="Продуктивность отделов за период",
+    description=(
+        "Возвращает время в продуктивных и непродуктивных приложениях и долю продуктивного времени по каждому отделу "
+        "(или по одному отделу, если задан department_id) за период, от самых продуктивных отделов к наименее."
+    )
+    + _CACHE_NOTE,
 )
-def department_load(date_from: date, date_to: date, db: Session = Depends(get_db)):
-    rows = sql_utils.fetch_all(
-        db,
-        "SELECT * FROM screentime.fn_department_load(:date_from, :date_to)",
-        {"date_from": date_from, "date_to": date_to},
+async def department_productivity(
+    request: Request,
+    date_from: date,
+    date_to: date,
+    department_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    params = {"date_from": date_from, "date_to": date_to, "department_id": department_id}
+    return await cached_report(
+        request,
+        "department_productivity",
+        params,
+        lambda: sql_utils.fetch_json_async(
+            db,
+            "SELECT * FROM screentime.fn_department_productivity(:date_from, :date_to, :department_id)",
+            params,
+            _department_productivity_adapter,
+        ),
+        date_from=date_from,
+        date_to=date_to,
+        stale_window=replica_lag_window(db),
     )
-    return rows
+
+
+@router.get(
+    "/employee-top-applications",
+    response_model=List[schemas.TopApplicationRead],
+    summary="Самые используемые приложения сотрудника",
+    description="Возвращает limit приложений с наибольшим временем использования сотрудником за период и их долю во всем времени."
+    + _CACHE_NOTE,
+)
+async def employee_top_applications(
+    request: Request,
+    employee_id: int,
+    date_from: date,
+    date_to: date,
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    params = {"employee_id": employee_id, "date_from": date_from, "date_to": date_to, "limit": limit}
+    return await cached_report(
+        request,
+        "employee_top_applications",
+        params,
+        lambda: sql_utils.fetch_json_async(
+            db,
+            "SELECT * FROM screentime.fn_employee_top_applications(:employee_id, :date_from, :date_to, :limit)",
+            params,
+            _top_applications_adapter,
+        ),
+        date_from=date_from,
+        date_to=date_to,
+        employee_id=employee_id,
+        stale_window=replica_lag_window(db),
+    )
+
+
+@router.get(
+    "/department-top-applications",
+    response_model=List[schemas.TopApplicationRead],
+    summary="Самые используемые приложения отдела",
+    description="Возвращает limit приложений с наибольшим временем использования сотрудниками отдела за период и их долю во всем времени."
+    + _CACHE_NOTE,
+)
+async def department_top_applications(
+    request: Request,
+    department_id: int,
+    date_from: date,
+    date_to: date,
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    params = {"department_id": department_id, "date_from": date_from, "date_to": date_to, "limit": limit}
+    return await cached_report(
+        request,
+        "department_top_applications",
+        params,
+        lambda: sql_utils.fetch_json_async(
+            db,
+            "SELECT * FROM screentime.fn_department_top_applications(:department_id, :date_from, :date_to, :limit)",
+            params,
+            _top_applications_adapter,
+        ),
+        date_from=date_from,
+        date_to=date_to,
+        stale_window=replica_lag_window(db),
+    )
+
+
+@router.get(
+    "/cache/stats",
+    response_model=schemas.ReportCacheStatsRead,
+    summary="Статистика кэша отчетов",
+    description="Число записей и занятый объем, попадания и промахи, ответы 304, вытеснения и сбросы кэша отчетов этого процесса.",
+)
+def cache_stats():
+    return report_cache.stats()
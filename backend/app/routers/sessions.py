@@ -1,35 +1,163 @@
-from typing import List
+from datetime import date, datetime
+from typing import Annotated, List, Optional, Set
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import Select, delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
-from .. import models, schemas
-from ..db import get_db
+from .. import importer, models, schemas
+from ..cache import report_cache
+from ..db import get_async_db, get_async_read_db
+from ..metrics import TimedRoute
+from ..utils.expand import Expansion, expand_param
+from ..utils.fast_json import RowSerializer
+from ..utils.pagination import KeysetPaginator
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+
+class SessionFilters:
+    """Фильтры списка сессий. Каждый фильтр обслуживается индексом screen_sessions:
+    сотрудник и отдел — (employee_id, started_at, id), рабочая станция — (workstation_id, started_at, id),
+    период — (started_at, id) и BRIN по started_at; min_active_seconds проверяется поверх них."""
+
+    def __init__(
+        self,
+        employee_id: Optional[int] = None,
+        workstation_id: Optional[int] = None,
+        department_id: Annotated[Optional[int], Query(description="Отдел сотрудника")] = None,
+        started_from: Annotated[Optional[datetime], Query(description="Начало сессии не раньше (включительно)")] = None,
+        started_to: Annotated[Optional[datetime], Query(description="Начало сессии раньше (не включительно)")] = None,
+        min_active_seconds: Annotated[Optional[int], Query(ge=0)] = None,
+    ):
+        self.employee_id = employee_id
+        self.workstation_id = workstation_id
+        self.department_id = department_id
+        self.started_from = started_from
+        self.started_to = started_to
+        self.min_active_seconds = min_active_seconds
+
+    def apply(self, stmt: Select) -> Select:
+        s = models.ScreenSession
+        if self.employee_id is not None:
+            stmt = stmt.where(s.employee_id == self.employee_id)
+        if self.workstation_id is not None:
+            stmt = stmt.where(s.workstation_id == self.workstation_id)
+        if self.department_id is not None:
+            stmt = stmt.where(
+                s.employee_id.in_(select(models.Employee.id).where(models.Employee.department_id == self.department_id))
+            )
+        if self.started_from is not None:
+            stmt = stmt.where(s.started_at >= self.started_from)
+        if self.started_to is not None:
+            stmt = stmt.where(s.started_at < self.started_to)
+        if self.min_active_seconds is not None:
+            stmt = stmt.where(s.active_seconds >= self.min_active_seconds)
+        return stmt
+
+
+session_rows = RowSerializer(models.ScreenSession, schemas.ScreenSessionRead)
+session_expand = expand_param(
+    {
+        "employee": joinedload(models.ScreenSession.employee),
+        "workstation": joinedload(models.ScreenSession.workstation),
+        "applications": selectinload(models.ScreenSession.applications).joinedload(models.SessionApplicationUsage.application),
+    }
+)
+
+
+# Месяцы, секции которых этот процесс уже создал или проверил. Доверять им можно только для текущего
+# и будущих месяцев: maintain_partitions удаляет или отсоединяет лишь прошедшие месяцы, и после этого
+# вставка за такой месяц без повторной проверки попала бы в DEFAULT-секцию.
+_partition_months: Set[date] = set()
+
+
+async def ensure_session_partition(db: AsyncSession, started_at: datetime) -> None:
+    """Создает месячную секцию screen_sessions для started_at до вставки, иначе строка попадет в DEFAULT-секцию,
+    и секцию этого месяца потом создать уже не удастся. Как и importer.ensure_partitions — в отдельной
+    короткой транзакции: создание секции блокирует родительскую таблицу."""
+    month = started_at.date().replace(day=1)
+    if month in _partition_months and month >= date.today().replace(day=1):
+        return
+    async with db.bind.begin() as conn:
+        await conn.execute(
+            text("SELECT screentime.fn_ensure_screen_sessions_partitions(:month, :month)"), {"month": month}
+        )
+    _partition_months.add(month)
 
 
 @router.get(
     "/",
-    response_model=List[schemas.ScreenSessionRead],
+    response_model=List[schemas.ScreenSessionExpandedRead],
+    response_model_exclude_unset=True,
     summary="Список сессий экранного времени",
-    description="Возвращает постраничный список сессий экранного времени, отсортированных по дате начала (от новых к старым).",
+    description=(
+        "Возвращает постраничный список сессий экранного времени, отсортированных по дате начала (от новых к старым). "
+        "Поддерживает фильтры по сотруднику, рабочей станции, отделу, периоду и минимальному активному времени. "
+        "expand=employee,workstation,applications добавляет сотрудника, рабочую станцию и использование приложений."
+    ),
 )
-def list_sessions(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.ScreenSession).order_by(models.ScreenSession.started_at.desc()).offset(skip).limit(limit).all()
+async def list_sessions(
+    skip: int = 0,
+    limit: int = 100,
+    filters: SessionFilters = Depends(),
+    expansion: Expansion = Depends(session_expand),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    s = models.ScreenSession
+    stmt = select(s).options(*expansion.options()) if expansion.fields else session_rows.select()
+    stmt = filters.apply(stmt).order_by(s.started_at.desc(), s.id.desc()).offset(skip).limit(limit)
+    result = await db.execute(stmt)
+    if not expansion.fields:
+        # Без связей — быстрый путь: кортежи колонок без ORM-объектов и проверки моделей
+        return session_rows.response(result.all())
+    return expansion.dump_all(result.scalars().all(), schemas.ScreenSessionExpandedRead)
+
+
+@router.get(
+    "/page",
+    response_model=schemas.CursorPage[schemas.ScreenSessionExpandedRead],
+    response_model_exclude_unset=True,
+    summary="Список сессий (курсорная пагинация)",
+    description=(
+        "Keyset-пагинация по (started_at, id) от новых к старым. Стоимость любой страницы одинакова, "
+        "а вставка новых сессий не сдвигает содержимое страниц. Передайте next_cursor или prev_cursor "
+        "из предыдущего ответа в параметре cursor. Фильтры и expand те же, что и у списка сессий."
+    ),
+)
+async def page_sessions(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    filters: SessionFilters = Depends(),
+    expansion: Expansion = Depends(session_expand),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    paginator = KeysetPaginator([models.ScreenSession.started_at, models.ScreenSession.id], cursor, limit, descending=True)
+    if not expansion.fields:
+        result = await db.execute(paginator.apply(filters.apply(session_rows.select())))
+        return session_rows.page_response(paginator.page(result.all()))
+    stmt = paginator.apply(filters.apply(select(models.ScreenSession)).options(*expansion.options()))
+    page = paginator.page((await db.execute(stmt)).scalars().all())
+    page["items"] = expansion.dump_all(page["items"], schemas.ScreenSessionExpandedRead)
+    return page
 
 
 @router.get(
     "/{session_id}",
-    response_model=schemas.ScreenSessionRead,
+    response_model=schemas.ScreenSessionExpandedRead,
+    response_model_exclude_unset=True,
     summary="Получить сессию по ID",
-    description="Возвращает данные о конкретной сессии экранного времени по ее идентификатору.",
+    description=(
+        "Возвращает данные о конкретной сессии экранного времени по ее идентификатору. "
+        "expand=employee,workstation,applications добавляет связанные данные."
+    ),
 )
-def get_session(session_id: int, db: Session = Depends(get_db)):
-    session = db.query(models.ScreenSession).get(session_id)
+async def get_session(session_id: int, expansion: Expansion = Depends(session_expand), db: AsyncSession = Depends(get_async_db)):
+    session = await db.get(models.ScreenSession, session_id, options=expansion.options())
     if not session:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-    return session
+    return expansion.dump(session, schemas.ScreenSessionExpandedRead)
 
 
 @router.post(
@@ -37,18 +165,24 @@ def get_session(session_id: int, db: Session = Depends(get_db)):
     response_model=schemas.ScreenSessionRead,
     status_code=status.HTTP_201_CREATED,
     summary="Создать сессию экранного времени",
-    description="Создает новую запись о сессии экранного времени сотрудника за конкретной рабочей станцией.",
+    description=(
+        "Создает новую запись о сессии экранного времени сотрудника за конкретной рабочей станцией. "
+        "applications — разбивка активного времени по приложениям (session_application_usage), "
+        "сохраняется вместе с сессией."
+    ),
 )
-def create_session(payload: schemas.ScreenSessionCreate, db: Session = Depends(get_db)):
-    if payload.ended_at <= payload.started_at:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ended_at must be greater than started_at")
-    if payload.active_seconds < 0:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="active_seconds must be non-negative")
+async def create_session(payload: schemas.ScreenSessionCreate, db: AsyncSession = Depends(get_async_db)):
+    # Проверки и ORM-объект — общие с batch-импортом
+    error = importer.validate_row(payload)
+    if error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
 
-    session = models.ScreenSession(**payload.model_dump())
+    await ensure_session_partition(db, payload.started_at)
+    session = importer.session_model(payload)
     db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.commit()
+    await db.refresh(session)
+    report_cache.invalidate_sessions([session])
     return session
 
 
@@ -58,10 +192,15 @@ def create_session(payload: schemas.ScreenSessionCreate, db: Session = Depends(g
     summary="Удалить сессию экранного времени",
     description="Удаляет сессию экранного времени по идентификатору. Триггеры пересчитывают агрегированную статистику.",
 )
-def delete_session(session_id: int, db: Session = Depends(get_db)):
-    session = db.query(models.ScreenSession).get(session_id)
-    if not session:
+async def delete_session(session_id: int, db: AsyncSession = Depends(get_async_db)):
+    # Один DELETE ... RETURNING без загрузки сессии: строки использования приложений удаляет
+    # ON DELETE CASCADE в БД, ORM их не загружает и не трогает
+    s = models.ScreenSession
+    stmt = delete(s).where(s.id == session_id).returning(s.started_at, s.employee_id)
+    deleted = (await db.execute(stmt, execution_options={"synchronize_session": False})).one_or_none()
+    if deleted is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-    db.delete(session)
-    db.commit()
+    await db.commit()
+    stat_date = deleted.started_at.date()
+    report_cache.invalidate(stat_date, stat_date, [deleted.employee_id])
     return None
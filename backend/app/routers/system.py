@@ -0,0 +1,61 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import schemas
+from ..audit import QUEUE_LENGTH_SQL, audit_drainer
+from ..config import get_settings
+from ..db import async_engine, async_read_engine, get_async_db, pool_stats, read_engine, replica_health
+from ..metrics import TimedRoute
+
+router = APIRouter(route_class=TimedRoute)
+
+
+@router.get(
+    "/pool",
+    response_model=schemas.PoolStatsRead,
+    summary="Состояние пула соединений",
+    description=(
+        "Возвращает настройки и текущее состояние пула соединений с БД: выданные и свободные соединения, "
+        "соединения сверх pool_size, число выдач, таймаутов и время ожидания соединения "
+        "(для синхронного движка и в поле async_pool — для асинхронного)."
+    ),
+)
+def get_pool_stats():
+    return {**pool_stats(), "async_pool": pool_stats(async_engine)}
+
+
+@router.get(
+    "/replica",
+    response_model=schemas.ReplicaStatusRead,
+    summary="Состояние реплики для чтения",
+    description=(
+        "Показывает, настроена ли реплика (READ_DATABASE_URL), ее доступность и отставание по последней проверке, "
+        "порог отставания и число запросов на чтение, переключенных на основной сервер, а также пулы движков чтения."
+    ),
+)
+async def get_replica_status():
+    await replica_health.refresh_async()
+    status = replica_health.stats()
+    if read_engine is not None:
+        status.update(pool=pool_stats(read_engine), async_pool=pool_stats(async_read_engine))
+    return status
+
+
+@router.get(
+    "/audit",
+    response_model=schemas.AuditStatusRead,
+    summary="Режим аудита и очередь",
+    description=(
+        "Показывает режим триггеров аудита (AUDIT_VALUES, AUDIT_SESSIONS, AUDIT_ASYNC), число событий в очереди "
+        "audit_queue, еще не перенесенных в audit_log, и состояние фонового переноса очереди."
+    ),
+)
+async def get_audit_status(db: AsyncSession = Depends(get_async_db)):
+    settings = get_settings()
+    return {
+        "values": settings.audit_values,
+        "sessions": settings.audit_sessions,
+        "async_queue": settings.audit_async,
+        "queue_length": (await db.execute(QUEUE_LENGTH_SQL)).scalar_one(),
+        "drainer": audit_drainer.stats(),
+    }
@@ -1,35 +1,86 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
 
-from .. import models, schemas
-from ..db import get_db
+from .. import bulk, models, schemas
+from ..cache import report_cache
+from ..db import get_db, get_read_db
+from ..metrics import TimedRoute
+from ..utils.expand import Expansion, expand_param
+from ..utils.fast_json import RowSerializer
+from ..utils.pagination import KeysetPaginator
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+workstation_bulk = bulk.BulkSpec(models.Workstation, key="inventory_number", references={"department_id": models.Department})
+
+workstation_rows = RowSerializer(models.Workstation, schemas.WorkstationRead)
+workstation_expand = expand_param({"department": joinedload(models.Workstation.department)})
 
 
 @router.get(
     "/",
-    response_model=List[schemas.WorkstationRead],
+    response_model=List[schemas.WorkstationExpandedRead],
+    response_model_exclude_unset=True,
     summary="Список рабочих станций",
-    description="Возвращает постраничный список рабочих станций (ПК/ноутбуков).",
+    description="Возвращает постраничный список рабочих станций (ПК/ноутбуков). expand=department добавляет отдел.",
+)
+def list_workstations(
+    skip: int = 0,
+    limit: int = 100,
+    expansion: Expansion = Depends(workstation_expand),
+    db: Session = Depends(get_read_db),
+):
+    if not expansion.fields:
+        # Без связей — быстрый путь: кортежи колонок без ORM-объектов и проверки моделей
+        stmt = workstation_rows.select().order_by(models.Workstation.id).offset(skip).limit(limit)
+        return workstation_rows.response(db.execute(stmt).all())
+    stmt = select(models.Workstation).options(*expansion.options()).order_by(models.Workstation.id).offset(skip).limit(limit)
+    return expansion.dump_all(db.execute(stmt).scalars().all(), schemas.WorkstationExpandedRead)
+
+
+@router.get(
+    "/page",
+    response_model=schemas.CursorPage[schemas.WorkstationExpandedRead],
+    response_model_exclude_unset=True,
+    summary="Список рабочих станций (курсорная пагинация)",
+    description=(
+        "Keyset-пагинация по id: передайте next_cursor или prev_cursor из предыдущего ответа в параметре cursor. "
+        "expand=department добавляет отдел."
+    ),
 )
-def list_workstations(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return db.query(models.Workstation).offset(skip).limit(limit).all()
+def page_workstations(
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    expansion: Expansion = Depends(workstation_expand),
+    db: Session = Depends(get_read_db),
+):
+    paginator = KeysetPaginator([models.Workstation.id], cursor, limit)
+    if not expansion.fields:
+        return workstation_rows.page_response(paginator.page(db.execute(paginator.apply(workstation_rows.select())).all()))
+    rows = db.execute(paginator.apply(select(models.Workstation).options(*expansion.options()))).scalars().all()
+    page = paginator.page(rows)
+    page["items"] = expansion.dump_all(page["items"], schemas.WorkstationExpandedRead)
+    return page
 
 
 @router.get(
     "/{workstation_id}",
-    response_model=schemas.WorkstationRead,
+    response_model=schemas.WorkstationExpandedRead,
+    response_model_exclude_unset=True,
     summary="Получить рабочую станцию по ID",
-    description="Возвращает данные о рабочей станции (hostname, инвентарный номер, отдел, ОС) по идентификатору.",
+    description=(
+        "Возвращает данные о рабочей станции (hostname, инвентарный номер, отдел, ОС) по идентификатору. "
+        "expand=department добавляет отдел."
+    ),
 )
-def get_workstation(workstation_id: int, db: Session = Depends(get_db)):
-    workstation = db.query(models.Workstation).get(workstation_id)
+def get_workstation(workstation_id: int, expansion: Expansion = Depends(workstation_expand), db: Session = Depends(get_db)):
+    workstation = db.get(models.Workstation, workstation_id, options=expansion.options())
     if not workstation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workstation not found")
-    return workstation
+    return expansion.dump(workstation, schemas.WorkstationExpandedRead)
 
 
 @router.post(
@@ -78,4 +129,59 @@ def delete_workstation(workstation_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Workstation not found")
     db.delete(workstation)
     db.commit()
+    # Вместе со станцией каскадно удаляются ее сессии
+    report_cache.invalidate()
     return None
+
+
+@router.post(
+    "/bulk",
+    response_model=schemas.BulkResponse[schemas.WorkstationRead],
+    summary="Массовое создание рабочих станций",
+    description=(
+        "Создает рабочие станции списком в одной транзакции (один INSERT ... ON CONFLICT (inventory_number) ... RETURNING). "
+        "on_conflict задает действие, если inventory_number уже существует: error — ошибка элемента, skip — пропустить, "
+        "update — обновить запись. Ошибки отдельных элементов (несуществующие ссылки, дубликаты) возвращаются "
+        "в items, корректные элементы сохраняются."
+    ),
+)
+def bulk_create_workstations(payload: schemas.BulkCreateRequest[schemas.WorkstationCreate], db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.items))
+    outcome = bulk.bulk_create(db, workstation_bulk, payload.items, payload.on_conflict)
+    db.commit()
+    return outcome.response()
+
+
+@router.patch(
+    "/bulk",
+    response_model=schemas.BulkResponse[schemas.WorkstationRead],
+    summary="Массовое обновление рабочих станций",
+    description=(
+        "Изменяет рабочие станции списком в одной транзакции: каждый элемент содержит id и изменяемые поля. "
+        "Несуществующие id и ошибки отдельных элементов возвращаются в items."
+    ),
+)
+def bulk_update_workstations(payload: schemas.BulkUpdateRequest[schemas.WorkstationBulkUpdateItem], db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.items))
+    outcome = bulk.bulk_update(db, workstation_bulk, payload.items)
+    db.commit()
+    return outcome.response()
+
+
+@router.post(
+    "/bulk/delete",
+    response_model=schemas.BulkResponse[schemas.WorkstationRead],
+    summary="Массовое удаление рабочих станций",
+    description=(
+        "Удаляет рабочие станции по списку id одним DELETE ... RETURNING. "
+        "Несуществующие id и элементы, удаление которых запрещено ограничениями, возвращаются в items с ошибкой."
+    ),
+)
+def bulk_delete_workstations(payload: schemas.BulkDeleteRequest, db: Session = Depends(get_db)):
+    bulk.check_size(len(payload.ids))
+    outcome = bulk.bulk_delete(db, workstation_bulk, payload.ids)
+    db.commit()
+    if outcome.ids("deleted"):
+        # Вместе со станциями каскадно удаляются их сессии
+        report_cache.invalidate()
+    return outcome.response()
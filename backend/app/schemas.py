@@ -1,10 +1,20 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Any, Dict, Generic, List, Literal, Optional, TypeVar
 
 from pydantic import BaseModel, Field
 
+T = TypeVar("T")
+
+
+class CursorPage(BaseModel, Generic[T]):
+    """Страница keyset-пагинации: непрозрачные курсоры следующей и предыдущей страниц."""
+
+    items: List[T]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
 
 # Базовые сущности
 
@@ -69,6 +79,10 @@ class EmployeeUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 
+class EmployeeBulkUpdateItem(EmployeeUpdate):
+    id: int
+
+
 class EmployeeRead(EmployeeBase):
     id: int
 
@@ -88,6 +102,18 @@ class WorkstationCreate(WorkstationBase):
     pass
 
 
+class WorkstationUpdate(BaseModel):
+    hostname: Optional[str] = None
+    inventory_number: Optional[str] = None
+    department_id: Optional[int] = None
+    os_name: Optional[str] = None
+    is_active: Optional[bool] = None
+
+
+class WorkstationBulkUpdateItem(WorkstationUpdate):
+    id: int
+
+
 class WorkstationRead(WorkstationBase):
     id: int
 
@@ -107,6 +133,18 @@ class ApplicationCreate(ApplicationBase):
     pass
 
 
+class ApplicationUpdate(BaseModel):
+    name: Optional[str] = None
+    code: Optional[str] = None
+    category: Optional[str] = None
+    is_productive: Optional[bool] = None
+    is_active: Optional[bool] = None
+
+
+class ApplicationBulkUpdateItem(ApplicationUpdate):
+    id: int
+
+
 class ApplicationRead(ApplicationBase):
     id: int
 
@@ -125,8 +163,14 @@ class ScreenSessionBase(BaseModel):
     active_seconds: int
 
 
+class SessionApplicationUsageCreate(BaseModel):
+    application_id: int
+    active_seconds: int
+
+
 class ScreenSessionCreate(ScreenSessionBase):
-    pass
+    # Разбивка активного времени сессии по приложениям (session_application_usage)
+    applications: List[SessionApplicationUsageCreate] = []
 
 
 class ScreenSessionRead(ScreenSessionBase):
@@ -136,6 +180,39 @@ class ScreenSessionRead(ScreenSessionBase):
         from_attributes = True
 
 
+# ===== Связанные данные (expand=) =====
+# Поля связей заполняются только при запросе через expand; незапрошенные не попадают в ответ
+
+
+class SessionApplicationUsageRead(BaseModel):
+    application_id: int
+    active_seconds: int
+    application: Optional[ApplicationRead] = None
+
+    class Config:
+        from_attributes = True
+
+
+class DepartmentExpandedRead(DepartmentRead):
+    employees: Optional[List[EmployeeRead]] = None
+    workstations: Optional[List[WorkstationRead]] = None
+
+
+class EmployeeExpandedRead(EmployeeRead):
+    department: Optional[DepartmentRead] = None
+    position: Optional[PositionRead] = None
+
+
+class WorkstationExpandedRead(WorkstationRead):
+    department: Optional[DepartmentRead] = None
+
+
+class ScreenSessionExpandedRead(ScreenSessionRead):
+    employee: Optional[EmployeeRead] = None
+    workstation: Optional[WorkstationRead] = None
+    applications: Optional[List[SessionApplicationUsageRead]] = None
+
+
 #  Отчеты 
 
 
@@ -182,6 +259,88 @@ class DepartmentLoadRead(BaseModel):
     avg_seconds_per_employee: float
 
 
+class EmployeeProductivityRead(BaseModel):
+    employee_id: int
+    productive_seconds: int
+    unproductive_seconds: int
+    total_seconds: int
+    # Доля продуктивного времени; None, если за период нет времени в приложениях
+    productivity_ratio: Optional[float]
+
+
+class DepartmentProductivityRead(BaseModel):
+    department_id: int
+    department_name: str
+    productive_seconds: int
+    unproductive_seconds: int
+    total_seconds: int
+    productivity_ratio: Optional[float]
+
+
+class TopApplicationRead(BaseModel):
+    application_id: int
+    application_name: str
+    category: str
+    is_productive: bool
+    total_seconds: int
+    sessions_count: int
+    # Доля времени приложения во всем времени в приложениях за период
+    share: Optional[float]
+
+
+class ReportCacheStatsRead(BaseModel):
+    enabled: bool
+    entries: int
+    bytes: int
+    hits: int
+    misses: int
+    hit_ratio: float
+    not_modified: int
+    evictions: int
+    invalidations: int
+
+
+# Массовые операции со справочниками
+
+
+class BulkCreateRequest(BaseModel, Generic[T]):
+    items: List[T] = Field(min_length=1)
+    # Запись с тем же уникальным ключом (email, inventory_number, code) уже есть:
+    # error — ошибка элемента, skip — пропустить, update — обновить существующую запись
+    on_conflict: Literal["error", "skip", "update"] = "error"
+
+
+class BulkUpdateRequest(BaseModel, Generic[T]):
+    # Каждый элемент — id и изменяемые поля
+    items: List[T] = Field(min_length=1)
+
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int] = Field(min_length=1)
+
+
+class BulkItemError(BaseModel):
+    code: str
+    message: str
+
+
+class BulkItemResult(BaseModel, Generic[T]):
+    index: int
+    status: Literal["created", "updated", "skipped", "deleted", "failed"]
+    id: Optional[int] = None
+    data: Optional[T] = None
+    error: Optional[BulkItemError] = None
+
+
+class BulkResponse(BaseModel, Generic[T]):
+    created: int = 0
+    updated: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    failed: int = 0
+    items: List[BulkItemResult[T]]
+
+
 # Batch import
 
 
@@ -191,11 +350,14 @@ class BatchSessionRow(BaseModel):
     started_at: datetime
     ended_at: datetime
     active_seconds: int
+    applications: List[SessionApplicationUsageCreate] = []
 
 
 class BatchImportRequest(BaseModel):
     import_type: str = "sessions"
     file_name: Optional[str] = None
+    # orm — построчная вставка через ORM, copy — COPY в staging-таблицу и перенос одним INSERT ... SELECT
+    mode: Literal["orm", "copy"] = "orm"
     rows: List[BatchSessionRow]
 
 
@@ -206,3 +368,96 @@ class BatchImportResponse(BaseModel):
     success_rows: int
     error_rows: int
     error_message: Optional[str] = None
+
+
+class BatchImportStatusRead(BaseModel):
+    id: int
+    import_type: str
+    file_name: Optional[str] = None
+    status: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    total_rows: int
+    success_rows: int
+    error_rows: int
+    eta_seconds: Optional[float] = None
+    error_message: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+# Audit
+
+
+class AuditLogRead(BaseModel):
+    id: int
+    table_name: str
+    operation: str
+    # Для записей уровня оператора — '*', число строк в row_count, диапазон id в new_values/old_values
+    record_id: str
+    changed_at: datetime
+    changed_by: Optional[str] = None
+    old_values: Optional[Dict[str, Any]] = None
+    new_values: Optional[Dict[str, Any]] = None
+    row_count: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+
+# System
+
+
+class PoolStatsRead(BaseModel):
+    pool_class: str
+    external_pooler: bool
+    pre_ping: bool
+    statement_timeout_ms: int
+    # Только для собственного пула приложения (без внешнего пулера)
+    size: Optional[int] = None
+    max_overflow: Optional[int] = None
+    timeout_seconds: Optional[int] = None
+    checked_out: Optional[int] = None
+    checked_in: Optional[int] = None
+    overflow: Optional[int] = None
+    checkouts: Optional[int] = None
+    timeouts: Optional[int] = None
+    wait_seconds_total: Optional[float] = None
+    wait_seconds_avg: Optional[float] = None
+    wait_seconds_max: Optional[float] = None
+    # Пул асинхронного движка (asyncpg)
+    async_pool: Optional["PoolStatsRead"] = None
+
+
+class ReplicaStatusRead(BaseModel):
+    configured: bool
+    available: bool
+    healthy: bool
+    lag_seconds: Optional[float] = None
+    max_lag_seconds: float
+    seconds_since_check: Optional[float] = None
+    # Запросы на чтение, направленные на основной сервер из-за недоступности или лага реплики
+    fallbacks: int
+    error: Optional[str] = None
+    pool: Optional[PoolStatsRead] = None
+    async_pool: Optional[PoolStatsRead] = None
+
+
+class AuditDrainerRead(BaseModel):
+    running: bool
+    interval_seconds: float
+    batch_size: int
+    runs: int
+    drained: int
+    seconds_since_drain: Optional[float] = None
+    error: Optional[str] = None
+
+
+class AuditStatusRead(BaseModel):
+    values: str
+    sessions: str
+    async_queue: bool
+    # Событий в screentime.audit_queue, еще не перенесенных в audit_log
+    queue_length: int
+    drainer: AuditDrainerRead
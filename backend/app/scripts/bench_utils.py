@@ -0,0 +1,142 @@
+"""Общие функции для скриптов бенчмарков: перцентили, сводка по задержкам, разбор
+Server-Timing, нагрузка на HTTP-эндпоинт и запуск тестового приложения в отдельном процессе."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence
+
+import httpx
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Перцентиль методом ближайшего ранга (values не обязаны быть отсортированы)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies_ms: Sequence[float], elapsed: float, errors: int = 0) -> Dict[str, Any]:
+    return {
+        "requests": len(latencies_ms),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "rps": round(len(latencies_ms) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(latencies_ms), 2) if latencies_ms else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else 0.0,
+    }
+
+
+def format_summary(name: str, summary: Mapping[str, Any]) -> str:
+    return (
+        f"{name:>12}: {summary['requests']} req, {summary['errors']} errors, {summary['rps']:,.1f} req/s, "
+        f"p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms, "
+        f"max {summary['max_ms']:.1f} ms"
+    )
+
+
+_SERVER_TIMING_STATEMENTS = re.compile(r'"(\d+) statements, (\d+) rows"')
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Заголовок Server-Timing (см. app.metrics) -> {"app_ms", "db_ms", "serialize_ms", "statements", "rows"}."""
+    parsed: Dict[str, float] = {}
+    # Запятая внутри desc="..." не разделяет метрики
+    for metric in re.split(r",\s*(?=[\w-]+(?:;|$))", header or ""):
+        name, _, rest = metric.strip().partition(";")
+        duration = re.search(r"dur=([\d.]+)", rest)
+        if duration:
+            parsed[f"{name}_ms"] = float(duration.group(1))
+        counts = _SERVER_TIMING_STATEMENTS.search(rest)
+        if counts:
+            parsed["statements"], parsed["rows"] = int(counts.group(1)), int(counts.group(2))
+    return parsed
+
+
+async def run_load(
+    base_url: str,
+    path: str,
+    total: int,
+    concurrency: int,
+    params: Optional[Callable[[int], Mapping[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """Отправляет total GET-запросов, не более concurrency одновременно; params(i) — параметры i-го запроса."""
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, params=params(i) if params else None)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += not ok
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed, errors)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ServerProcess:
+    """uvicorn с указанным приложением в отдельном процессе, чтобы клиент нагрузки не делил с ним GIL."""
+
+    def __init__(self, app: str, port: Optional[int] = None, env: Optional[Mapping[str, str]] = None):
+        self.app = app
+        self.port = port or free_port()
+        self.env = {**os.environ, **(env or {})}
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "ServerProcess":
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", self.app, "--port", str(self.port), "--log-level", "warning"],
+            env=self.env,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.app} exited with code {self.process.returncode}")
+            try:
+                httpx.get(self.base_url + "/openapi.json", timeout=1)
+                return self
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f"{self.app} did not start in 30s")
+
+    def __exit__(self, *exc_info) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
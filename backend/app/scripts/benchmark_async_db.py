@@ -0,0 +1,83 @@
+"""Нагрузочное сравнение синхронного (Session + пул потоков) и асинхронного (AsyncSession + asyncpg) стека
+
+    python -m app.scripts.benchmark_async_db --requests 5000 --concurrency 200
+
+Запускает в отдельном процессе uvicorn с двумя одинаковыми эндпоинтами списка
+сессий — ``def`` с get_db и ``async def`` с get_async_db — и нагружает каждый
+одним и тем же набором запросов (фильтр по сотруднику). Печатает req/s и
+перцентили задержки.
+
+Оба стека получают одинаковый пул (--pool-size + --max-overflow). Для синхронного
+стека он должен быть не меньше пула потоков FastAPI (40): закрытие сессии в
+get_db тоже выполняется в этом пуле, и если все потоки ждут соединение,
+запросы стоят до DB_POOL_TIMEOUT.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from typing import List
+
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..db import SessionLocal, get_async_db, get_db
+from ..routers.sessions import SessionFilters
+from .bench_utils import ServerProcess, format_summary, run_load
+
+
+bench_app = FastAPI(title="benchmark_async_db")
+
+
+def _statement(employee_id: int, limit: int):
+    s = models.ScreenSession
+    return SessionFilters(employee_id=employee_id).apply(select(s)).order_by(s.started_at.desc(), s.id.desc()).limit(limit)
+
+
+@bench_app.get("/sync/sessions", response_model=List[schemas.ScreenSessionRead])
+def sync_sessions(employee_id: int, limit: int = 50, db: Session = Depends(get_db)):
+    return db.execute(_statement(employee_id, limit)).scalars().all()
+
+
+@bench_app.get("/async/sessions", response_model=List[schemas.ScreenSessionRead])
+async def async_sessions(employee_id: int, limit: int = 50, db: AsyncSession = Depends(get_async_db)):
+    return (await db.execute(_statement(employee_id, limit))).scalars().all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50, help="строк в ответе")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--max-overflow", type=int, default=20)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        employee_ids = db.execute(text("SELECT id FROM screentime.employees ORDER BY id")).scalars().all()
+    finally:
+        db.close()
+    if not employee_ids:
+        print("⚠️ No employees found. Run app.scripts.generate_test_data first.")
+        return
+
+    def params(i: int):
+        return {"employee_id": employee_ids[i % len(employee_ids)], "limit": args.limit}
+
+    env = {"DB_POOL_SIZE": str(args.pool_size), "DB_MAX_OVERFLOW": str(args.max_overflow), "DB_POOL_TIMEOUT": "10"}
+    with ServerProcess("app.scripts.benchmark_async_db:bench_app", env=env) as server:
+        for stack in ("sync", "async"):
+            path = f"/{stack}/sessions"
+            asyncio.run(run_load(server.base_url, path, args.warmup, min(args.concurrency, args.warmup), params))
+            summary = asyncio.run(run_load(server.base_url, path, args.requests, args.concurrency, params))
+            print(format_summary(stack, summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""Стоимость аудита screen_sessions при вставке и изменении сессий в разных режимах
+
+    python -m app.scripts.benchmark_audit --rows 20000 --loaders orm copy --repeat 3
+
+Для каждого режима аудита (параметры screentime.audit_* задаются SET LOCAL, см. sql/init.sql)
+загружает одинаковый набор сгенерированных строк загрузчиком batch-импорта (app.importer),
+затем одним UPDATE меняет active_seconds у вставленных строк. Печатаются строки/с, число
+записей аудита и их объем (audit_log и очередь audit_queue), а для асинхронных режимов —
+время переноса очереди в audit_log (fn_drain_audit_queue), которое уходит из транзакции
+запроса в фоновую задачу. Транзакция каждого запуска откатывается; из --repeat запусков
+берется лучший.
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .. import importer, schemas
+from ..db import SessionLocal
+from .benchmark_batch_import import generate_rows
+
+
+# Режим -> (audit_values, audit_sessions, audit_async); row — прежнее поведение
+MODES: Dict[str, tuple] = {
+    "off": ("full", "off", "off"),
+    "row": ("full", "row", "off"),
+    "row+diff": ("diff", "row", "off"),
+    "statement": ("full", "statement", "off"),
+    "row+async": ("full", "row", "on"),
+    "row+diff+async": ("diff", "row", "on"),
+    "statement+async": ("full", "statement", "on"),
+}
+
+AUDIT_SIZE_SQL = text(
+    """
+    SELECT
+        (SELECT COUNT(*) FROM screentime.audit_log WHERE id > :log_id)
+        + (SELECT COUNT(*) FROM screentime.audit_queue),
+        COALESCE((SELECT SUM(pg_column_size(l.*)) FROM screentime.audit_log l WHERE id > :log_id), 0)
+        + COALESCE((SELECT SUM(pg_column_size(q.*)) FROM screentime.audit_queue q), 0)
+    """
+)
+
+
+def set_mode(db: Session, mode: str) -> None:
+    values, sessions, async_queue = MODES[mode]
+    db.execute(
+        text(
+            "SELECT set_config('screentime.audit_values', :values, true), "
+            "set_config('screentime.audit_sessions', :sessions, true), "
+            "set_config('screentime.audit_async', :async_queue, true)"
+        ),
+        {"values": values, "sessions": sessions, "async_queue": async_queue},
+    )
+
+
+def audit_size(db: Session, log_id: int) -> tuple:
+    count, size = db.execute(AUDIT_SIZE_SQL, {"log_id": log_id}).one()
+    return count, size / 2**20
+
+
+def run(mode: str, loader: str, rows: List[schemas.BatchSessionRow]) -> Dict[str, float]:
+    db = SessionLocal()
+    try:
+        # Очередь в начале пустая: иначе в объем попадут чужие события
+        queued = db.execute(text("SELECT COUNT(*) FROM screentime.audit_queue")).scalar_one()
+        assert queued == 0, f"audit_queue is not empty ({queued} events), run app.scripts.drain_audit_queue"
+        log_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM screentime.audit_log")).scalar_one()
+        session_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM screentime.screen_sessions")).scalar_one()
+        set_mode(db, mode)
+
+        started = time.perf_counter()
+        result = importer.LOADERS[loader](db, rows)
+        insert_seconds = time.perf_counter() - started
+        assert result.success_rows == len(rows), result.errors[:5]
+        insert_audit = audit_size(db, log_id)
+
+        started = time.perf_counter()
+        updated = db.execute(
+            text("UPDATE screentime.screen_sessions SET active_seconds = active_seconds + 1 WHERE id > :id"),
+            {"id": session_id},
+        ).rowcount
+        update_seconds = time.perf_counter() - started
+        assert updated == len(rows), updated
+        total_audit = audit_size(db, log_id)
+
+        started = time.perf_counter()
+        drained = db.execute(text("SELECT screentime.fn_drain_audit_queue(:batch)"), {"batch": 2**31 - 1}).scalar_one()
+        drain_seconds = time.perf_counter() - started if drained else 0.0
+        return {
+            "insert_seconds": insert_seconds,
+            "update_seconds": update_seconds,
+            "drain_seconds": drain_seconds,
+            "insert_audit_rows": insert_audit[0],
+            "insert_audit_mib": insert_audit[1],
+            "update_audit_rows": total_audit[0] - insert_audit[0],
+            "update_audit_mib": total_audit[1] - insert_audit[1],
+        }
+    finally:
+        db.rollback()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--loaders", nargs="+", choices=list(importer.LOADERS), default=["copy"])
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        employee_ids = db.execute(text("SELECT id FROM screentime.employees")).scalars().all()
+        workstation_ids = db.execute(text("SELECT id FROM screentime.workstations")).scalars().all()
+    finally:
+        db.close()
+
+    if not employee_ids or not workstation_ids:
+        print("⚠️ No employees or workstations found. Run app.scripts.generate_test_data first.")
+        return
+
+    rows = generate_rows(employee_ids, workstation_ids, args.rows, args.seed)
+    for loader in args.loaders:
+        for mode in args.modes:
+            runs = [run(mode, loader, rows) for _ in range(args.repeat)]
+            best = {key: min(r[key] for r in runs) for key in runs[0]}
+            drain = f", drain {best['drain_seconds']:5.2f}s" if best["drain_seconds"] else ""
+            print(
+                f"{loader:>5} {mode:>16}: insert {len(rows) / best['insert_seconds']:>8,.0f} rows/s "
+                f"(audit {best['insert_audit_rows']:>6,} rows, {best['insert_audit_mib']:6.2f} MiB), "
+                f"update {len(rows) / best['update_seconds']:>8,.0f} rows/s "
+                f"(audit {best['update_audit_rows']:>6,} rows, {best['update_audit_mib']:6.2f} MiB){drain}"
+            )
+
+
+if __name__ == "__main__":
+    main()
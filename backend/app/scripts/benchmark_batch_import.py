@@ -0,0 +1,79 @@
+"""Сравнение скорости batch-импорта сессий в режимах orm и copy
+
+    python -m app.scripts.benchmark_batch_import --rows 20000
+
+Для каждого режима загружает одинаковый набор сгенерированных строк и
+откатывает транзакцию, чтобы не засорять базу.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from ..db import SessionLocal
+from .. import importer, schemas
+
+
+def generate_rows(employee_ids, workstation_ids, count: int, seed: int) -> list[schemas.BatchSessionRow]:
+    rnd = random.Random(seed)
+    base = datetime.combine(datetime.utcnow().date(), datetime.min.time()) - timedelta(days=30)
+    rows = []
+    for _ in range(count):
+        started_at = base + timedelta(days=rnd.randint(0, 29), hours=rnd.randint(8, 18), minutes=rnd.randint(0, 59))
+        duration = rnd.randint(15, 120) * 60
+        rows.append(
+            schemas.BatchSessionRow(
+                employee_id=rnd.choice(employee_ids),
+                workstation_id=rnd.choice(workstation_ids),
+                started_at=started_at,
+                ended_at=started_at + timedelta(seconds=duration),
+                active_seconds=duration,
+            )
+        )
+    return rows
+
+
+def run(mode: str, rows: list[schemas.BatchSessionRow]) -> float:
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        result = importer.LOADERS[mode](db, rows)
+        elapsed = time.perf_counter() - started
+        assert result.success_rows == len(rows), result.errors[:5]
+        return elapsed
+    finally:
+        db.rollback()
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--modes", nargs="+", default=list(importer.LOADERS))
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        employee_ids = db.execute(text("SELECT id FROM screentime.employees")).scalars().all()
+        workstation_ids = db.execute(text("SELECT id FROM screentime.workstations")).scalars().all()
+    finally:
+        db.close()
+
+    if not employee_ids or not workstation_ids:
+        print("⚠️ No employees or workstations found. Run app.scripts.generate_test_data first.")
+        return
+
+    rows = generate_rows(employee_ids, workstation_ids, args.rows, args.seed)
+    for mode in args.modes:
+        elapsed = run(mode, rows)
+        print(f"{mode:>5}: {len(rows)} rows in {elapsed:.2f}s — {len(rows) / elapsed:,.0f} rows/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,533 @@
+"""Сквозной бенчмарк API и SQL-слоя с результатом в JSON для сравнения между коммитами
+
+    python -m app.scripts.benchmark_e2e --output bench.json
+    python -m app.scripts.benchmark_e2e --generate --sessions 1000000 --days 365 --transport uvicorn
+    python -m app.scripts.benchmark_e2e --workloads reports_department_load sessions_page --baseline bench.json
+
+Прогоняет через настоящее приложение app.main:app типичные нагрузки: создание сессий
+(POST /api/sessions/), пакетный импорт (POST /api/batch-import/sessions) — с разбивкой по
+--applications приложениям в каждой сессии, — список сессий и курсорную пагинацию, все
+отчеты /api/reports. Приложение запускается в этом же процессе
+через ASGI (--transport asgi, без сети; клиент и сервер делят один цикл событий) или
+отдельным процессом uvicorn (--transport uvicorn, ближе к боевому режиму).
+
+Для каждой нагрузки в JSON попадают пропускная способность и перцентили задержки, число
+SQL-операторов, строк и время в БД на запрос (из заголовка Server-Timing, см. app.metrics),
+а также приращения счетчиков сервера за время нагрузки: pg_stat_database (транзакции,
+строки, блоки; PostgreSQL 15+ сбрасывает их из простаивающих соединений с задержкой до
+10 с, отсюда пауза --stats-settle перед каждым снимком) и, если установлено расширение pg_stat_statements, — число вызовов и время
+операторов с самыми дорогими запросами. pg_stat_statements требует
+shared_preload_libraries=pg_stat_statements (в docker-compose включено); без него этот
+раздел равен null. Счетчики сервера общие для всей базы — на время замера база не должна
+использоваться ничем другим.
+
+Кэш отчетов по умолчанию выключен (REPORT_CACHE_TTL_SECONDS=0), чтобы замерять SQL, а не
+попадания в кэш; --report-cache оставляет настройку приложения. Сессии, созданные
+нагрузками записи, в конце удаляются (--keep-data оставляет их).
+
+--generate перед замером заполняет базу app.scripts.generate_test_data в указанном
+масштабе. --baseline сравнивает результат с JSON предыдущего запуска: нагрузки, у которых
+p95 или число операторов на запрос выросли больше чем в --threshold раз, перечисляются в
+разделе regressions, и скрипт завершается с кодом 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from sqlalchemy import text
+
+from .. import schemas
+from ..db import engine
+from .bench_utils import ServerProcess, format_summary, parse_server_timing, summarize
+from .benchmark_batch_import import generate_rows
+
+
+DATABASE_STATS_SQL = text(
+    """
+    SELECT xact_commit, xact_rollback, tup_returned, tup_fetched, tup_inserted, tup_updated,
+           tup_deleted, blks_read, blks_hit, temp_bytes
+    FROM pg_stat_database
+    WHERE datname = current_database()
+    """
+)
+
+STATEMENT_STATS_SQL = text(
+    """
+    SELECT s.queryid, s.query, s.calls, s.total_exec_time, s.rows, s.shared_blks_hit, s.shared_blks_read
+    FROM pg_stat_statements s
+    WHERE s.dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND s.query NOT LIKE '%pg_stat_%'
+    """
+)
+
+TOP_STATEMENTS = 5
+
+
+@dataclass
+class Dataset:
+    employee_ids: List[int]
+    workstation_ids: List[int]
+    department_ids: List[int]
+    application_ids: List[int]
+    first_date: date
+    last_date: date
+    sessions: int
+    max_session_id: int
+
+
+@dataclass
+class Workload:
+    name: str
+    method: str
+    path: str
+    # Номер запроса -> аргументы httpx (params/json)
+    request: Callable[[int], Dict[str, Any]]
+    # Строк данных в одном запросе (для пакетного импорта) — для пересчета в строки/с
+    rows_per_request: int = 1
+    writes: bool = False
+    # Вызывается с номером запроса и успешным ответом (например, чтобы запомнить курсор)
+    on_response: Optional[Callable[[int, httpx.Response], None]] = None
+
+
+def load_dataset() -> Optional[Dataset]:
+    with engine.connect() as conn:
+        employee_ids = conn.execute(text("SELECT id FROM screentime.employees WHERE is_active ORDER BY id")).scalars().all()
+        workstation_ids = conn.execute(text("SELECT id FROM screentime.workstations ORDER BY id")).scalars().all()
+        department_ids = conn.execute(text("SELECT id FROM screentime.departments ORDER BY id")).scalars().all()
+        application_ids = conn.execute(text("SELECT id FROM screentime.applications ORDER BY id")).scalars().all()
+        first_date, last_date = conn.execute(
+            text("SELECT MIN(stat_date), MAX(stat_date) FROM screentime.daily_employee_stats")
+        ).one()
+        sessions, max_session_id = conn.execute(
+            text("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM screentime.screen_sessions")
+        ).one()
+    if not employee_ids or not workstation_ids or first_date is None:
+        return None
+    return Dataset(
+        employee_ids, workstation_ids, department_ids, application_ids, first_date, last_date, sessions, max_session_id
+    )
+
+
+def with_applications(
+    rows: List[schemas.BatchSessionRow], application_ids: List[int], per_session: int, seed: int
+) -> List[schemas.BatchSessionRow]:
+    """Делит активное время каждой сессии поровну между 1..per_session случайными приложениями."""
+    rnd = random.Random(seed)
+    per_session = min(per_session, len(application_ids))
+    for row in rows:
+        if per_session <= 0:
+            break
+        chosen = rnd.sample(application_ids, rnd.randint(1, per_session))
+        row.applications = [
+            schemas.SessionApplicationUsageCreate(application_id=a, active_seconds=row.active_seconds // len(chosen))
+            for a in chosen
+        ]
+    return rows
+
+
+def build_workloads(data: Dataset, args: argparse.Namespace) -> List[Workload]:
+    days = (data.last_date - data.first_date).days + 1
+    employees = data.employee_ids
+
+    def day(i: int) -> str:
+        return (data.first_date + timedelta(days=(i * 7919) % days)).isoformat()
+
+    def period(i: int) -> Dict[str, str]:
+        date_to = data.first_date + timedelta(days=(i * 7919) % days)
+        date_from = max(date_to - timedelta(days=args.report_days - 1), data.first_date)
+        return {"date_from": date_from.isoformat(), "date_to": date_to.isoformat()}
+
+    # Следующий курсор по каждому сотруднику: запросы одного сотрудника идут вглубь его сессий
+    cursors: Dict[int, Optional[str]] = {}
+
+    def page(i: int) -> Dict[str, Any]:
+        employee_id = employees[i % len(employees)]
+        params = {"employee_id": employee_id, "limit": args.page_size}
+        if cursors.get(employee_id):
+            params["cursor"] = cursors[employee_id]
+        return {"params": params}
+
+    def remember_cursor(i: int, response: httpx.Response) -> None:
+        cursors[employees[i % len(employees)]] = response.json().get("next_cursor")
+
+    # Тела запросов записи строятся заранее, чтобы генерация не попадала в замер
+    def session_rows(count: int, seed: int) -> List[Dict[str, Any]]:
+        rows = generate_rows(employees, data.workstation_ids, count, seed)
+        return [row.model_dump(mode="json") for row in with_applications(rows, data.application_ids, args.applications, seed)]
+
+    sessions = session_rows(args.requests, args.seed)
+    batches = [
+        {"mode": args.batch_mode, "rows": session_rows(args.batch_rows, args.seed + i + 1)} for i in range(args.batch_requests)
+    ]
+    departments = data.department_ids
+
+    workloads = [
+        Workload(
+            "sessions_list",
+            "GET",
+            "/api/sessions/",
+            lambda i: {"params": {"employee_id": employees[i % len(employees)], "limit": args.page_size}},
+        ),
+        Workload("sessions_page", "GET", "/api/sessions/page", page, on_response=remember_cursor),
+        Workload(
+            "reports_employee_daily",
+            "GET",
+            "/api/reports/employee-daily",
+            lambda i: {"params": {"employee_id": employees[i % len(employees)], "stat_date": day(i)}},
+        ),
+        Workload("reports_department_daily", "GET", "/api/reports/department-daily", lambda i: {"params": {"stat_date": day(i)}}),
+        Workload("reports_last_activity", "GET", "/api/reports/last-activity", lambda i: {}),
+        Workload(
+            "reports_top_overworked",
+            "GET",
+            "/api/reports/top-overworked",
+            lambda i: {"params": {**period(i), "min_hours_per_day": 2.0}},
+        ),
+        Workload("reports_department_load", "GET", "/api/reports/department-load", lambda i: {"params": period(i)}),
+        Workload(
+            "reports_employee_productivity",
+            "GET",
+            "/api/reports/employee-productivity",
+            lambda i: {"params": {"employee_id": employees[i % len(employees)], **period(i)}},
+        ),
+        Workload(
+            "reports_department_productivity",
+            "GET",
+            "/api/reports/department-productivity",
+            lambda i: {"params": period(i)},
+        ),
+        Workload(
+            "reports_employee_top_applications",
+            "GET",
+            "/api/reports/employee-top-applications",
+            lambda i: {"params": {"employee_id": employees[i % len(employees)], **period(i)}},
+        ),
+        Workload(
+            "reports_department_top_applications",
+            "GET",
+            "/api/reports/department-top-applications",
+            lambda i: {"params": {"department_id": departments[i % len(departments)], **period(i)}},
+        ),
+        Workload("create_session", "POST", "/api/sessions/", lambda i: {"json": sessions[i % len(sessions)]}, writes=True),
+        Workload(
+            "batch_import",
+            "POST",
+            "/api/batch-import/sessions",
+            lambda i: {"json": batches[i % len(batches)]},
+            rows_per_request=args.batch_rows,
+            writes=True,
+        ),
+    ]
+    return workloads
+
+
+async def run_workload(client: httpx.AsyncClient, workload: Workload, total: int, concurrency: int) -> Dict[str, Any]:
+    """Отправляет total запросов нагрузки, не более concurrency одновременно."""
+    latencies: List[float] = []
+    timings: List[Dict[str, float]] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await client.request(workload.method, workload.path, **workload.request(i))
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                response, ok = None, False
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += not ok
+            if ok:
+                timings.append(parse_server_timing(response.headers.get("server-timing")))
+                if workload.on_response is not None:
+                    workload.on_response(i, response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    summary = summarize(latencies, elapsed, errors)
+    if workload.rows_per_request > 1:
+        summary["rows_per_second"] = round((len(latencies) - errors) * workload.rows_per_request / elapsed, 1)
+    for key in ("statements", "rows", "db_ms", "serialize_ms"):
+        values = [t[key] for t in timings if key in t]
+        summary[f"{key}_per_request"] = round(statistics.mean(values), 2) if values else None
+    return summary
+
+
+def database_stats() -> Dict[str, Any]:
+    with engine.connect() as conn:
+        return dict(conn.execute(DATABASE_STATS_SQL).mappings().one())
+
+
+def statement_stats() -> Optional[Dict[int, Dict[str, Any]]]:
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(STATEMENT_STATS_SQL).mappings().all()
+    except Exception:  # noqa: BLE001 — расширение не установлено или не загружено
+        return None
+    return {row["queryid"]: dict(row) for row in rows}
+
+
+def ensure_pg_stat_statements() -> bool:
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_stat_statements"))
+    except Exception:  # noqa: BLE001
+        pass
+    return statement_stats() is not None
+
+
+def statements_delta(before: Dict[int, Dict[str, Any]], after: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    changed = []
+    for queryid, row in after.items():
+        prev = before.get(queryid, {})
+        calls = row["calls"] - prev.get("calls", 0)
+        if calls:
+            changed.append(
+                {
+                    "query": " ".join(row["query"].split())[:300],
+                    "calls": calls,
+                    "exec_ms": round(row["total_exec_time"] - prev.get("total_exec_time", 0.0), 2),
+                    "rows": row["rows"] - prev.get("rows", 0),
+                    "shared_blks_hit": row["shared_blks_hit"] - prev.get("shared_blks_hit", 0),
+                    "shared_blks_read": row["shared_blks_read"] - prev.get("shared_blks_read", 0),
+                }
+            )
+    changed.sort(key=lambda s: s["exec_ms"], reverse=True)
+    return {
+        "calls": sum(s["calls"] for s in changed),
+        "exec_ms": round(sum(s["exec_ms"] for s in changed), 2),
+        "rows": sum(s["rows"] for s in changed),
+        "shared_blks_hit": sum(s["shared_blks_hit"] for s in changed),
+        "shared_blks_read": sum(s["shared_blks_read"] for s in changed),
+        "top": changed[:TOP_STATEMENTS],
+    }
+
+
+async def measure(client: httpx.AsyncClient, workload: Workload, args: argparse.Namespace, statements: bool) -> Dict[str, Any]:
+    total = args.batch_requests if workload.name == "batch_import" else args.requests
+    concurrency = min(args.concurrency, total)
+    if args.warmup and not workload.writes:
+        await run_workload(client, workload, args.warmup, min(args.concurrency, args.warmup))
+
+    await asyncio.sleep(args.stats_settle)
+    database_before, statements_before = database_stats(), statement_stats() if statements else None
+    result = await run_workload(client, workload, total, concurrency)
+    await asyncio.sleep(args.stats_settle)
+    database_after, statements_after = database_stats(), statement_stats() if statements else None
+
+    result["pg_stat_database"] = {key: database_after[key] - database_before[key] for key in database_after}
+    result["pg_stat_statements"] = (
+        statements_delta(statements_before, statements_after) if statements_before is not None and statements_after else None
+    )
+    return result
+
+
+async def run_all(workloads: List[Workload], args: argparse.Namespace, statements: bool) -> Dict[str, Any]:
+    env = {} if args.report_cache else {"REPORT_CACHE_TTL_SECONDS": "0"}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+
+    async def run(client: httpx.AsyncClient):
+        for workload in workloads:
+            results[workload.name] = await measure(client, workload, args, statements)
+            print(format_summary(workload.name, results[workload.name]), file=sys.stderr)
+
+    if args.transport == "uvicorn":
+        with ServerProcess("app.main:app", env=env) as server:
+            async with httpx.AsyncClient(base_url=server.base_url, limits=limits, timeout=120) as client:
+                await run(client)
+        return results
+
+    # Настройки к этому моменту уже прочитаны (модуль импортирует ..db), поэтому кэш отчетов
+    # этого процесса выключается напрямую, а не через окружение
+    from ..cache import report_cache
+    from ..main import app
+
+    if not args.report_cache:
+        report_cache.ttl_seconds = 0
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120) as client:
+            await run(client)
+    return results
+
+
+def compare(
+    results: Dict[str, Any], current_meta: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> Dict[str, Any]:
+    comparison, regressions = {}, []
+    for name, current in results.items():
+        previous = baseline.get("workloads", {}).get(name)
+        if not previous:
+            continue
+        entry = {}
+        for key in ("rps", "p50_ms", "p95_ms", "p99_ms", "statements_per_request"):
+            if current.get(key) and previous.get(key):
+                entry[key] = round(current[key] / previous[key], 3)
+        comparison[name] = entry
+        if entry.get("p95_ms", 1) > threshold or entry.get("statements_per_request", 1) > threshold:
+            regressions.append(name)
+    # Разные транспорт, объем данных или параметры нагрузки делают сравнение бессмысленным
+    meta = baseline.get("meta", {})
+    mismatched = [
+        key for key in ("transport", "dataset", "options") if key in meta and meta[key] != current_meta.get(key)
+    ]
+    return {
+        "baseline_commit": meta.get("commit"),
+        "mismatched": mismatched,
+        "ratios": comparison,
+        "regressions": regressions,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty.strip() else "")
+
+
+def generate(args: argparse.Namespace) -> None:
+    command = [sys.executable, "-m", "app.scripts.generate_test_data", "--days", str(args.days), "--seed", str(args.seed)]
+    for option in ("employees", "workstations", "sessions", "workers"):
+        value = getattr(args, option)
+        if value is not None:
+            command += [f"--{option}", str(value)]
+    subprocess.run(command, check=True, stdout=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--workloads", nargs="+", help="имена нагрузок (по умолчанию все)")
+    parser.add_argument("--requests", type=int, default=500, help="запросов в каждой нагрузке")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=50, help="запросов прогрева (кроме нагрузок записи)")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--report-days", type=int, default=30, help="длина периода в отчетах за период")
+    parser.add_argument("--batch-requests", type=int, default=20)
+    parser.add_argument("--batch-rows", type=int, default=1000)
+    parser.add_argument("--batch-mode", choices=["orm", "copy"], default="copy")
+    parser.add_argument(
+        "--applications", type=int, default=3, help="до стольких приложений в сессии нагрузок записи (0 — без разбивки)"
+    )
+    parser.add_argument("--report-cache", action="store_true", help="не выключать кэш отчетов")
+    parser.add_argument("--keep-data", action="store_true", help="не удалять сессии, созданные нагрузками записи")
+    parser.add_argument(
+        "--stats-settle",
+        type=float,
+        default=10.0,
+        help="пауза перед снимками pg_stat_database: простаивающие соединения сбрасывают счетчики до 10 с",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл JSON (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON предыдущего запуска для сравнения")
+    parser.add_argument("--threshold", type=float, default=1.2, help="допустимый рост p95 и операторов на запрос")
+    seeding = parser.add_argument_group("заполнение базы (--generate)")
+    seeding.add_argument("--generate", action="store_true", help="перед замером запустить generate_test_data")
+    seeding.add_argument("--employees", type=int)
+    seeding.add_argument("--workstations", type=int)
+    seeding.add_argument("--sessions", type=int)
+    seeding.add_argument("--days", type=int, default=30)
+    seeding.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    if args.generate:
+        generate(args)
+
+    data = load_dataset()
+    if data is None:
+        print("⚠️ No employees, workstations or daily stats found. Run with --generate.", file=sys.stderr)
+        sys.exit(2)
+
+    workloads = build_workloads(data, args)
+    if args.workloads:
+        unknown = set(args.workloads) - {w.name for w in workloads}
+        if unknown:
+            parser.error(f"unknown workloads: {', '.join(sorted(unknown))}; available: {', '.join(w.name for w in workloads)}")
+        workloads = [w for w in workloads if w.name in args.workloads]
+
+    statements = ensure_pg_stat_statements()
+    if not statements:
+        print("⚠️ pg_stat_statements is not available, statement deltas are skipped", file=sys.stderr)
+
+    started_at = datetime.now(timezone.utc)
+    try:
+        results = asyncio.run(run_all(workloads, args, statements))
+    finally:
+        if not args.keep_data and any(w.writes for w in workloads):
+            with engine.begin() as conn:
+                deleted = conn.execute(
+                    text("DELETE FROM screentime.screen_sessions WHERE id > :id"), {"id": data.max_session_id}
+                ).rowcount
+            print(f"🧹 Deleted {deleted} sessions created by the benchmark", file=sys.stderr)
+
+    with engine.connect() as conn:
+        server_version = conn.execute(text("SHOW server_version")).scalar_one()
+    report: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": started_at.isoformat(),
+            "transport": args.transport,
+            "server_version": server_version,
+            "pg_stat_statements": statements,
+            "dataset": {
+                "employees": len(data.employee_ids),
+                "workstations": len(data.workstation_ids),
+                "departments": len(data.department_ids),
+                "applications": len(data.application_ids),
+                "sessions": data.sessions,
+                "first_date": data.first_date.isoformat(),
+                "last_date": data.last_date.isoformat(),
+            },
+            "options": {
+                key: getattr(args, key)
+                for key in (
+                    "requests", "concurrency", "warmup", "page_size", "report_days",
+                    "batch_requests", "batch_rows", "batch_mode", "applications", "report_cache", "seed",
+                )
+            },
+        },
+        "workloads": results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["comparison"] = compare(results, report["meta"], json.load(f), args.threshold)
+        if report["comparison"]["mismatched"]:
+            mismatched = ", ".join(report["comparison"]["mismatched"])
+            print(f"⚠️ Baseline differs in {mismatched}, ratios are not comparable", file=sys.stderr)
+        for name in report["comparison"]["regressions"]:
+            print(f"❌ Regression in {name}: {report['comparison']['ratios'][name]}", file=sys.stderr)
+
+    body = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(body + "\n")
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(body)
+    if report.get("comparison", {}).get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Потоковая выгрузка: скорость, объем ответа и расход памяти сервера
+
+    python -m app.scripts.benchmark_export --formats csv ndjson arrow parquet --gzip
+    python -m app.scripts.benchmark_export --path daily-stats --formats ndjson parquet
+
+Запускает приложение в отдельном процессе uvicorn, для каждого формата (и с gzip, если
+указан --gzip; Parquet не сжимается) выгружает /api/export/<path> сначала по одному
+сотруднику, затем целиком, читая ответ потоком: CSV и NDJSON — без сохранения, Arrow
+и Parquet собираются на клиенте, чтобы прочитать их pyarrow и посчитать строки.
+Во время выгрузки раз в 50 мс снимается RSS процесса сервера; печатаются число строк,
+объем, время и прирост RSS относительно состояния до выгрузки. При потоковой выгрузке
+прирост не должен зависеть от числа строк.
+Для заметной разницы в базе должны быть сотни тысяч сессий (app.scripts.generate_test_data).
+"""
+
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+import httpx
+from sqlalchemy import text
+
+from ..db import SessionLocal
+from .bench_utils import ServerProcess
+
+
+def rss_kib(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = rss_kib(pid)
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, rss_kib(self.pid))
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+
+def count_rows(fmt: str, body: bytes) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.ParquetFile(pa.BufferReader(body)).metadata.num_rows
+    return pa.ipc.open_stream(body).read_all().num_rows
+
+
+def export(
+    client: httpx.Client, pid: int, path: str, fmt: str, gzip: bool, params: Dict[str, object]
+) -> Dict[str, float]:
+    headers = {"Accept-Encoding": "gzip" if gzip else "identity"}
+    baseline = rss_kib(pid)
+    sampler = RssSampler(pid)
+    sampler.start()
+    decompressor: Optional[zlib._Decompress] = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzip else None
+    started = time.perf_counter()
+    received = lines = 0
+    body = bytearray()
+    columnar = fmt in ("arrow", "parquet")
+    with client.stream("GET", f"/api/export/{path}", params={"format": fmt, **params}, headers=headers) as response:
+        response.raise_for_status()
+        # iter_raw: без распаковки httpx, чтобы посчитать переданный объем
+        for chunk in response.iter_raw():
+            received += len(chunk)
+            data = decompressor.decompress(chunk) if decompressor else chunk
+            if columnar:
+                body.extend(data)
+            else:
+                lines += data.count(b"\n")
+    elapsed = time.perf_counter() - started
+    peak = sampler.stop()
+    if columnar:
+        rows = count_rows(fmt, bytes(body))
+    else:
+        rows = lines - 1 if fmt == "csv" else lines
+    return {"rows": rows, "mib": received / 2**20, "seconds": elapsed, "rss_growth_mib": (peak - baseline) / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--path", choices=("sessions", "daily-stats", "employee-daily-stats"), default="sessions")
+    parser.add_argument(
+        "--formats", nargs="+", choices=("csv", "ndjson", "arrow", "parquet"), default=["csv", "ndjson", "arrow", "parquet"]
+    )
+    parser.add_argument("--gzip", action="store_true", help="Дополнительно выгружать со сжатием gzip")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = db.execute(text("SELECT count(*) FROM screentime.screen_sessions")).scalar()
+        employee_id = db.execute(text("SELECT min(employee_id) FROM screentime.screen_sessions")).scalar()
+    finally:
+        db.close()
+    print(f"screen_sessions: {total:,} rows")
+
+    with ServerProcess("app.main:app") as server, httpx.Client(base_url=server.base_url, timeout=None) as client:
+        pid = server.process.pid
+        for fmt in args.formats:
+            for gzip in (False, True) if args.gzip and fmt != "parquet" else (False,):
+                for scope, params in (("employee", {"employee_id": employee_id}), ("all", {})):
+                    result = export(client, pid, args.path, fmt, gzip, params)
+                    name = f"{fmt}{'+gzip' if gzip else ''}"
+                    print(
+                        f"{name:>12} {scope:>8}: {result['rows']:>10,} rows, {result['mib']:8.2f} MiB in "
+                        f"{result['seconds']:6.2f} s ({result['rows'] / result['seconds']:>10,.0f} rows/s), "
+                        f"server RSS +{result['rss_growth_mib']:.1f} MiB"
+                    )
+
+
+if __name__ == "__main__":
+    main()
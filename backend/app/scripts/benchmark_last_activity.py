@@ -0,0 +1,82 @@
+"""Сравнение v_employee_last_activity с прежним запросом DISTINCT ON по всем сессиям
+
+    python -m app.scripts.benchmark_last_activity --repeat 20
+
+Выполняет оба запроса по --repeat раз, печатает среднее и медианное время и
+проверяет, что результаты совпадают (код возврата 1 при расхождении).
+Запускать на заполненной базе (app.scripts.generate_test_data).
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+from ..db import SessionLocal
+
+
+# Прежнее определение v_employee_last_activity
+LEGACY_SQL = """
+    SELECT DISTINCT ON (e.id)
+        e.id AS employee_id,
+        e.first_name,
+        e.last_name,
+        s.workstation_id,
+        w.hostname,
+        s.started_at,
+        s.ended_at,
+        s.active_seconds
+    FROM screentime.employees e
+    JOIN screentime.screen_sessions s ON s.employee_id = e.id
+    JOIN screentime.workstations w ON w.id = s.workstation_id
+    ORDER BY e.id, s.ended_at DESC, s.id DESC
+"""
+
+VIEW_SQL = "SELECT * FROM screentime.v_employee_last_activity"
+
+
+def measure(db, sql: str, repeat: int):
+    timings = []
+    rows = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = db.execute(text(sql)).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, [tuple(r) for r in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        sessions = db.execute(text("SELECT count(*) FROM screentime.screen_sessions")).scalar()
+        print(f"screen_sessions: {sessions:,} rows")
+        results = {}
+        for name, sql in (("legacy", LEGACY_SQL), ("table", VIEW_SQL)):
+            timings, rows = measure(db, sql, args.repeat)
+            results[name] = rows
+            print(
+                f"{name:>6}: {len(rows)} rows, avg {statistics.mean(timings):.1f} ms, "
+                f"median {statistics.median(timings):.1f} ms"
+            )
+    finally:
+        db.close()
+
+    if results["legacy"] != results["table"]:
+        mismatches = sorted(set(results["legacy"]) ^ set(results["table"]))
+        print(f"❌ employee_last_activity differs from legacy query in {len(mismatches)} rows:")
+        for row in mismatches[:20]:
+            print("   ", row)
+        sys.exit(1)
+    print("✅ employee_last_activity matches the legacy query")
+
+
+if __name__ == "__main__":
+    main()
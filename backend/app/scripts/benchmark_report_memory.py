@@ -0,0 +1,128 @@
+"""Память на построение JSON-отчета: список словарей + модели ответа против TypedDict и серверного курсора
+
+    python -m app.scripts.benchmark_report_memory --days 7 30 365 --batch-size 1000
+
+Отчет — сессии за последние N дней (строки ScreenSessionRead), чтобы объем рос с длиной
+периода. Каждый способ выполняется в отдельном процессе (чтобы пики не накладывались):
+
+- ``fetch_all+models`` — прежний путь отчетов: ``fetch_all`` (RowMapping -> dict),
+  проверка ``List[схема]`` с созданием моделей и ``dump_json``;
+- ``fetch_json`` — RowMapping без копирования, проверка и сериализация по TypedDict;
+- ``stream_json`` — то же порциями по --batch-size строк из серверного курсора;
+- ``stream_all`` — только проход по строкам серверным курсором (для сравнения с чтением
+  всей выборки ``fetch_all``).
+
+Печатается пиковый прирост RSS процесса (ru_maxrss) и пик выделений Python (tracemalloc,
+отдельный запуск), а также проверяется, что JSON всех способов совпадает.
+Для заметной разницы в базе должно быть не меньше 100k сессий (app.scripts.generate_test_data).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List
+
+from pydantic import TypeAdapter
+from sqlalchemy import text
+
+from .. import schemas
+from ..db import SessionLocal
+from ..utils import sql as sql_utils
+from ..utils.fast_json import rows_adapter
+
+
+SQL = (
+    "SELECT id, employee_id, workstation_id, started_at, ended_at, active_seconds "
+    "FROM screentime.screen_sessions "
+    "WHERE started_at >= (SELECT max(started_at) FROM screentime.screen_sessions) - make_interval(days => :days) "
+    "ORDER BY started_at, id"
+)
+STRATEGIES = ("fetch_all+models", "fetch_json", "stream_json", "fetch_all", "stream_all")
+
+
+def run(strategy: str, days: int, batch_size: int) -> Any:
+    params = {"days": days}
+    db = SessionLocal()
+    try:
+        if strategy == "fetch_all+models":
+            adapter = TypeAdapter(List[schemas.ScreenSessionRead])
+            return adapter.dump_json(adapter.validate_python(sql_utils.fetch_all(db, SQL, params)))
+        if strategy == "fetch_json":
+            return sql_utils.fetch_json(db, SQL, params, rows_adapter(schemas.ScreenSessionRead))
+        if strategy == "stream_json":
+            return sql_utils.stream_json(db, SQL, params, rows_adapter(schemas.ScreenSessionRead), batch_size)
+        if strategy == "fetch_all":
+            return len(sql_utils.fetch_all(db, SQL, params))
+        return sum(1 for _ in sql_utils.stream_all(db, SQL, params, batch_size))
+    finally:
+        db.close()
+
+
+def measure(strategy: str, days: int, batch_size: int, trace: bool) -> Dict[str, Any]:
+    """Выполняется в дочернем процессе: прогрев (импорт, соединение), затем один запуск strategy."""
+    db = SessionLocal()
+    db.execute(text("SELECT 1"))
+    db.close()
+    if trace:
+        tracemalloc.start()
+    # ru_maxrss в Linux — КиБ
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    result = run(strategy, days, batch_size)
+    elapsed = time.perf_counter() - started
+    measured: Dict[str, Any] = {"seconds": elapsed}
+    if trace:
+        measured["traced_peak_mib"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    else:
+        measured["rss_growth_mib"] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / 1024
+    if isinstance(result, bytes):
+        measured["body_mib"] = len(result) / 2**20
+        measured["digest"] = hashlib.blake2b(result, digest_size=16).hexdigest()
+    else:
+        measured["rows"] = result
+    return measured
+
+
+def in_child(strategy: str, days: int, batch_size: int, trace: bool) -> Dict[str, Any]:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(measure, strategy, days, batch_size, trace).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30, 365])
+    parser.add_argument("--batch-size", type=int, default=sql_utils.STREAM_BATCH_SIZE)
+    args = parser.parse_args()
+
+    mismatches = 0
+    for days in args.days:
+        digests = set()
+        for strategy in STRATEGIES:
+            result = in_child(strategy, days, args.batch_size, trace=False)
+            traced = in_child(strategy, days, args.batch_size, trace=True)
+            size = f"{result['body_mib']:7.1f} MiB JSON" if "body_mib" in result else f"{result['rows']:>8,} rows    "
+            print(
+                f"{days:>4} days {strategy:>16}: {size}, {result['seconds']:6.2f} s, "
+                f"RSS +{result['rss_growth_mib']:7.1f} MiB, tracemalloc peak {traced['traced_peak_mib']:7.1f} MiB"
+            )
+            if "digest" in result:
+                digests.add(result["digest"])
+        if len(digests) > 1:
+            mismatches += 1
+            print(f"❌ {days} days: JSON differs between strategies")
+
+    if mismatches:
+        sys.exit(1)
+    print("✅ all strategies produce the same JSON")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Сравнение сериализации большого списка сессий: ORM + response_model и быстрый путь RowSerializer
+
+    python -m app.scripts.benchmark_serialization --sizes 1000 10000 100000 --repeat 5
+
+Запускает в отдельном процессе uvicorn с двумя эндпоинтами списка сессий:
+``/orm/sessions`` — ORM-объекты, проверка ``ScreenSessionRead`` (from_attributes)
+и стандартный JSON-кодировщик FastAPI (прежний list_sessions), ``/fast/sessions`` —
+кортежи колонок и TypeAdapter (текущий list_sessions без expand). Для каждого размера
+выполняет --repeat последовательных запросов к каждому эндпоинту, печатает задержки
+и размер ответа и проверяет, что оба ответа содержат одинаковые данные.
+Для 100k строк база должна содержать не меньше 100k сессий (app.scripts.generate_test_data).
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import List
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import models, schemas
+from ..db import SessionLocal, get_async_db
+from ..routers.sessions import session_rows
+from .bench_utils import ServerProcess, summarize
+
+
+bench_app = FastAPI(title="benchmark_serialization")
+
+
+def _order(stmt, limit: int):
+    s = models.ScreenSession
+    return stmt.order_by(s.started_at.desc(), s.id.desc()).limit(limit)
+
+
+@bench_app.get("/orm/sessions", response_model=List[schemas.ScreenSessionRead])
+async def orm_sessions(limit: int, db: AsyncSession = Depends(get_async_db)):
+    return (await db.execute(_order(select(models.ScreenSession), limit))).scalars().all()
+
+
+@bench_app.get("/fast/sessions", response_model=List[schemas.ScreenSessionRead])
+async def fast_sessions(limit: int, db: AsyncSession = Depends(get_async_db)):
+    return session_rows.response((await db.execute(_order(session_rows.select(), limit))).all())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        total = db.execute(text("SELECT count(*) FROM screentime.screen_sessions")).scalar()
+    finally:
+        db.close()
+    print(f"screen_sessions: {total:,} rows")
+    if total < max(args.sizes):
+        print(f"⚠️ Only {total:,} sessions: larger sizes return {total:,} rows. Run app.scripts.generate_test_data first.")
+
+    mismatches = 0
+    with ServerProcess("app.scripts.benchmark_serialization:bench_app") as server, httpx.Client(
+        base_url=server.base_url, timeout=300
+    ) as client:
+        for size in args.sizes:
+            bodies = {}
+            for path in ("orm", "fast"):
+                client.get(f"/{path}/sessions", params={"limit": size})  # прогрев
+                latencies = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    response = client.get(f"/{path}/sessions", params={"limit": size})
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+                bodies[path] = response.json()
+                summary = summarize(latencies, sum(latencies) / 1000)
+                print(
+                    f"{size:>7} rows {path:>5}: p50 {summary['p50_ms']:8.1f} ms, mean {summary['mean_ms']:8.1f} ms, "
+                    f"max {summary['max_ms']:8.1f} ms, {len(response.content) / 1024:,.0f} KiB"
+                )
+            if bodies["orm"] != bodies["fast"]:
+                mismatches += 1
+                print(f"❌ {size} rows: fast path response differs from ORM response")
+
+    if mismatches:
+        sys.exit(1)
+    print("✅ fast path responses match ORM responses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Проверка инкрементального пересчета суточных агрегатов по сессиям и приложениям
+
+    python -m app.scripts.check_daily_stats --employees 20
+
+Внутри одной транзакции вставляет, изменяет и удаляет сессии выбранных
+сотрудников и использование приложений в них (так, как это делают API и
+batch-импорт), запоминает агрегаты, посчитанные триггерами, затем
+пересчитывает те же пары (сотрудник, день) функцией
+fn_recalculate_daily_employee_stat и сравнивает результаты;
+daily_employee_app_stats сверяется с группировкой session_application_usage.
+После этого переводит сотрудника в другой отдел, удаляет другого и сверяет
+daily_department_stats и daily_department_app_stats с группировкой
+сотрудниковых агрегатов по отделам. Транзакция всегда откатывается.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+from sqlalchemy import text
+
+from ..db import SessionLocal
+
+
+SNAPSHOT_SQL = """
+    SELECT employee_id, stat_date, total_seconds, sessions_count, avg_session_seconds
+    FROM screentime.daily_employee_stats
+    WHERE employee_id = ANY(:ids)
+    ORDER BY employee_id, stat_date
+"""
+
+DEPARTMENT_ROLLUP_SQL = """
+    SELECT department_id, stat_date, total_seconds, sessions_count, employee_days
+    FROM screentime.daily_department_stats
+    ORDER BY department_id, stat_date
+"""
+
+DEPARTMENT_EXPECTED_SQL = """
+    SELECT e.department_id, des.stat_date, SUM(des.total_seconds), SUM(des.sessions_count), COUNT(*)
+    FROM screentime.daily_employee_stats des
+    JOIN screentime.employees e ON e.id = des.employee_id
+    WHERE e.department_id IS NOT NULL
+    GROUP BY e.department_id, des.stat_date
+    ORDER BY e.department_id, des.stat_date
+"""
+
+
+APP_SNAPSHOT_SQL = """
+    SELECT employee_id, stat_date, application_id, total_seconds, sessions_count
+    FROM screentime.daily_employee_app_stats
+    WHERE employee_id = ANY(:ids)
+    ORDER BY employee_id, stat_date, application_id
+"""
+
+APP_EXPECTED_SQL = """
+    SELECT s.employee_id, s.started_at::DATE, u.application_id, SUM(u.active_seconds), COUNT(*)
+    FROM screentime.session_application_usage u
+    JOIN screentime.screen_sessions s ON s.id = u.session_id AND s.started_at = u.session_started_at
+    WHERE s.employee_id = ANY(:ids)
+    GROUP BY s.employee_id, s.started_at::DATE, u.application_id
+    ORDER BY s.employee_id, s.started_at::DATE, u.application_id
+"""
+
+DEPARTMENT_APP_ROLLUP_SQL = """
+    SELECT department_id, stat_date, application_id, total_seconds, sessions_count
+    FROM screentime.daily_department_app_stats
+    ORDER BY department_id, stat_date, application_id
+"""
+
+DEPARTMENT_APP_EXPECTED_SQL = """
+    SELECT e.department_id, eas.stat_date, eas.application_id, SUM(eas.total_seconds), SUM(eas.sessions_count)
+    FROM screentime.daily_employee_app_stats eas
+    JOIN screentime.employees e ON e.id = eas.employee_id
+    WHERE e.department_id IS NOT NULL
+    GROUP BY e.department_id, eas.stat_date, eas.application_id
+    ORDER BY e.department_id, eas.stat_date, eas.application_id
+"""
+
+
+def rows(db, sql, params=None):
+    return [tuple(row) for row in db.execute(text(sql), params)]
+
+
+def snapshot(db, employee_ids):
+    return [tuple(row) for row in db.execute(text(SNAPSHOT_SQL), {"ids": employee_ids})]
+
+
+def report(name, actual, expected, reference):
+    if actual != expected:
+        mismatches = sorted(set(actual) ^ set(expected))
+        print(f"❌ {name} mismatch in {len(mismatches)} rows:")
+        for row in mismatches[:20]:
+            print("   ", row)
+        return False
+    print(f"✅ {len(expected)} {name} rows match {reference}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--employees", type=int, default=20)
+    parser.add_argument("--seed", type=float, default=0.42)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT setseed(:seed)"), {"seed": args.seed})
+        employee_ids = db.execute(
+            text("SELECT id FROM screentime.employees ORDER BY random() LIMIT :n"), {"n": args.employees}
+        ).scalars().all()
+        workstation_id = db.execute(text("SELECT id FROM screentime.workstations LIMIT 1")).scalar()
+        if not employee_ids or workstation_id is None:
+            print("⚠️ No employees or workstations found. Run app.scripts.generate_test_data first.")
+            return
+
+        # Многострочная вставка: несколько сессий на одну и ту же пару (сотрудник, день)
+        db.execute(
+            text(
+                """
+                INSERT INTO screentime.screen_sessions(employee_id, workstation_id, started_at, ended_at, active_seconds)
+                SELECT e.id, :ws, ts, ts + make_interval(secs => secs), secs
+                FROM unnest(CAST(:ids AS INT[])) AS e(id),
+                     LATERAL (
+                        SELECT date_trunc('day', now()) - make_interval(days => (random() * 10)::INT)
+                                   + make_interval(hours => 8 + (random() * 10)::INT) AS ts,
+                               (300 + random() * 7200)::INT AS secs
+                        FROM generate_series(1, 5)
+                     ) g
+                """
+            ),
+            {"ids": employee_ids, "ws": workstation_id},
+        )
+        # Использование приложений в новых сессиях, затем его изменение и удаление части строк
+        db.execute(
+            text(
+                """
+                INSERT INTO screentime.session_application_usage(session_id, session_started_at, application_id, active_seconds)
+                SELECT s.id, s.started_at, a.id, (s.active_seconds * (0.1 + random() * 0.2))::INT
+                FROM screentime.screen_sessions s
+                CROSS JOIN (SELECT id FROM screentime.applications ORDER BY id LIMIT 3) a
+                WHERE s.employee_id = ANY(:ids) AND s.created_at = now()
+                """
+            ),
+            {"ids": employee_ids},
+        )
+        db.execute(
+            text(
+                """
+                UPDATE screentime.session_application_usage u
+                SET active_seconds = u.active_seconds / 2
+                FROM screentime.screen_sessions s
+                WHERE s.id = u.session_id AND s.started_at = u.session_started_at
+                  AND s.employee_id = ANY(:ids) AND s.started_at >= now() - INTERVAL '12 days' AND random() < 0.3
+                """
+            ),
+            {"ids": employee_ids},
+        )
+        db.execute(
+            text(
+                """
+                DELETE FROM screentime.session_application_usage u
+                USING screentime.screen_sessions s
+                WHERE s.id = u.session_id AND s.started_at = u.session_started_at
+                  AND s.employee_id = ANY(:ids) AND s.started_at >= now() - INTERVAL '12 days' AND random() < 0.1
+                """
+            ),
+            {"ids": employee_ids},
+        )
+        # Изменения длительности, переносы между днями и между сотрудниками
+        db.execute(
+            text(
+                """
+                UPDATE screentime.screen_sessions
+                SET active_seconds = active_seconds / 2
+                WHERE employee_id = ANY(:ids) AND random() < 0.3
+                """
+            ),
+            {"ids": employee_ids},
+        )
+        db.execute(
+            text(
+                """
+                UPDATE screentime.screen_sessions
+                SET started_at = started_at - INTERVAL '1 day',
+                    ended_at = ended_at - INTERVAL '1 day',
+                    employee_id = CASE WHEN random() < 0.5 THEN employee_id ELSE :other END
+                WHERE employee_id = ANY(:ids) AND random() < 0.3
+                """
+            ),
+            {"ids": employee_ids, "other": employee_ids[0]},
+        )
+        db.execute(
+            text("DELETE FROM screentime.screen_sessions WHERE employee_id = ANY(:ids) AND random() < 0.3"),
+            {"ids": employee_ids},
+        )
+
+        incremental = snapshot(db, employee_ids)
+        app_incremental = rows(db, APP_SNAPSHOT_SQL, {"ids": employee_ids})
+        app_expected = rows(db, APP_EXPECTED_SQL, {"ids": employee_ids})
+
+        # Эталон: построчная функция для каждой затронутой пары
+        db.execute(
+            text(
+                """
+                SELECT screentime.fn_recalculate_daily_employee_stat(p.employee_id, p.stat_date)
+                FROM (
+                    SELECT employee_id, stat_date FROM screentime.daily_employee_stats WHERE employee_id = ANY(:ids)
+                    UNION
+                    SELECT employee_id, started_at::DATE FROM screentime.screen_sessions WHERE employee_id = ANY(:ids)
+                ) p
+                """
+            ),
+            {"ids": employee_ids},
+        )
+        expected = snapshot(db, employee_ids)
+
+        # Перевод сотрудника в другой отдел и удаление сотрудника
+        db.execute(
+            text(
+                """
+                UPDATE screentime.employees
+                SET department_id = (SELECT id FROM screentime.departments WHERE id IS DISTINCT FROM department_id LIMIT 1)
+                WHERE id = :id
+                """
+            ),
+            {"id": employee_ids[0]},
+        )
+        if len(employee_ids) > 1:
+            db.execute(text("DELETE FROM screentime.employees WHERE id = :id"), {"id": employee_ids[-1]})
+
+        department_rollup = [tuple(row) for row in db.execute(text(DEPARTMENT_ROLLUP_SQL))]
+        department_expected = [tuple(row) for row in db.execute(text(DEPARTMENT_EXPECTED_SQL))]
+        department_app_rollup = rows(db, DEPARTMENT_APP_ROLLUP_SQL)
+        department_app_expected = rows(db, DEPARTMENT_APP_EXPECTED_SQL)
+    finally:
+        db.rollback()
+        db.close()
+
+    ok = report("daily_employee_stats", incremental, expected, "fn_recalculate_daily_employee_stat")
+    ok = report("daily_department_stats", department_rollup, department_expected, "daily_employee_stats grouped by department") and ok
+    ok = report("daily_employee_app_stats", app_incremental, app_expected, "session_application_usage grouped by day") and ok
+    ok = report(
+        "daily_department_app_stats",
+        department_app_rollup,
+        department_app_expected,
+        "daily_employee_app_stats grouped by department",
+    ) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Перенос очереди аудита screentime.audit_queue в audit_log
+
+    python -m app.scripts.drain_audit_queue --batch-size 10000
+
+Нужен при AUDIT_ASYNC=true, если фоновый перенос в приложении выключен
+(AUDIT_DRAIN_INTERVAL_SECONDS=0) или приложение остановлено: переносит очередь
+пачками, каждую в отдельной транзакции, пока она не опустеет. Запускать по cron.
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from sqlalchemy import text
+
+from ..config import get_settings
+from ..db import engine
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=settings.audit_drain_batch_size)
+    args = parser.parse_args()
+
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            moved = conn.execute(
+                text("SELECT screentime.fn_drain_audit_queue(:batch)"), {"batch": args.batch_size}
+            ).scalar_one()
+        total += moved
+        if moved < args.batch_size:
+            break
+    print(f"✅ Moved {total} audit events to audit_log")
+
+
+if __name__ == "__main__":
+    main()
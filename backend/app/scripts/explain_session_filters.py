@@ -0,0 +1,81 @@
+"""Проверка планов запросов списка сессий с фильтрами
+
+    python -m app.scripts.explain_session_filters
+
+Строит те же запросы, что и GET /api/sessions/ и /api/sessions/page, для
+каждого фильтра и их сочетаний, выполняет EXPLAIN (FORMAT JSON) и
+завершается с кодом 1, если в плане есть Seq Scan по screen_sessions.
+Запускать на заполненной базе (app.scripts.generate_test_data) после ANALYZE.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from ..db import SessionLocal
+from .. import models
+from ..routers.sessions import SessionFilters
+from ..utils.pagination import KeysetPaginator
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name", "").startswith("screen_sessions"):
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def main():
+    db = SessionLocal()
+    try:
+        employee_id, department_id = db.execute(
+            text("SELECT id, department_id FROM screentime.employees WHERE department_id IS NOT NULL LIMIT 1")
+        ).one()
+        workstation_id = db.execute(text("SELECT id FROM screentime.workstations LIMIT 1")).scalar()
+        now = datetime.utcnow()
+
+        cases = {
+            "employee": SessionFilters(employee_id=employee_id),
+            "workstation": SessionFilters(workstation_id=workstation_id),
+            "department": SessionFilters(department_id=department_id),
+            "time range": SessionFilters(started_from=now - timedelta(days=1), started_to=now),
+            "employee + time range + min_active": SessionFilters(
+                employee_id=employee_id, started_from=now - timedelta(days=7), started_to=now, min_active_seconds=600
+            ),
+            "department + time range": SessionFilters(
+                department_id=department_id, started_from=now - timedelta(days=7), started_to=now
+            ),
+        }
+
+        s = models.ScreenSession
+        failed = False
+        for name, filters in cases.items():
+            statements = {
+                "list": filters.apply(select(s)).order_by(s.started_at.desc(), s.id.desc()).limit(100),
+                "page": KeysetPaginator([s.started_at, s.id], None, 100, descending=True).apply(filters.apply(select(s))),
+            }
+            for kind, stmt in statements.items():
+                sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+                plan = db.execute(text("EXPLAIN (FORMAT JSON) " + sql)).scalar()
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scans = seq_scans(plan[0]["Plan"])
+                status = "❌ Seq Scan on " + ", ".join(scans) if scans else "✅ index"
+                failed = failed or bool(scans)
+                print(f"{name:>36} [{kind}]: {status}")
+    finally:
+        db.close()
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,53 @@
-"""Скрипт генерации тестовых данных 
+"""Скрипт генерации тестовых данных
 
     python -m app.scripts.generate_test_data
+    python -m app.scripts.generate_test_data --departments 32 --employees 50000 --workstations 50000 \\
+        --days 365 --sessions 100000000 --workers 8 --seed 42
+
+Справочники (отделы, должности, приложения, сотрудники, рабочие станции) создаются, если их
+еще нет; сотрудники и рабочие станции загружаются через COPY. Сессии и использование
+приложений (session_application_usage) генерируются векторно (NumPy) порциями по --chunk-rows
+сессий и загружаются бинарным COPY из структурированного массива, без объектов Python на строку.
+
+Работа делится на шарды по отделам и выполняется пулом процессов (--workers): у шардов разные
+сотрудники, поэтому триггеры уровня оператора (daily_employee_stats, daily_department_stats,
+employee_last_activity) в параллельных транзакциях не обновляют одни и те же строки. Агрегаты
+поддерживаются триггерами на каждую порцию COPY; аудит сессий на время загрузки отключается
+(screentime.audit_sessions = off), --audit оставляет его включенным.
+
+Внешний ключ session_application_usage -> screen_sessions проверяется на каждую строку
+отдельным запросом к секционированной таблице (десятки микросекунд на строку — дольше самой
+вставки), поэтому на время загрузки он удаляется и затем создается заново: PostgreSQL проверяет
+его одним запросом по всей таблице. --keep-usage-fk оставляет ключ (например, если база
+используется во время загрузки).
+
+Результат детерминирован: при одном --seed и пустой базе данные совпадают независимо от
+--workers (у каждой порции свой генератор от (seed, отдел, номер порции)). id сессий заранее
+резервируются в последовательности одним диапазоном, поэтому во время загрузки приложение не
+должно создавать сессии. Каждая порция — отдельная транзакция: прерванная загрузка оставляет
+уже загруженные порции.
 """
 
 from __future__ import annotations
 
+import argparse
+import io
+import os
 import random
-from datetime import date, datetime, timedelta
-from sqlalchemy.exc import ProgrammingError
-
+import time
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import date, timedelta
+from multiprocessing import get_context
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from ..db import SessionLocal
+from ..utils.pg_copy import copy_rows
 from .. import models
 
 
@@ -62,13 +98,55 @@ APPLICATIONS = [
     ("Postman", "postman", "tools", True),
     ("Slack", "slack", "communication", True),
     ("YouTube", "youtube", "entertainment", False),
+    ("IntelliJ IDEA", "idea", "development", True),
+    ("Jira", "jira", "tools", True),
+    ("Microsoft Excel", "excel", "office", True),
+    ("Telegram", "telegram", "communication", False),
+    ("Steam", "steam", "entertainment", False),
 ]
 
+OS_NAMES = ["Windows 10", "Windows 11", "Ubuntu 22.04"]
+
+# Бинарный формат COPY: заголовок (сигнатура, флаги, длина расширения) и признак конца данных
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + np.array([0, 0], dtype=">i4").tobytes()
+COPY_TRAILER = np.array([-1], dtype=">i2").tobytes()
+# TIMESTAMP в бинарном формате — микросекунды от 2000-01-01
+PG_EPOCH = date(2000, 1, 1)
+
+SESSION_COLUMNS = ("id", "employee_id", "workstation_id", "started_at", "ended_at", "active_seconds")
+USAGE_COLUMNS = ("session_id", "session_started_at", "application_id", "active_seconds")
+
+
+def copy_binary(db: Session, table: str, columns: Sequence[Tuple[str, str, np.ndarray]]) -> None:
+    """COPY ... FROM STDIN (FORMAT binary) из массивов NumPy: columns — (имя, тип '>i4' | '>i8', значения).
+
+    Строка бинарного COPY — число полей (int16) и для каждого поля длина (int32) и значение,
+    поэтому при колонках фиксированной ширины весь блок — один структурированный массив.
+    """
+    fields = [("count", ">i2")]
+    for i, (_, dtype, _) in enumerate(columns):
+        fields += [(f"len{i}", ">i4"), (f"val{i}", dtype)]
+    records = np.empty(len(columns[0][2]), dtype=fields)
+    records["count"] = len(columns)
+    for i, (_, dtype, values) in enumerate(columns):
+        records[f"len{i}"] = np.dtype(dtype).itemsize
+        records[f"val{i}"] = values
+
+    buf = io.BytesIO(COPY_HEADER + records.tobytes() + COPY_TRAILER)
+    names = ", ".join(name for name, _, _ in columns)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({names}) FROM STDIN WITH (FORMAT binary)", buf)
+    finally:
+        cursor.close()
+
 
-def create_basic_data(db: Session):
-    # Departments
-    if not db.query(models.Department).count():
-        for name, code in DEPARTMENTS:
+def create_basic_data(db: Session, departments_count: int = len(DEPARTMENTS)):
+    # Departments: сверх стандартного списка — «Отдел N»
+    departments = DEPARTMENTS + [(f"Отдел {i}", f"D{i:03d}") for i in range(len(DEPARTMENTS) + 1, departments_count + 1)]
+    existing = set(db.execute(text("SELECT code FROM screentime.departments")).scalars())
+    for name, code in departments[:departments_count]:
+        if code not in existing:
             db.add(models.Department(name=name, code=code))
 
     # Positions
@@ -77,8 +155,9 @@ def create_basic_data(db: Session):
             db.add(models.Position(name=name, level=level))
 
     # Applications
-    if not db.query(models.Application).count():
-        for name, code, category, productive in APPLICATIONS:
+    existing = set(db.execute(text("SELECT code FROM screentime.applications")).scalars())
+    for name, code, category, productive in APPLICATIONS:
+        if code not in existing:
             db.add(
                 models.Application(
                     name=name,
@@ -91,118 +170,349 @@ def create_basic_data(db: Session):
     db.commit()
 
 
-def create_employees_and_workstations(db: Session, employees_count: int = 500, workstations_count: int = 500):
-    departments = db.query(models.Department).all()
-    positions = db.query(models.Position).all()
+def create_employees_and_workstations(
+    db: Session, employees_count: int = 500, workstations_count: int = 500, seed: int = 42
+):
+    rnd = random.Random(seed)
+    departments = db.query(models.Department).order_by(models.Department.id).all()
+    position_ids = db.execute(text("SELECT id FROM screentime.positions ORDER BY id")).scalars().all()
 
     # Employees
     if not db.query(models.Employee).count():
-        for i in range(employees_count):
-            first_name = random.choice(FIRST_NAMES)
-            last_name = random.choice(LAST_NAMES)
-            email = f"user{i}@example.com"
-            department = random.choice(departments)
-            position = random.choice(positions)
-            hired_at = date.today() - timedelta(days=random.randint(30, 365))
-
-            db.add(
-                models.Employee(
-                    first_name=first_name,
-                    last_name=last_name,
-                    email=email,
-                    department_id=department.id,
-                    position_id=position.id,
-                    hired_at=hired_at,
+        today = date.today()
+        copy_rows(
+            db,
+            "screentime.employees",
+            ("first_name", "last_name", "email", "department_id", "position_id", "hired_at"),
+            (
+                (
+                    rnd.choice(FIRST_NAMES),
+                    rnd.choice(LAST_NAMES),
+                    f"user{i}@example.com",
+                    rnd.choice(departments).id,
+                    rnd.choice(position_ids),
+                    today - timedelta(days=rnd.randint(30, 365)),
                 )
-            )
+                for i in range(employees_count)
+            ),
+        )
+        print(f"👥 Created {employees_count} employees")
 
     db.commit()
 
     # Workstations
     if not db.query(models.Workstation).count():
+        rows = []
         for i in range(workstations_count):
-            department = random.choice(departments)
-            hostname = f"pc-{department.code.lower()}-{i:03d}"
-            inventory_number = f"INV-{department.code}-{i:04d}"
-            os_name = random.choice(["Windows 10", "Windows 11", "Ubuntu 22.04"])
-
-            db.add(
-                models.Workstation(
-                    hostname=hostname,
-                    inventory_number=inventory_number,
-                    department_id=department.id,
-                    os_name=os_name,
+            department = rnd.choice(departments)
+            rows.append(
+                (
+                    f"pc-{department.code.lower()}-{i:03d}",
+                    f"INV-{department.code}-{i:04d}",
+                    department.id,
+                    rnd.choice(OS_NAMES),
                 )
             )
+        copy_rows(db, "screentime.workstations", ("hostname", "inventory_number", "department_id", "os_name"), rows)
+        print(f"🖥️ Created {workstations_count} workstations")
 
     db.commit()
 
 
-def create_screen_sessions(db: Session, days: int = 30, sessions_per_employee_per_day: int = 3):
-    employees = db.query(models.Employee).all()
-    workstations = db.query(models.Workstation).all()
-
-    if not employees or not workstations:
+@dataclass
+class Shard:
+    """Сессии сотрудников одного отдела: quota сессий с id начиная с first_id."""
+
+    department_id: int
+    employee_ids: np.ndarray
+    workstation_ids: np.ndarray
+    quota: int
+    first_id: int
+
+
+@dataclass
+class Options:
+    start_date: date
+    days: int
+    seed: int
+    chunk_rows: int
+    application_ids: np.ndarray
+    apps_per_session: int
+    audit: bool
+
+
+def day_chunks(quota: int, days: int, chunk_rows: int) -> List[np.ndarray]:
+    """Сессии по дням (поровну, остаток — первым дням), сгруппированные в порции подряд идущих дней."""
+    per_day = np.full(days, quota // days, dtype=np.int64)
+    per_day[: quota % days] += 1
+    chunks, first = [], 0
+    while first < days:
+        last = first + 1
+        while last < days and per_day[first:last].sum() + per_day[last] <= chunk_rows:
+            last += 1
+        chunks.append(np.concatenate([np.zeros(first, dtype=np.int64), per_day[first:last]]))
+        first = last
+    return chunks
+
+
+def generate_sessions(
+    rng: np.random.Generator, shard: Shard, per_day: np.ndarray, first_id: int, day_offset_s: int
+) -> Dict[str, np.ndarray]:
+    n = int(per_day.sum())
+    day = np.repeat(np.arange(len(per_day)), per_day)
+    employee_idx = rng.integers(0, len(shard.employee_ids), n)
+    # Начало с 8:00 до 19:00, длительность 15–120 минут, активное время — 50–100% длительности
+    started = day * 86400 + rng.integers(8 * 3600, 19 * 3600, n)
+    order = np.argsort(started, kind="stable")
+    started, employee_idx = started[order], employee_idx[order]
+    duration = rng.integers(15, 121, n) * 60
+    active = (duration * rng.uniform(0.5, 1.0, n)).astype(np.int64)
+
+    # Обычно сотрудник работает за «своей» рабочей станцией отдела, иногда — за любой другой
+    home = shard.workstation_ids[employee_idx % len(shard.workstation_ids)]
+    other = shard.workstation_ids[rng.integers(0, len(shard.workstation_ids), n)]
+    workstation = np.where(rng.random(n) < 0.1, other, home)
+
+    started_us = (day_offset_s + started) * 1_000_000
+    return {
+        "id": first_id + np.arange(n, dtype=np.int64),
+        "employee_id": shard.employee_ids[employee_idx],
+        "workstation_id": workstation,
+        "started_at": started_us,
+        "ended_at": started_us + duration * 1_000_000,
+        "active_seconds": active,
+    }
+
+
+def generate_usage(rng: np.random.Generator, sessions: Dict[str, np.ndarray], options: Options) -> Dict[str, np.ndarray]:
+    """1..apps_per_session разных приложений на сессию; активное время сессии делится между ними."""
+    n = len(sessions["id"])
+    apps = options.application_ids
+    width = min(options.apps_per_session, len(apps))
+    count = rng.integers(1, width + 1, n)
+    # Случайная перестановка приложений в каждой строке: первые count — приложения сессии
+    chosen = np.argsort(rng.random((n, len(apps))), axis=1)[:, :width]
+    mask = np.arange(width) < count[:, None]
+    weights = rng.random((n, width)) * mask
+    weights /= weights.sum(axis=1, keepdims=True)
+    seconds = np.floor(sessions["active_seconds"][:, None] * weights).astype(np.int64)
+    seconds[:, 0] += sessions["active_seconds"] - seconds.sum(axis=1)
+    return {
+        "session_id": np.broadcast_to(sessions["id"][:, None], (n, width))[mask],
+        "session_started_at": np.broadcast_to(sessions["started_at"][:, None], (n, width))[mask],
+        "application_id": apps[chosen][mask],
+        "active_seconds": seconds[mask],
+    }
+
+
+def load_shard(shard: Shard, options: Options) -> Tuple[int, int, int]:
+    """Выполняется в процессе пула: генерирует и загружает сессии шарда порциями."""
+    day_offset_s = (options.start_date - PG_EPOCH).days * 86400
+    session_types = dict(zip(SESSION_COLUMNS, (">i8", ">i4", ">i4", ">i8", ">i8", ">i4")))
+    usage_types = dict(zip(USAGE_COLUMNS, (">i8", ">i8", ">i4", ">i4")))
+    next_id = shard.first_id
+    sessions_total = usage_total = 0
+    for chunk_no, per_day in enumerate(day_chunks(shard.quota, options.days, options.chunk_rows)):
+        if not per_day.any():
+            continue
+        rng = np.random.default_rng([options.seed, shard.department_id, chunk_no])
+        sessions = generate_sessions(rng, shard, per_day, next_id, day_offset_s)
+        usage = generate_usage(rng, sessions, options)
+        db = SessionLocal()
+        try:
+            db.execute(
+                text("SELECT set_config('statement_timeout', '0', true), set_config('screentime.audit_sessions', :audit, true)"),
+                {"audit": "row" if options.audit else "off"},
+            )
+            copy_binary(db, "screentime.screen_sessions", [(c, session_types[c], sessions[c]) for c in SESSION_COLUMNS])
+            copy_binary(db, "screentime.session_application_usage", [(c, usage_types[c], usage[c]) for c in USAGE_COLUMNS])
+            db.commit()
+        finally:
+            db.close()
+        next_id += len(sessions["id"])
+        sessions_total += len(sessions["id"])
+        usage_total += len(usage["session_id"])
+    return shard.department_id, sessions_total, usage_total
+
+
+def plan_shards(db: Session, sessions_count: int) -> List[Shard]:
+    """Шарды по отделам сотрудников; сессии делятся пропорционально числу сотрудников отдела."""
+    employees = db.execute(
+        text("SELECT COALESCE(department_id, 0), id FROM screentime.employees WHERE is_active ORDER BY 1, 2")
+    ).all()
+    workstations: Dict[int, List[int]] = {}
+    for department_id, workstation_id in db.execute(
+        text("SELECT department_id, id FROM screentime.workstations ORDER BY 1, 2")
+    ):
+        workstations.setdefault(department_id, []).append(workstation_id)
+    all_workstations = [w for ids in workstations.values() for w in ids]
+
+    by_department: Dict[int, List[int]] = {}
+    for department_id, employee_id in employees:
+        by_department.setdefault(department_id, []).append(employee_id)
+
+    shards, assigned = [], 0
+    for i, (department_id, employee_ids) in enumerate(sorted(by_department.items())):
+        if i == len(by_department) - 1:
+            quota = sessions_count - assigned
+        else:
+            quota = sessions_count * len(employee_ids) // len(employees)
+        shards.append(
+            Shard(
+                department_id=department_id,
+                employee_ids=np.array(employee_ids, dtype=np.int64),
+                # Отдел без рабочих станций — любые станции
+                workstation_ids=np.array(workstations.get(department_id) or all_workstations, dtype=np.int64),
+                quota=quota,
+                first_id=assigned,
+            )
+        )
+        assigned += quota
+    return shards
+
+
+# Внешний ключ использования приложений на сессию (на секционированной таблице — родительский)
+USAGE_SESSION_FK_SQL = text(
+    """
+    SELECT conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE conrelid = 'screentime.session_application_usage'::regclass
+      AND confrelid = 'screentime.screen_sessions'::regclass
+      AND contype = 'f'
+      AND conparentid = 0
+    """
+)
+
+
+@contextmanager
+def usage_session_fk_dropped(db: Session):
+    row = db.execute(USAGE_SESSION_FK_SQL).first()
+    if row is None:
+        yield
+        return
+    name, definition = row
+    db.execute(text(f'ALTER TABLE screentime.session_application_usage DROP CONSTRAINT "{name}"'))
+    db.commit()
+    try:
+        yield
+    finally:
+        # Порции загружаются вместе с сессиями, поэтому ключ восстанавливается и после прерванной загрузки
+        print("🔗 Restoring session_application_usage foreign key...")
+        db.rollback()
+        db.execute(text("SET LOCAL statement_timeout = 0"))
+        db.execute(text(f'ALTER TABLE screentime.session_application_usage ADD CONSTRAINT "{name}" {definition}'))
+        db.commit()
+
+
+def reserve_session_ids(db: Session, count: int) -> int:
+    """Резервирует count id сессий подряд; возвращает первый."""
+    last = db.execute(
+        text(
+            "SELECT setval('screentime.screen_sessions_id_seq', "
+            "nextval('screentime.screen_sessions_id_seq') + :count - 1)"
+        ),
+        {"count": count},
+    ).scalar_one()
+    db.commit()
+    return last - count + 1
+
+
+def create_screen_sessions(
+    db: Session,
+    sessions_count: int,
+    days: int = 30,
+    apps_per_session: int = 3,
+    workers: int = 1,
+    chunk_rows: int = 200_000,
+    seed: int = 42,
+    audit: bool = False,
+    keep_usage_fk: bool = False,
+):
+    shards = plan_shards(db, sessions_count)
+    if not shards or not any(len(s.workstation_ids) for s in shards):
         print("⚠️ No employees or workstations found. Skipping screen sessions creation.")
         return
 
     start_date = date.today() - timedelta(days=days)
-
-    # Временно отключаем триггер, который вызывает ошибку
-    try:
-        db.execute("ALTER TABLE screentime.screen_sessions DISABLE TRIGGER trg_screen_sessions_daily_stats")
-        print("⏸️ Disabled trigger 'trg_screen_sessions_daily_stats' temporarily")
-    except ProgrammingError as e:
-        if "does not exist" in str(e):
-            print("ℹ️ Trigger doesn't exist yet, proceeding without disabling")
-        else:
-            print(f"⚠️ Could not disable trigger: {str(e)}")
-    
-    # Создаем сессии
-    print(f"📊 Creating screen sessions for {len(employees)} employees over {days} days...")
-    
-    for emp in employees:
-        for day_offset in range(days):
-            current_date = start_date + timedelta(days=day_offset)
-            workstation = random.choice(workstations)
-
-            for _ in range(sessions_per_employee_per_day):
-                start_hour = random.randint(8, 18)
-                duration_minutes = random.randint(15, 120)
-                started_at = datetime.combine(current_date, datetime.min.time()) + timedelta(hours=start_hour)
-                ended_at = started_at + timedelta(minutes=duration_minutes)
-                active_seconds = duration_minutes * 60
-
-                db.add(
-                    models.ScreenSession(
-                        employee_id=emp.id,
-                        workstation_id=workstation.id,
-                        started_at=started_at,
-                        ended_at=ended_at,
-                        active_seconds=active_seconds,
-                    )
+    db.execute(
+        text("SELECT screentime.fn_ensure_screen_sessions_partitions(:date_from, :date_to)"),
+        {"date_from": start_date, "date_to": date.today()},
+    )
+    first_id = reserve_session_ids(db, sessions_count)
+    for shard in shards:
+        shard.first_id += first_id
+    application_ids = db.execute(text("SELECT id FROM screentime.applications ORDER BY id")).scalars().all()
+    db.commit()
+    options = Options(
+        start_date=start_date,
+        days=days,
+        seed=seed,
+        chunk_rows=chunk_rows,
+        application_ids=np.array(application_ids, dtype=np.int64),
+        apps_per_session=apps_per_session,
+        audit=audit,
+    )
+
+    print(
+        f"📊 Creating {sessions_count:,} screen sessions over {days} days in {len(shards)} department shards "
+        f"with {workers} workers..."
+    )
+    started = time.perf_counter()
+    sessions_total = usage_total = 0
+    with nullcontext() if keep_usage_fk else usage_session_fk_dropped(db):
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            futures = [pool.submit(load_shard, shard, options) for shard in shards]
+            for future in as_completed(futures):
+                department_id, sessions, usage = future.result()
+                sessions_total += sessions
+                usage_total += usage
+                elapsed = time.perf_counter() - started
+                print(
+                    f"  department {department_id}: {sessions:,} sessions, {usage:,} application usage rows "
+                    f"({sessions_total / elapsed:,.0f} sessions/s overall)"
                 )
 
+    db.execute(text("SET LOCAL statement_timeout = 0"))
+    db.execute(text("ANALYZE screentime.screen_sessions"))
+    db.execute(text("ANALYZE screentime.session_application_usage"))
     db.commit()
-    print("✅ Screen sessions created successfully")
-    
-    # Включаем триггер обратно
-    try:
-        db.execute("ALTER TABLE screentime.screen_sessions ENABLE TRIGGER trg_screen_sessions_daily_stats")
-        print("▶️ Re-enabled trigger 'trg_screen_sessions_daily_stats'")
-    except ProgrammingError as e:
-        if "does not exist" in str(e):
-            print("ℹ️ Trigger doesn't exist, skipping re-enable")
-        else:
-            print(f"⚠️ Could not re-enable trigger: {str(e)}")
+    print(
+        f"✅ Created {sessions_total:,} screen sessions and {usage_total:,} application usage rows "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
 
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--departments", type=int, default=len(DEPARTMENTS), help="Число отделов (шардов)")
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--workstations", type=int, default=500)
+    parser.add_argument("--days", type=int, default=30, help="Период сессий: последние N дней")
+    parser.add_argument("--sessions", type=int, help="Всего сессий (по умолчанию 3 на сотрудника в день)")
+    parser.add_argument("--apps-per-session", type=int, default=3, help="Максимум приложений в сессии")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-rows", type=int, default=200_000, help="Сессий в одной порции COPY (транзакции)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--audit", action="store_true", help="Не отключать аудит сессий на время загрузки")
+    parser.add_argument("--keep-usage-fk", action="store_true", help="Не удалять внешний ключ usage -> сессии на время загрузки")
+    args = parser.parse_args()
+
     db = SessionLocal()
     try:
-        create_basic_data(db)
-        create_employees_and_workstations(db)
-        create_screen_sessions(db, days=30, sessions_per_employee_per_day=3)
+        create_basic_data(db, args.departments)
+        create_employees_and_workstations(db, args.employees, args.workstations, args.seed)
+        employees = db.query(models.Employee).filter(models.Employee.is_active).count()
+        create_screen_sessions(
+            db,
+            sessions_count=args.sessions if args.sessions is not None else employees * args.days * 3,
+            days=args.days,
+            apps_per_session=args.apps_per_session,
+            workers=args.workers,
+            chunk_rows=args.chunk_rows,
+            seed=args.seed,
+            audit=args.audit,
+            keep_usage_fk=args.keep_usage_fk,
+        )
         print("✨ Test data generation completed successfully!")
     except Exception as e:
         print(f"❌ Error during data generation: {str(e)}")
@@ -212,4 +522,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,47 @@
+"""Обслуживание месячных секций screen_sessions / session_application_usage и audit_log
+
+    python -m app.scripts.maintain_partitions --months-ahead 3 --keep-months 24 --audit-keep-months 12
+
+Создает секции на months-ahead месяцев вперед и, если задан keep-months,
+удаляет (или с --detach отсоединяет для архивации) секции старше keep-months
+месяцев. Удаление секции — DROP TABLE вместо массового DELETE; суточные
+агрегаты daily_employee_stats при этом сохраняются. Журнал аудита хранится
+audit-keep-months месяцев (AUDIT_RETENTION_MONTHS). Запускать по cron.
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from sqlalchemy import text
+
+from ..config import get_settings
+from ..db import engine
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--months-ahead", type=int, default=settings.partition_months_ahead)
+    parser.add_argument("--keep-months", type=int, default=settings.session_retention_months or None)
+    parser.add_argument("--audit-keep-months", type=int, default=settings.audit_retention_months or None)
+    parser.add_argument("--detach", action="store_true", help="отсоединить старые секции вместо удаления")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        rows = conn.execute(
+            text("SELECT * FROM screentime.fn_maintain_screen_sessions_partitions(:ahead, :keep, :drop)"),
+            {"ahead": args.months_ahead, "keep": args.keep_months, "drop": not args.detach},
+        ).all()
+        rows += conn.execute(
+            text("SELECT * FROM screentime.fn_maintain_audit_log_partitions(:ahead, :keep, :drop)"),
+            {"ahead": args.months_ahead, "keep": args.audit_keep_months, "drop": not args.detach},
+        ).all()
+
+    for action, name in rows:
+        print(f"🗂️ {action}: {name}")
+    print(f"✅ Partitions ensured for {args.months_ahead} months ahead")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Параметр ``expand=`` для эндпоинтов чтения: загрузка связанных объектов одним запросом.
+
+Эндпоинт объявляет допустимые значения и опции загрузки (``joinedload`` для связей
+многие-к-одному, ``selectinload`` для один-ко-многим) и получает ``Expansion`` через
+``Depends(expand_param(...))``. ``Expansion.dump`` превращает ORM-объект в словарь с полями
+схемы ответа, где связи присутствуют только запрошенные: незапрошенные не читаются (ленивая
+загрузка не срабатывает) и не попадают в ответ при ``response_model_exclude_unset=True``.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Sequence, Type
+
+from fastapi import HTTPException, Query, status
+from pydantic import BaseModel
+from sqlalchemy.orm.interfaces import LoaderOption
+
+
+class Expansion:
+    def __init__(self, fields: FrozenSet[str], loaders: Mapping[str, LoaderOption]):
+        self.fields = fields
+        self.loaders = loaders
+
+    def options(self) -> List[LoaderOption]:
+        return [self.loaders[name] for name in sorted(self.fields)]
+
+    def dump(self, obj: Any, schema: Type[BaseModel]) -> Dict[str, Any]:
+        return {
+            name: getattr(obj, name)
+            for name in schema.model_fields
+            if name not in self.loaders or name in self.fields
+        }
+
+    def dump_all(self, rows: Sequence[Any], schema: Type[BaseModel]) -> List[Dict[str, Any]]:
+        return [self.dump(row, schema) for row in rows]
+
+
+def expand_param(loaders: Mapping[str, LoaderOption]):
+    """Зависимость FastAPI: разбирает ``expand`` (значения через запятую) и проверяет допустимые значения."""
+    allowed = ", ".join(loaders)
+
+    def dependency(
+        expand: Optional[str] = Query(None, description=f"Связанные данные через запятую: {allowed}"),
+    ) -> Expansion:
+        fields = frozenset(f.strip() for f in expand.split(",") if f.strip()) if expand else frozenset()
+        unknown = fields - loaders.keys()
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown expand value(s): {', '.join(sorted(unknown))}. Allowed: {allowed}",
+            )
+        return Expansion(fields, loaders)
+
+    return dependency
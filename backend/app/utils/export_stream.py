@@ -0,0 +1,182 @@
+"""Потоковая выгрузка результатов запроса в CSV или NDJSON без загрузки всей выборки в память.
+
+Обе формы формирует сам PostgreSQL через ``COPY (запрос) TO STDOUT`` (asyncpg):
+
+- CSV — ``FORMAT csv, HEADER``;
+- NDJSON — ``SELECT row_to_json(t) FROM (запрос) t`` в текстовом формате COPY. Управляющие
+  символы JSON экранирует сам, поэтому текстовый формат меняет только ``\\`` на ``\\\\``,
+  и это обратимо заменой в каждом блоке.
+
+Данные передаются клиенту блоками по мере чтения из сокета через ограниченную очередь:
+пока клиент не заберет блок, COPY не читает дальше, поэтому расход памяти не зависит
+от числа выгружаемых строк. Если клиент передал ``Accept-Encoding: gzip``, поток сжимается
+на лету.
+
+Колоночные форматы (Arrow IPC, Parquet) формируются из серверного курсора в arrow_export.
+
+Сессия открывается внутри генератора: зависимости FastAPI закрываются до отправки тела
+ответа, а выгрузка читает из БД все время, пока клиент получает данные.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import zlib
+from contextlib import aclosing
+from typing import AsyncIterator
+
+import anyio
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.sql import Executable
+
+from ..config import get_settings
+from .arrow_export import COLUMNAR_FORMATS, columnar_stream, pyarrow_module
+from .arrow_export import EXTENSIONS as COLUMNAR_EXTENSIONS
+from .arrow_export import MEDIA_TYPES as COLUMNAR_MEDIA_TYPES
+
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson", **COLUMNAR_MEDIA_TYPES}
+EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", **COLUMNAR_EXTENSIONS}
+
+# Размер блока, передаваемого клиенту, и число блоков в очереди между COPY и ответом
+COPY_BLOCK_BYTES = 64 * 1024
+COPY_QUEUE_BLOCKS = 8
+
+_DONE = object()
+
+
+def accepts_gzip(request: Request) -> bool:
+    """Есть ли gzip (или ``*``) в Accept-Encoding с ненулевым q."""
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                return float(params[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+async def _begin_export(db: AsyncSession) -> None:
+    # Выгрузка длится дольше обычного запроса: statement_timeout задается только для ее транзакции
+    timeout_ms = get_settings().export_statement_timeout_ms
+    await db.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+
+
+async def copy_stream(session_factory: async_sessionmaker, stmt: Executable, fmt: str) -> AsyncIterator[bytes]:
+    """Блоки COPY TO STDOUT для stmt в формате fmt; stmt компилируется с параметрами для asyncpg."""
+    async with session_factory() as db:
+        await _begin_export(db)
+        conn = await db.connection()
+        compiled = stmt.compile(dialect=conn.dialect)
+        args = [compiled.params[name] for name in compiled.positiontup or ()]
+        driver_conn = (await conn.get_raw_connection()).driver_connection
+        if fmt == "csv":
+            query, copy_options, unescape = compiled.string, {"format": "csv", "header": True}, False
+        else:
+            query, copy_options, unescape = f"SELECT row_to_json(t) FROM ({compiled.string}) AS t", {}, True
+
+        # Ограниченная очередь: COPY ждет, пока клиент заберет данные, и не читает сокет дальше
+        queue: asyncio.Queue = asyncio.Queue(maxsize=COPY_QUEUE_BLOCKS)
+        buffer = bytearray()
+        closed = False
+
+        async def output(data: bytes) -> None:
+            # asyncpg передает целые строки COPY, поэтому пара обратных слэшей не разрывается
+            buffer.extend(data.replace(b"\\\\", b"\\") if unescape else data)
+            if len(buffer) >= COPY_BLOCK_BYTES:
+                await queue.put(bytes(buffer))
+                buffer.clear()
+
+        async def run_copy() -> None:
+            try:
+                await driver_conn.copy_from_query(query, *args, output=output, **copy_options)
+                if buffer:
+                    await queue.put(bytes(buffer))
+            finally:
+                # После закрытия потока очередь никто не читает и может быть заполнена
+                if not closed:
+                    await queue.put(_DONE)
+
+        task = asyncio.create_task(run_copy())
+        try:
+            while (block := await queue.get()) is not _DONE:
+                yield block
+            await task
+        finally:
+            if not task.done():
+                # Поток закрыт до конца выгрузки (клиент отключился): COPY прерывается,
+                # asyncpg отправляет серверу запрос отмены
+                closed = True
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(get_settings().export_gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+    yield compressor.flush()
+
+
+async def _logged(chunks: AsyncIterator[bytes], name: str) -> AsyncIterator[bytes]:
+    # Заголовки уже отправлены: ошибку нельзя вернуть статусом, поток обрывается
+    try:
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                yield chunk
+    except Exception:
+        logger.exception("Export %s aborted", name)
+        raise
+
+
+class ExportStreamingResponse(StreamingResponse):
+    """StreamingResponse, который закрывает поток и при обрыве соединения клиентом.
+
+    Иначе генератор остается приостановленным до сборки мусора, а вместе с ним —
+    соединение из пула с открытой транзакцией.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # При отмене запроса ожидание в finally тоже отменилось бы: закрытие сессии защищено
+            with anyio.CancelScope(shield=True):
+                await self.body_iterator.aclose()
+
+
+def export_response(
+    request: Request,
+    session_factory: async_sessionmaker,
+    stmt: Executable,
+    fmt: str,
+    name: str,
+) -> StreamingResponse:
+    if fmt in COLUMNAR_FORMATS:
+        # До начала ответа, чтобы отсутствие pyarrow вернулось статусом 501
+        pyarrow_module()
+        chunks = _logged(columnar_stream(session_factory, stmt, fmt, _begin_export), name)
+    else:
+        chunks = _logged(copy_stream(session_factory, stmt, fmt), name)
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{EXTENSIONS[fmt]}"', "Vary": "Accept-Encoding"}
+    # Parquet уже сжат (zstd)
+    if fmt != "parquet" and accepts_gzip(request):
+        chunks = gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return ExportStreamingResponse(chunks, media_type=MEDIA_TYPES[fmt], headers=headers)
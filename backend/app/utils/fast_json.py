@@ -0,0 +1,56 @@
+"""Быстрый путь для больших списков: кортежи колонок вместо ORM-объектов и сериализация через TypeAdapter.
+
+Обычный путь — ORM-объекты (identity map, отслеживание состояния), проверка каждого
+объекта схемой ответа с ``from_attributes`` и кодирование в JSON стандартным ``json``.
+``RowSerializer`` выбирает только колонки схемы и сериализует строки в JSON одним вызовом
+pydantic-core по TypedDict с теми же полями, без создания моделей. Эндпоинт возвращает
+готовый ``Response``, поэтому ``response_model`` используется только для документации.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Type
+
+from fastapi import Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Select, select
+from typing_extensions import TypedDict
+
+
+def schema_row_type(schema: Type[BaseModel]) -> type:
+    """TypedDict с полями и типами schema: pydantic проверяет и сериализует его без создания экземпляров модели."""
+    return TypedDict(f"{schema.__name__}Row", {name: field.annotation for name, field in schema.model_fields.items()})
+
+
+def rows_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    """TypeAdapter списка строк с полями schema; строки — любые отображения (dict, RowMapping)."""
+    return TypeAdapter(List[schema_row_type(schema)])
+
+
+class RowSerializer:
+    """Сериализация строк ``select`` по колонкам модели с именами и типами полей schema."""
+
+    def __init__(self, model: Any, schema: Type[BaseModel]):
+        self.columns = [getattr(model, name) for name in schema.model_fields]
+        row_type = schema_row_type(schema)
+        page_type = TypedDict(
+            f"{schema.__name__}Page",
+            {"items": List[row_type], "next_cursor": Optional[str], "prev_cursor": Optional[str]},
+        )
+        self._rows_adapter = rows_adapter(schema)
+        self._page_adapter = TypeAdapter(page_type)
+
+    def select(self) -> Select:
+        return select(*self.columns)
+
+    def response(self, rows: Sequence[Any]) -> Response:
+        return Response(content=self._rows_adapter.dump_json(_dicts(rows)), media_type="application/json")
+
+    def page_response(self, page: Mapping[str, Any]) -> Response:
+        """Страница KeysetPaginator.page (items — строки select)."""
+        body = self._page_adapter.dump_json({**page, "items": _dicts(page["items"])})
+        return Response(content=body, media_type="application/json")
+
+
+def _dicts(rows: Sequence[Any]) -> List[Dict[str, Any]]:
+    return [row._asdict() for row in rows]
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, literal, tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+
+def _dump(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _load(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any], direction: str) -> str:
+    payload = json.dumps({"d": direction, "k": [_dump(v) for v in values]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[List[Any], str]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        direction = payload["d"]
+        values = [_load(v) for v in payload["k"]]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if direction not in ("next", "prev"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return values, direction
+
+
+class KeysetPaginator:
+    """Keyset (cursor) пагинация по набору столбцов, образующих уникальный ключ сортировки.
+
+    Условие строится как сравнение кортежей ``(k1, k2) < (:v1, :v2)``, поэтому
+    запрос обслуживается составным индексом в том же порядке, и стоимость
+    любой страницы не зависит от ее номера.
+    """
+
+    def __init__(self, keys: Sequence[ColumnElement], cursor: Optional[str], limit: int, descending: bool = False):
+        self.keys = list(keys)
+        self.limit = limit
+        self.descending = descending
+        self.values: Optional[List[Any]] = None
+        self.direction = "next"
+        if cursor:
+            self.values, self.direction = decode_cursor(cursor)
+            if len(self.values) != len(self.keys):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    @property
+    def _reverse(self) -> bool:
+        # Для перехода назад порядок сортировки и сравнение инвертируются
+        return self.descending != (self.direction == "prev")
+
+    def apply(self, stmt: Select) -> Select:
+        if self.values is not None:
+            bound = tuple_(*[literal(v, type_=k.type) for k, v in zip(self.keys, self.values)])
+            key = tuple_(*self.keys)
+            stmt = stmt.where(key < bound if self._reverse else key > bound)
+        order = [k.desc() if self._reverse else k.asc() for k in self.keys]
+        return stmt.order_by(*order).limit(self.limit + 1)
+
+    def _cursor(self, row: Any, direction: str) -> str:
+        return encode_cursor([getattr(row, k.key) for k in self.keys], direction)
+
+    def page(self, rows: Sequence[Any]) -> Dict[str, Any]:
+        rows = list(rows)
+        has_more = len(rows) > self.limit
+        rows = rows[: self.limit]
+        if self.direction == "prev":
+            rows.reverse()
+            next_cursor = self._cursor(rows[-1], "next") if rows else None
+            prev_cursor = self._cursor(rows[0], "prev") if rows and has_more else None
+        else:
+            next_cursor = self._cursor(rows[-1], "next") if rows and has_more else None
+            prev_cursor = self._cursor(rows[0], "prev") if rows and self.values is not None else None
+        return {"items": rows, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
@@ -0,0 +1,19 @@
+import csv
+import io
+from typing import Any, Iterable, Sequence
+
+from sqlalchemy.orm import Session
+
+
+def copy_rows(db: Session, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+    """Загружает строки в таблицу через COPY ... FROM STDIN в рамках текущей транзакции сессии."""
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    buf.seek(0)
+
+    # COPY доступен только на уровне DBAPI-курсора psycopg2.
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    finally:
+        cursor.close()
@@ -1,11 +1,109 @@
-from typing import Any, Iterable, List, Mapping
+"""Выполнение SQL-текста отчетов и служебных запросов.
 
+- ``fetch_all`` — список словарей (строки копируются в ``dict``); для небольших выборок,
+  которые дальше изменяются или передаются как обычные словари;
+- ``stream_all`` — итератор по строкам через серверный курсор
+  (``stream_results=True, yield_per=batch_size``): в памяти одна порция, а не вся выборка;
+- ``fetch_json`` / ``stream_json`` — сразу JSON-массив по TypeAdapter (см. ``fast_json.rows_adapter``):
+  строки проверяются как ``RowMapping`` без промежуточных словарей и моделей, у ``stream_json``
+  сериализация идет порциями из серверного курсора.
+
+Для ``AsyncSession`` — те же функции с суффиксом ``_async``.
+"""
+
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Sequence
+
+from pydantic import TypeAdapter
 from sqlalchemy import text
-from sqlalchemy.engine import Result
+from sqlalchemy.engine import Result, RowMapping
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+# Строк в одной выборке из серверного курсора
+STREAM_BATCH_SIZE = 1000
 
-def fetch_all(db: Session, sql: str, params: Mapping[str, Any] | None = None) -> List[Mapping[str, Any]]:
+
+def fetch_all(db: Session, sql: str, params: Mapping[str, Any] | None = None) -> List[Dict[str, Any]]:
     result: Result = db.execute(text(sql), params or {})
-    rows = result.mappings().all()
-    return [dict(row) for row in rows]
+    return [dict(row) for row in result.mappings()]
+
+
+async def fetch_all_async(db: AsyncSession, sql: str, params: Mapping[str, Any] | None = None) -> List[Dict[str, Any]]:
+    result: Result = await db.execute(text(sql), params or {})
+    return [dict(row) for row in result.mappings()]
+
+
+def stream_all(
+    db: Session, sql: str, params: Mapping[str, Any] | None = None, batch_size: int = STREAM_BATCH_SIZE
+) -> Iterator[RowMapping]:
+    for rows in _partitions(db, sql, params, batch_size):
+        yield from rows
+
+
+async def stream_all_async(
+    db: AsyncSession, sql: str, params: Mapping[str, Any] | None = None, batch_size: int = STREAM_BATCH_SIZE
+) -> AsyncIterator[RowMapping]:
+    async for rows in _partitions_async(db, sql, params, batch_size):
+        for row in rows:
+            yield row
+
+
+def fetch_json(db: Session, sql: str, params: Mapping[str, Any] | None, adapter: TypeAdapter) -> bytes:
+    rows = db.execute(text(sql), params or {}).mappings().all()
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+async def fetch_json_async(db: AsyncSession, sql: str, params: Mapping[str, Any] | None, adapter: TypeAdapter) -> bytes:
+    rows = (await db.execute(text(sql), params or {})).mappings().all()
+    return adapter.dump_json(adapter.validate_python(rows))
+
+
+def stream_json(
+    db: Session,
+    sql: str,
+    params: Mapping[str, Any] | None,
+    adapter: TypeAdapter,
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> bytes:
+    return _join_json_arrays(adapter.dump_json(adapter.validate_python(rows)) for rows in _partitions(db, sql, params, batch_size))
+
+
+async def stream_json_async(
+    db: AsyncSession,
+    sql: str,
+    params: Mapping[str, Any] | None,
+    adapter: TypeAdapter,
+    batch_size: int = STREAM_BATCH_SIZE,
+) -> bytes:
+    parts = []
+    async for rows in _partitions_async(db, sql, params, batch_size):
+        parts.append(adapter.dump_json(adapter.validate_python(rows)))
+    return _join_json_arrays(parts)
+
+
+def _partitions(
+    db: Session, sql: str, params: Mapping[str, Any] | None, batch_size: int
+) -> Iterator[Sequence[RowMapping]]:
+    stmt = text(sql).execution_options(stream_results=True, yield_per=batch_size)
+    result = db.execute(stmt, params or {})
+    try:
+        # Для text() yield_per не задает размер порции partitions(), поэтому он передается явно
+        yield from result.mappings().partitions(batch_size)
+    finally:
+        result.close()
+
+
+async def _partitions_async(
+    db: AsyncSession, sql: str, params: Mapping[str, Any] | None, batch_size: int
+) -> AsyncIterator[Sequence[RowMapping]]:
+    result = await db.stream(text(sql).execution_options(yield_per=batch_size), params or {})
+    try:
+        async for rows in result.mappings().partitions(batch_size):
+            yield rows
+    finally:
+        await result.close()
+
+
+def _join_json_arrays(parts) -> bytes:
+    # Каждая порция сериализована как JSON-массив: объединяем содержимое без скобок
+    return b"[" + b",".join(part[1:-1] for part in parts if len(part) > 2) + b"]"
@@ -80,9 +80,43 @@ CREATE TABLE IF NOT EXISTS screentime.employee_workstations (
     PRIMARY KEY (employee_id, workstation_id)
 );
 
--- Транзакционная таблица экранных сессий
+-- Сессии и использование приложений до секционирования переименовываются; строки переносятся
+-- в секционированные таблицы после создания функций секционирования (см. ниже, как audit_log).
+-- Индексы старых таблиц удаляются: их имена заняли бы индексы новых таблиц (CREATE INDEX IF NOT EXISTS).
+DO $$
+DECLARE
+    v_index TEXT;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('screentime.session_application_usage')) = 'r' THEN
+        ALTER TABLE screentime.session_application_usage RENAME TO session_application_usage_unpartitioned;
+        ALTER TABLE screentime.session_application_usage_unpartitioned
+            RENAME CONSTRAINT session_application_usage_pkey TO session_application_usage_unpartitioned_pkey;
+    END IF;
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('screentime.screen_sessions')) = 'r' THEN
+        ALTER TABLE screentime.screen_sessions RENAME TO screen_sessions_unpartitioned;
+        ALTER TABLE screentime.screen_sessions_unpartitioned RENAME CONSTRAINT screen_sessions_pkey TO screen_sessions_unpartitioned_pkey;
+        ALTER SEQUENCE screentime.screen_sessions_id_seq RENAME TO screen_sessions_unpartitioned_id_seq;
+        -- Представление прежней схемы читало сессии напрямую; ниже оно создается заново
+        DROP VIEW IF EXISTS screentime.v_employee_last_activity;
+    END IF;
+    FOR v_index IN
+        SELECT format('screentime.%I', c.relname)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid IN (to_regclass('screentime.screen_sessions_unpartitioned'),
+                             to_regclass('screentime.session_application_usage_unpartitioned'))
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+    LOOP
+        EXECUTE 'DROP INDEX ' || v_index;
+    END LOOP;
+END;
+$$;
+
+-- Транзакционная таблица экранных сессий, секционирована по месяцам started_at.
+-- Ключ секционирования обязан входить в первичный ключ, поэтому PK — (id, started_at);
+-- id по-прежнему выдается одной последовательностью и уникален.
 CREATE TABLE IF NOT EXISTS screentime.screen_sessions (
-    id              BIGSERIAL PRIMARY KEY,
+    id              BIGSERIAL,
     employee_id     INTEGER NOT NULL REFERENCES screentime.employees(id)
                         ON UPDATE CASCADE ON DELETE CASCADE,
     workstation_id  INTEGER NOT NULL REFERENCES screentime.workstations(id)
@@ -91,20 +125,25 @@ CREATE TABLE IF NOT EXISTS screentime.screen_sessions (
     ended_at        TIMESTAMP NOT NULL,
     active_seconds  INTEGER NOT NULL CHECK (active_seconds >= 0),
     created_at      TIMESTAMP NOT NULL DEFAULT NOW(),
-    CONSTRAINT chk_session_time CHECK (ended_at > started_at)
-);
+    CONSTRAINT chk_session_time CHECK (ended_at > started_at),
+    PRIMARY KEY (id, started_at)
+) PARTITION BY RANGE (started_at);
 
--- Использование приложений в рамках сессии (N:M через детальную таблицу)
+-- Использование приложений в рамках сессии (N:M через детальную таблицу).
+-- Секционирована так же, как screen_sessions (по времени начала сессии), чтобы
+-- старые месяцы обеих таблиц удалялись вместе через DROP секций.
 CREATE TABLE IF NOT EXISTS screentime.session_application_usage (
-    session_id      BIGINT NOT NULL REFERENCES screentime.screen_sessions(id)
-                        ON UPDATE CASCADE ON DELETE CASCADE,
-    application_id  INTEGER NOT NULL REFERENCES screentime.applications(id)
-                        ON UPDATE CASCADE ON DELETE RESTRICT,
-    active_seconds  INTEGER NOT NULL CHECK (active_seconds >= 0),
-    created_at      TIMESTAMP NOT NULL DEFAULT NOW(),
-    note            TEXT,
-    PRIMARY KEY (session_id, application_id)
-);
+    session_id          BIGINT NOT NULL,
+    session_started_at  TIMESTAMP NOT NULL,
+    application_id      INTEGER NOT NULL REFERENCES screentime.applications(id)
+                            ON UPDATE CASCADE ON DELETE RESTRICT,
+    active_seconds      INTEGER NOT NULL CHECK (active_seconds >= 0),
+    created_at          TIMESTAMP NOT NULL DEFAULT NOW(),
+    note                TEXT,
+    PRIMARY KEY (session_id, session_started_at, application_id),
+    FOREIGN KEY (session_id, session_started_at) REFERENCES screentime.screen_sessions(id, started_at)
+        ON UPDATE CASCADE ON DELETE CASCADE
+) PARTITION BY RANGE (session_started_at);
 
 -- Агрегированные суточные статистики по сотруднику
 CREATE TABLE IF NOT EXISTS screentime.daily_employee_stats (
@@ -117,16 +156,101 @@ CREATE TABLE IF NOT EXISTS screentime.daily_employee_stats (
     PRIMARY KEY (employee_id, stat_date)
 );
 
--- Журнал аудита изменений
+-- Суточные агрегаты по отделам (поддерживаются триггерами на daily_employee_stats и employees)
+CREATE TABLE IF NOT EXISTS screentime.daily_department_stats (
+    department_id       INTEGER NOT NULL REFERENCES screentime.departments(id)
+                            ON UPDATE CASCADE ON DELETE CASCADE,
+    stat_date           DATE    NOT NULL,
+    total_seconds       BIGINT  NOT NULL DEFAULT 0 CHECK (total_seconds >= 0),
+    sessions_count      INTEGER NOT NULL DEFAULT 0 CHECK (sessions_count >= 0),
+    employee_days       INTEGER NOT NULL DEFAULT 0 CHECK (employee_days >= 0),
+    PRIMARY KEY (department_id, stat_date)
+);
+
+-- Последняя сессия каждого сотрудника (поддерживается триггерами на screen_sessions)
+CREATE TABLE IF NOT EXISTS screentime.employee_last_activity (
+    employee_id     INTEGER PRIMARY KEY REFERENCES screentime.employees(id)
+                        ON UPDATE CASCADE ON DELETE CASCADE,
+    session_id      BIGINT NOT NULL,
+    workstation_id  INTEGER NOT NULL,
+    started_at      TIMESTAMP NOT NULL,
+    ended_at        TIMESTAMP NOT NULL,
+    active_seconds  INTEGER NOT NULL
+);
+
+-- Суточное использование приложений по сотруднику (поддерживается триггерами на
+-- session_application_usage и screen_sessions); sessions_count — число сессий с этим приложением
+CREATE TABLE IF NOT EXISTS screentime.daily_employee_app_stats (
+    employee_id     INTEGER NOT NULL REFERENCES screentime.employees(id)
+                        ON UPDATE CASCADE ON DELETE CASCADE,
+    stat_date       DATE    NOT NULL,
+    application_id  INTEGER NOT NULL REFERENCES screentime.applications(id)
+                        ON UPDATE CASCADE ON DELETE CASCADE,
+    total_seconds   BIGINT  NOT NULL DEFAULT 0 CHECK (total_seconds >= 0),
+    sessions_count  INTEGER NOT NULL DEFAULT 0 CHECK (sessions_count >= 0),
+    PRIMARY KEY (employee_id, stat_date, application_id)
+);
+
+-- То же по отделам (поддерживается триггерами на daily_employee_app_stats и employees)
+CREATE TABLE IF NOT EXISTS screentime.daily_department_app_stats (
+    department_id   INTEGER NOT NULL REFERENCES screentime.departments(id)
+                        ON UPDATE CASCADE ON DELETE CASCADE,
+    stat_date       DATE    NOT NULL,
+    application_id  INTEGER NOT NULL REFERENCES screentime.applications(id)
+                        ON UPDATE CASCADE ON DELETE CASCADE,
+    total_seconds   BIGINT  NOT NULL DEFAULT 0 CHECK (total_seconds >= 0),
+    sessions_count  INTEGER NOT NULL DEFAULT 0 CHECK (sessions_count >= 0),
+    PRIMARY KEY (department_id, stat_date, application_id)
+);
+
+-- Журнал аудита до секционирования переименовывается; строки переносятся в секционированную
+-- таблицу после создания функций секционирования (см. ниже), затем старая таблица удаляется.
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('screentime.audit_log')) = 'r' THEN
+        ALTER TABLE screentime.audit_log RENAME TO audit_log_unpartitioned;
+        ALTER TABLE screentime.audit_log_unpartitioned RENAME CONSTRAINT audit_log_pkey TO audit_log_unpartitioned_pkey;
+        ALTER TABLE screentime.audit_log_unpartitioned
+            RENAME CONSTRAINT audit_log_operation_check TO audit_log_unpartitioned_operation_check;
+        ALTER SEQUENCE screentime.audit_log_id_seq RENAME TO audit_log_unpartitioned_id_seq;
+        DROP INDEX IF EXISTS screentime.idx_audit_log_table_changed_at;
+    END IF;
+    -- Журнал схемы до записей уровня оператора: row_count переносится вместе с остальными колонками
+    IF to_regclass('screentime.audit_log_unpartitioned') IS NOT NULL THEN
+        ALTER TABLE screentime.audit_log_unpartitioned ADD COLUMN IF NOT EXISTS row_count INTEGER;
+    END IF;
+END;
+$$;
+
+-- Журнал аудита изменений, секционирован по месяцам changed_at: срок хранения — DROP секций
+-- (fn_maintain_audit_log_partitions). PK — (id, changed_at), как у screen_sessions.
 CREATE TABLE IF NOT EXISTS screentime.audit_log (
-    id              BIGSERIAL PRIMARY KEY,
+    id              BIGSERIAL,
     table_name      TEXT NOT NULL,
     operation       VARCHAR(10) NOT NULL CHECK (operation IN ('INSERT','UPDATE','DELETE')),
     record_id       TEXT NOT NULL,
     changed_at      TIMESTAMP NOT NULL DEFAULT NOW(),
     changed_by      TEXT,
     old_values      JSONB,
-    new_values      JSONB
+    new_values      JSONB,
+    -- Для записей уровня оператора (screentime.audit_sessions = statement): число затронутых строк
+    row_count       INTEGER,
+    PRIMARY KEY (id, changed_at)
+) PARTITION BY RANGE (changed_at);
+
+-- Очередь событий аудита (screentime.audit_async = on): триггер только дописывает строку в
+-- нежурналируемую таблицу без индексов, в audit_log события пачками переносит
+-- fn_drain_audit_queue. UNLOGGED: при аварийном перезапуске сервера не перенесенные события теряются.
+CREATE UNLOGGED TABLE IF NOT EXISTS screentime.audit_queue (
+    id              BIGINT GENERATED ALWAYS AS IDENTITY,
+    table_name      TEXT NOT NULL,
+    operation       VARCHAR(10) NOT NULL,
+    record_id       TEXT NOT NULL,
+    changed_at      TIMESTAMP NOT NULL DEFAULT NOW(),
+    changed_by      TEXT,
+    old_values      JSONB,
+    new_values      JSONB,
+    row_count       INTEGER
 );
 
 -- Лог batch-импорта
@@ -144,42 +268,373 @@ CREATE TABLE IF NOT EXISTS screentime.batch_import_logs (
     error_message   TEXT
 );
 
+-- Секционирование по месяцам
+
+-- Создает недостающие месячные секции <parent>_YYYY_MM для месяцев из [p_from, p_to].
+-- Если в DEFAULT-секции уже есть строки за месяц, секция не создается (выдается WARNING):
+-- такие строки нужно перенести вручную.
+CREATE OR REPLACE FUNCTION screentime.fn_create_monthly_partitions(p_parent TEXT, p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_month   DATE := date_trunc('month', p_from)::DATE;
+    v_next    DATE;
+    v_name    TEXT;
+    v_key     TEXT;
+    v_busy    BOOLEAN;
+    v_created INTEGER := 0;
+BEGIN
+    SELECT substring(pg_get_partkeydef(format('screentime.%I', p_parent)::regclass) FROM '\((\w+)\)')
+    INTO v_key;
+
+    WHILE v_month <= p_to LOOP
+        v_next := (v_month + INTERVAL '1 month')::DATE;
+        v_name := p_parent || '_' || to_char(v_month, 'YYYY_MM');
+        -- Параллельные вставки за новый месяц (API, импорт) иначе обе не находят секцию, и вторая
+        -- падает на CREATE TABLE с duplicate_table; блокировка держится до конца транзакции
+        PERFORM pg_advisory_xact_lock(hashtext('screentime.' || v_name));
+        IF to_regclass(format('screentime.%I', v_name)) IS NULL THEN
+            v_busy := FALSE;
+            IF to_regclass(format('screentime.%I', p_parent || '_default')) IS NOT NULL THEN
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM screentime.%I WHERE %I >= %L AND %I < %L)',
+                               p_parent || '_default', v_key, v_month, v_key, v_next)
+                INTO v_busy;
+            END IF;
+            IF v_busy THEN
+                RAISE WARNING 'partition % not created: rows for this month are in %_default', v_name, p_parent;
+            ELSE
+                EXECUTE format('CREATE TABLE screentime.%I PARTITION OF screentime.%I FOR VALUES FROM (%L) TO (%L)',
+                               v_name, p_parent, v_month, v_next);
+                v_created := v_created + 1;
+            END IF;
+        END IF;
+        v_month := v_next;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Отсоединяет (p_drop = FALSE, секция остается отдельной архивной таблицей) или удаляет
+-- месячные секции <parent>_YYYY_MM, целиком лежащие раньше p_before.
+CREATE OR REPLACE FUNCTION screentime.fn_drop_monthly_partitions(p_parent TEXT, p_before DATE, p_drop BOOLEAN DEFAULT TRUE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_name TEXT;
+BEGIN
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = format('screentime.%I', p_parent)::regclass
+          AND c.relname ~ ('^' || p_parent || '_\d{4}_\d{2}$')
+          AND (to_date(right(c.relname, 7), 'YYYY_MM') + INTERVAL '1 month') <= p_before
+        ORDER BY c.relname
+    LOOP
+        -- DETACH перед DROP: секцию таблицы, на которую ссылается внешний ключ, нельзя удалить напрямую
+        EXECUTE format('ALTER TABLE screentime.%I DETACH PARTITION screentime.%I', p_parent, v_name);
+        IF p_drop THEN
+            EXECUTE format('DROP TABLE screentime.%I', v_name);
+        END IF;
+        RETURN NEXT v_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Секции сессий и использования приложений создаются парами
+CREATE OR REPLACE FUNCTION screentime.fn_ensure_screen_sessions_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+BEGIN
+    RETURN screentime.fn_create_monthly_partitions('screen_sessions', p_from, p_to)
+         + screentime.fn_create_monthly_partitions('session_application_usage', p_from, p_to);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Удаляет или отсоединяет месяцы сессий и использования приложений раньше p_before парой: сначала
+-- дочерняя таблица (на секции сессий ссылается внешний ключ). Отсоединенная секция использования
+-- сохраняет внешний ключ на screen_sessions уже как собственное ограничение; после DETACH месяца
+-- сессий ее строки ему не удовлетворяют (восстановление из дампа на этом ограничении падает),
+-- поэтому в архиве этот внешний ключ удаляется.
+CREATE OR REPLACE FUNCTION screentime.fn_drop_screen_sessions_partitions(p_before DATE, p_drop BOOLEAN DEFAULT TRUE)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_name TEXT;
+    v_fk   TEXT;
+BEGIN
+    FOR v_name IN SELECT screentime.fn_drop_monthly_partitions('session_application_usage', p_before, p_drop) LOOP
+        IF NOT p_drop THEN
+            FOR v_fk IN
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = format('screentime.%I', v_name)::regclass
+                  AND contype = 'f'
+                  AND confrelid = 'screentime.screen_sessions'::regclass
+            LOOP
+                EXECUTE format('ALTER TABLE screentime.%I DROP CONSTRAINT %I', v_name, v_fk);
+            END LOOP;
+        END IF;
+        RETURN NEXT v_name;
+    END LOOP;
+    RETURN QUERY SELECT screentime.fn_drop_monthly_partitions('screen_sessions', p_before, p_drop);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Обслуживание: секции на p_months_ahead месяцев вперед и (если задано) удаление/архивирование
+-- месяцев старше p_keep_months. Агрегаты daily_employee_stats при удалении секций сохраняются.
+CREATE OR REPLACE FUNCTION screentime.fn_maintain_screen_sessions_partitions(
+    p_months_ahead INT DEFAULT 3,
+    p_keep_months  INT DEFAULT NULL,
+    p_drop         BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (action TEXT, partition_name TEXT) AS $$
+DECLARE
+    v_before DATE;
+BEGIN
+    PERFORM screentime.fn_ensure_screen_sessions_partitions(
+        CURRENT_DATE, (CURRENT_DATE + make_interval(months => p_months_ahead))::DATE);
+
+    IF p_keep_months IS NOT NULL THEN
+        v_before := (date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months))::DATE;
+        RETURN QUERY SELECT CASE WHEN p_drop THEN 'dropped' ELSE 'detached' END, t
+                     FROM screentime.fn_drop_screen_sessions_partitions(v_before, p_drop) t;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Журнал аудита: секции на p_months_ahead месяцев вперед и (если задано) удаление/архивирование
+-- месяцев старше p_keep_months
+CREATE OR REPLACE FUNCTION screentime.fn_maintain_audit_log_partitions(
+    p_months_ahead INT DEFAULT 3,
+    p_keep_months  INT DEFAULT NULL,
+    p_drop         BOOLEAN DEFAULT TRUE
+)
+RETURNS TABLE (action TEXT, partition_name TEXT) AS $$
+BEGIN
+    PERFORM screentime.fn_create_monthly_partitions(
+        'audit_log', CURRENT_DATE, (CURRENT_DATE + make_interval(months => p_months_ahead))::DATE);
+
+    IF p_keep_months IS NOT NULL THEN
+        RETURN QUERY SELECT CASE WHEN p_drop THEN 'dropped' ELSE 'detached' END, t
+                     FROM screentime.fn_drop_monthly_partitions(
+                         'audit_log',
+                         (date_trunc('month', CURRENT_DATE) - make_interval(months => p_keep_months))::DATE,
+                         p_drop) t;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE IF NOT EXISTS screentime.screen_sessions_default
+    PARTITION OF screentime.screen_sessions DEFAULT;
+CREATE TABLE IF NOT EXISTS screentime.session_application_usage_default
+    PARTITION OF screentime.session_application_usage DEFAULT;
+CREATE TABLE IF NOT EXISTS screentime.audit_log_default
+    PARTITION OF screentime.audit_log DEFAULT;
+
+DO $$
+BEGIN
+    PERFORM screentime.fn_ensure_screen_sessions_partitions(
+        (CURRENT_DATE - INTERVAL '12 months')::DATE,
+        (CURRENT_DATE + INTERVAL '3 months')::DATE
+    );
+END;
+$$;
+
+DO $$
+DECLARE
+    v_from DATE;
+    v_to   DATE;
+BEGIN
+    PERFORM screentime.fn_create_monthly_partitions(
+        'audit_log', CURRENT_DATE, (CURRENT_DATE + INTERVAL '3 months')::DATE);
+
+    -- Перенос журнала аудита из несекционированной таблицы (id сохраняются)
+    IF to_regclass('screentime.audit_log_unpartitioned') IS NOT NULL THEN
+        SELECT MIN(changed_at)::DATE, MAX(changed_at)::DATE INTO v_from, v_to
+        FROM screentime.audit_log_unpartitioned;
+        IF v_from IS NOT NULL THEN
+            PERFORM screentime.fn_create_monthly_partitions('audit_log', v_from, v_to);
+        END IF;
+        INSERT INTO screentime.audit_log(id, table_name, operation, record_id, changed_at, changed_by, old_values, new_values, row_count)
+        SELECT id, table_name, operation, record_id, changed_at, changed_by, old_values, new_values, row_count
+        FROM screentime.audit_log_unpartitioned
+        ORDER BY id;
+        PERFORM setval(pg_get_serial_sequence('screentime.audit_log', 'id'),
+                       COALESCE((SELECT MAX(id) FROM screentime.audit_log), 0) + 1, false);
+        DROP TABLE screentime.audit_log_unpartitioned;
+    END IF;
+
+    -- Перенос сессий и использования приложений из несекционированных таблиц (id сохраняются,
+    -- session_started_at берется из сессии). Триггеры на новых таблицах создаются ниже, поэтому
+    -- перенос не пересчитывает уже посчитанные агрегаты и не пишет аудит.
+    IF to_regclass('screentime.screen_sessions_unpartitioned') IS NOT NULL THEN
+        SELECT MIN(started_at)::DATE, MAX(started_at)::DATE INTO v_from, v_to
+        FROM screentime.screen_sessions_unpartitioned;
+        IF v_from IS NOT NULL THEN
+            PERFORM screentime.fn_ensure_screen_sessions_partitions(v_from, v_to);
+        END IF;
+        INSERT INTO screentime.screen_sessions(id, employee_id, workstation_id, started_at, ended_at, active_seconds, created_at)
+        SELECT id, employee_id, workstation_id, started_at, ended_at, active_seconds, created_at
+        FROM screentime.screen_sessions_unpartitioned
+        ORDER BY id;
+        PERFORM setval(pg_get_serial_sequence('screentime.screen_sessions', 'id'),
+                       COALESCE((SELECT MAX(id) FROM screentime.screen_sessions), 0) + 1, false);
+        IF to_regclass('screentime.session_application_usage_unpartitioned') IS NOT NULL THEN
+            INSERT INTO screentime.session_application_usage(session_id, session_started_at, application_id, active_seconds, created_at, note)
+            SELECT u.session_id, s.started_at, u.application_id, u.active_seconds, u.created_at, u.note
+            FROM screentime.session_application_usage_unpartitioned u
+            JOIN screentime.screen_sessions_unpartitioned s ON s.id = u.session_id;
+            DROP TABLE screentime.session_application_usage_unpartitioned;
+        END IF;
+        DROP TABLE screentime.screen_sessions_unpartitioned;
+    END IF;
+END;
+$$;
+
 -- Индексы (с IF NOT EXISTS)
 
 CREATE INDEX IF NOT EXISTS idx_employees_department ON screentime.employees(department_id);
-CREATE INDEX IF NOT EXISTS idx_screen_sessions_employee_date ON screentime.screen_sessions(employee_id, started_at);
-CREATE INDEX IF NOT EXISTS idx_screen_sessions_workstation ON screentime.screen_sessions(workstation_id);
+-- Фильтр по сотруднику (и отделу через сотрудников) с сортировкой по времени. INCLUDE покрывает
+-- колонки ScreenSessionRead, поэтому список и страницы сессий без expand (выборка только этих колонок)
+-- читаются index-only сканированием; с expand выбирается вся строка (в том числе created_at) из таблицы.
+-- Прежний индекс (employee_id, started_at) с тем же назначением заменяется: CREATE INDEX IF NOT EXISTS
+-- под старым именем оставил бы в существующих базах прежнее определение.
+DROP INDEX IF EXISTS screentime.idx_screen_sessions_employee_date;
+CREATE INDEX IF NOT EXISTS idx_screen_sessions_employee_started ON screentime.screen_sessions(employee_id, started_at DESC, id DESC)
+    INCLUDE (workstation_id, ended_at, active_seconds);
+CREATE INDEX IF NOT EXISTS idx_screen_sessions_workstation ON screentime.screen_sessions(workstation_id, started_at DESC, id DESC);
+-- Keyset-пагинация списка сессий: ORDER BY started_at DESC, id DESC и условие (started_at, id) < (...)
+CREATE INDEX IF NOT EXISTS idx_screen_sessions_started_id ON screentime.screen_sessions(started_at DESC, id DESC);
+-- Компактный индекс для выборок за длинные периоды (строки вставляются примерно по возрастанию started_at)
+CREATE INDEX IF NOT EXISTS idx_screen_sessions_started_brin ON screentime.screen_sessions USING BRIN (started_at);
+-- Поиск последней сессии сотрудника (пересчет employee_last_activity при удалении/изменении)
+CREATE INDEX IF NOT EXISTS idx_screen_sessions_employee_ended ON screentime.screen_sessions(employee_id, ended_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_daily_stats_employee_date ON screentime.daily_employee_stats(employee_id, stat_date);
-CREATE INDEX IF NOT EXISTS idx_audit_log_table_changed_at ON screentime.audit_log(table_name, changed_at);
+CREATE INDEX IF NOT EXISTS idx_daily_department_stats_date ON screentime.daily_department_stats(stat_date);
+-- Отчеты по приложениям за период по всем отделам
+CREATE INDEX IF NOT EXISTS idx_daily_department_app_stats_date ON screentime.daily_department_app_stats(stat_date);
+-- Журнал аудита (GET /api/audit): keyset по (changed_at, id) от новых к старым — общий и по таблице;
+-- история записи — по record_id (и таблице); поиск по содержимому (@>) и ключам (?) — GIN
+CREATE INDEX IF NOT EXISTS idx_audit_log_changed_id ON screentime.audit_log(changed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_log_table_changed_at ON screentime.audit_log(table_name, changed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_log_record ON screentime.audit_log(record_id, table_name, changed_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_log_old_values ON screentime.audit_log USING GIN (old_values);
+CREATE INDEX IF NOT EXISTS idx_audit_log_new_values ON screentime.audit_log USING GIN (new_values);
 CREATE INDEX IF NOT EXISTS idx_applications_code ON screentime.applications(code);
 
 -- Функции и триггеры аудита
 
+-- Режим аудита задается параметрами сессии (приложение передает их при подключении, см. db.py):
+--   screentime.audit_values   = full | diff  — при UPDATE хранить строки целиком или только измененные колонки;
+--   screentime.audit_sessions = row | statement | off — screen_sessions: запись на строку, одна запись
+--                               на оператор (число строк и диапазон id) или без аудита;
+--   screentime.audit_async    = off | on — писать в audit_log сразу или через очередь audit_queue.
+-- Без параметров (psql, скрипты) — прежнее поведение: full, row, off.
+CREATE OR REPLACE FUNCTION screentime.fn_audit_setting(p_name TEXT, p_default TEXT)
+RETURNS TEXT AS $$
+    SELECT COALESCE(NULLIF(current_setting('screentime.' || p_name, true), ''), p_default);
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION screentime.fn_write_audit(
+    p_table TEXT, p_operation TEXT, p_record_id TEXT, p_old JSONB, p_new JSONB, p_row_count INT DEFAULT NULL
+)
+RETURNS VOID AS $$
+BEGIN
+    IF screentime.fn_audit_setting('audit_async', 'off') = 'on' THEN
+        INSERT INTO screentime.audit_queue(table_name, operation, record_id, old_values, new_values, row_count)
+        VALUES (p_table, p_operation, p_record_id, p_old, p_new, p_row_count);
+    ELSE
+        INSERT INTO screentime.audit_log(table_name, operation, record_id, old_values, new_values, row_count)
+        VALUES (p_table, p_operation, p_record_id, p_old, p_new, p_row_count);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Для секционированных таблиц триггер клонируется на каждую секцию и TG_TABLE_NAME
+-- содержит имя секции, поэтому имя родительской таблицы передается аргументом триггера.
 CREATE OR REPLACE FUNCTION screentime.trg_write_audit_log()
 RETURNS TRIGGER AS $$
 DECLARE
-    v_record_id TEXT;
+    v_table     TEXT := COALESCE(TG_ARGV[0], TG_TABLE_NAME);
+    v_old       JSONB;
+    v_new       JSONB;
 BEGIN
     IF TG_OP = 'INSERT' THEN
-        v_record_id := NEW.id::TEXT;
-        INSERT INTO screentime.audit_log(table_name, operation, record_id, old_values, new_values)
-        VALUES (TG_TABLE_NAME, TG_OP, v_record_id, NULL, to_jsonb(NEW));
+        PERFORM screentime.fn_write_audit(v_table, TG_OP, NEW.id::TEXT, NULL, to_jsonb(NEW));
         RETURN NEW;
     ELSIF TG_OP = 'UPDATE' THEN
-        v_record_id := NEW.id::TEXT;
-        INSERT INTO screentime.audit_log(table_name, operation, record_id, old_values, new_values)
-        VALUES (TG_TABLE_NAME, TG_OP, v_record_id, to_jsonb(OLD), to_jsonb(NEW));
+        v_old := to_jsonb(OLD);
+        v_new := to_jsonb(NEW);
+        IF screentime.fn_audit_setting('audit_values', 'full') = 'diff' THEN
+            -- Только измененные колонки; UPDATE без изменений не записывается
+            IF v_old = v_new THEN
+                RETURN NEW;
+            END IF;
+            SELECT jsonb_object_agg(o.key, o.value), jsonb_object_agg(o.key, n.value)
+            INTO v_old, v_new
+            FROM jsonb_each(v_old) AS o
+            JOIN jsonb_each(v_new) AS n USING (key)
+            WHERE o.value <> n.value;
+        END IF;
+        PERFORM screentime.fn_write_audit(v_table, TG_OP, NEW.id::TEXT, v_old, v_new);
         RETURN NEW;
     ELSIF TG_OP = 'DELETE' THEN
-        v_record_id := OLD.id::TEXT;
-        INSERT INTO screentime.audit_log(table_name, operation, record_id, old_values, new_values)
-        VALUES (TG_TABLE_NAME, TG_OP, v_record_id, to_jsonb(OLD), NULL);
+        PERFORM screentime.fn_write_audit(v_table, TG_OP, OLD.id::TEXT, to_jsonb(OLD), NULL);
         RETURN OLD;
     END IF;
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Аудит уровня оператора: одна запись на INSERT/UPDATE/DELETE с числом строк и диапазоном id
+-- (record_id = '*'); значения строк не сохраняются.
+CREATE OR REPLACE FUNCTION screentime.trg_write_audit_statement()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_table     TEXT := COALESCE(TG_ARGV[0], TG_TABLE_NAME);
+    v_count     INTEGER;
+    v_min_id    BIGINT;
+    v_max_id    BIGINT;
+    v_range     JSONB;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT COUNT(*), MIN(id), MAX(id) INTO v_count, v_min_id, v_max_id FROM old_rows;
+    ELSE
+        SELECT COUNT(*), MIN(id), MAX(id) INTO v_count, v_min_id, v_max_id FROM new_rows;
+    END IF;
+    IF v_count = 0 THEN
+        RETURN NULL;
+    END IF;
+    v_range := jsonb_build_object('min_id', v_min_id, 'max_id', v_max_id);
+    PERFORM screentime.fn_write_audit(
+        v_table, TG_OP, '*',
+        CASE WHEN TG_OP = 'DELETE' THEN v_range END,
+        CASE WHEN TG_OP <> 'DELETE' THEN v_range END,
+        v_count
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перенос событий из audit_queue в audit_log пачкой до p_batch строк в порядке записи;
+-- SKIP LOCKED позволяет запускать перенос из нескольких процессов. Возвращает число перенесенных строк.
+CREATE OR REPLACE FUNCTION screentime.fn_drain_audit_queue(p_batch INT DEFAULT 10000)
+RETURNS INTEGER AS $$
+DECLARE
+    v_moved INTEGER;
+BEGIN
+    WITH batch AS (
+        DELETE FROM screentime.audit_queue
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM screentime.audit_queue LIMIT p_batch FOR UPDATE SKIP LOCKED
+        ))
+        RETURNING *
+    )
+    INSERT INTO screentime.audit_log(table_name, operation, record_id, changed_at, changed_by, old_values, new_values, row_count)
+    SELECT table_name, operation, record_id, changed_at, changed_by, old_values, new_values, row_count
+    FROM batch
+    ORDER BY id;
+    GET DIAGNOSTICS v_moved = ROW_COUNT;
+    RETURN v_moved;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Триггеры аудита (DROP + CREATE — безопасно)
 DROP TRIGGER IF EXISTS trg_audit_employees ON screentime.employees;
 CREATE TRIGGER trg_audit_employees
@@ -191,10 +646,38 @@ CREATE TRIGGER trg_audit_workstations
 AFTER INSERT OR UPDATE OR DELETE ON screentime.workstations
 FOR EACH ROW EXECUTE FUNCTION screentime.trg_write_audit_log();
 
+-- Для screen_sessions режим выбирается условием WHEN: в неактивном режиме функция триггера
+-- не вызывается вовсе (строчные триггеры и переходные таблицы не заполняются)
 DROP TRIGGER IF EXISTS trg_audit_screen_sessions ON screentime.screen_sessions;
 CREATE TRIGGER trg_audit_screen_sessions
 AFTER INSERT OR UPDATE OR DELETE ON screentime.screen_sessions
-FOR EACH ROW EXECUTE FUNCTION screentime.trg_write_audit_log();
+FOR EACH ROW
+WHEN (screentime.fn_audit_setting('audit_sessions', 'row') = 'row')
+EXECUTE FUNCTION screentime.trg_write_audit_log('screen_sessions');
+
+DROP TRIGGER IF EXISTS trg_audit_screen_sessions_stmt_ins ON screentime.screen_sessions;
+CREATE TRIGGER trg_audit_screen_sessions_stmt_ins
+AFTER INSERT ON screentime.screen_sessions
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+WHEN (screentime.fn_audit_setting('audit_sessions', 'row') = 'statement')
+EXECUTE FUNCTION screentime.trg_write_audit_statement('screen_sessions');
+
+DROP TRIGGER IF EXISTS trg_audit_screen_sessions_stmt_upd ON screentime.screen_sessions;
+CREATE TRIGGER trg_audit_screen_sessions_stmt_upd
+AFTER UPDATE ON screentime.screen_sessions
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT
+WHEN (screentime.fn_audit_setting('audit_sessions', 'row') = 'statement')
+EXECUTE FUNCTION screentime.trg_write_audit_statement('screen_sessions');
+
+DROP TRIGGER IF EXISTS trg_audit_screen_sessions_stmt_del ON screentime.screen_sessions;
+CREATE TRIGGER trg_audit_screen_sessions_stmt_del
+AFTER DELETE ON screentime.screen_sessions
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT
+WHEN (screentime.fn_audit_setting('audit_sessions', 'row') = 'statement')
+EXECUTE FUNCTION screentime.trg_write_audit_statement('screen_sessions');
 
 DROP TRIGGER IF EXISTS trg_audit_applications ON screentime.applications;
 CREATE TRIGGER trg_audit_applications
@@ -210,6 +693,7 @@ DECLARE
     v_sessions_count  INTEGER;
     v_avg_seconds     NUMERIC(10,2);
 BEGIN
+    -- Диапазон вместо started_at::DATE, чтобы работал индекс (employee_id, started_at)
     SELECT
         COALESCE(SUM(active_seconds), 0),
         COUNT(*),
@@ -217,7 +701,8 @@ BEGIN
     INTO v_total_seconds, v_sessions_count, v_avg_seconds
     FROM screentime.screen_sessions
     WHERE employee_id = p_employee_id
-      AND started_at::DATE = p_date;
+      AND started_at >= p_date
+      AND started_at < p_date + 1;
 
     IF v_sessions_count = 0 THEN
         DELETE FROM screentime.daily_employee_stats
@@ -233,43 +718,800 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Полный пересчет статистики за период одним запросом (после загрузки с отключенными триггерами)
+CREATE OR REPLACE FUNCTION screentime.fn_rebuild_daily_employee_stats(p_date_from DATE, p_date_to DATE)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM screentime.daily_employee_stats
+    WHERE stat_date BETWEEN p_date_from AND p_date_to;
+
+    INSERT INTO screentime.daily_employee_stats(employee_id, stat_date, total_seconds, sessions_count, avg_session_seconds)
+    SELECT
+        employee_id,
+        started_at::DATE,
+        SUM(active_seconds),
+        COUNT(*),
+        AVG(active_seconds)::NUMERIC(10,2)
+    FROM screentime.screen_sessions
+    WHERE started_at >= p_date_from
+      AND started_at < p_date_to + 1
+    GROUP BY employee_id, started_at::DATE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Применение приращений (delta) к daily_employee_stats: по одной строке на пару (сотрудник, день).
+-- p_seconds / p_counts могут быть отрицательными (удаление или изменение сессий).
+CREATE OR REPLACE FUNCTION screentime.fn_apply_daily_stats_delta(
+    p_employee_ids INT[],
+    p_dates        DATE[],
+    p_seconds      BIGINT[],
+    p_counts       BIGINT[]
+)
+RETURNS VOID AS $$
+BEGIN
+    -- Неотрицательные приращения: вставка новой строки или прибавление к существующей
+    INSERT INTO screentime.daily_employee_stats AS des(employee_id, stat_date, total_seconds, sessions_count, avg_session_seconds)
+    SELECT
+        d.employee_id,
+        d.stat_date,
+        d.seconds,
+        d.cnt,
+        COALESCE(ROUND(d.seconds::NUMERIC / NULLIF(d.cnt, 0), 2), 0)
+    FROM unnest(p_employee_ids, p_dates, p_seconds, p_counts) AS d(employee_id, stat_date, seconds, cnt)
+    WHERE d.seconds >= 0 AND d.cnt >= 0
+    ON CONFLICT (employee_id, stat_date) DO UPDATE
+    SET total_seconds = des.total_seconds + EXCLUDED.total_seconds,
+        sessions_count = des.sessions_count + EXCLUDED.sessions_count,
+        avg_session_seconds = COALESCE(
+            ROUND((des.total_seconds + EXCLUDED.total_seconds)::NUMERIC
+                  / NULLIF(des.sessions_count + EXCLUDED.sessions_count, 0), 2),
+            0);
+
+    -- Отрицательные приращения применяются только к существующим строкам
+    -- (вставка строки с отрицательными значениями нарушила бы CHECK).
+    UPDATE screentime.daily_employee_stats des
+    SET total_seconds = des.total_seconds + d.seconds,
+        sessions_count = des.sessions_count + d.cnt,
+        avg_session_seconds = COALESCE(
+            ROUND((des.total_seconds + d.seconds)::NUMERIC / NULLIF(des.sessions_count + d.cnt, 0), 2),
+            0)
+    FROM unnest(p_employee_ids, p_dates, p_seconds, p_counts) AS d(employee_id, stat_date, seconds, cnt)
+    WHERE (d.seconds < 0 OR d.cnt < 0)
+      AND des.employee_id = d.employee_id
+      AND des.stat_date = d.stat_date;
+
+    DELETE FROM screentime.daily_employee_stats des
+    USING unnest(p_employee_ids, p_dates) AS d(employee_id, stat_date)
+    WHERE des.employee_id = d.employee_id
+      AND des.stat_date = d.stat_date
+      AND des.sessions_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггер уровня оператора: строки, измененные одним оператором, доступны через
+-- таблицы переходов new_rows / old_rows, и каждая пара (сотрудник, день) обрабатывается один раз.
 CREATE OR REPLACE FUNCTION screentime.trg_update_daily_stats()
 RETURNS TRIGGER AS $$
 DECLARE
-    v_emp_id INT;
-    v_date_old DATE;
-    v_date_new DATE;
+    v_employee_ids INT[];
+    v_dates        DATE[];
+    v_seconds      BIGINT[];
+    v_counts       BIGINT[];
 BEGIN
     IF TG_OP = 'INSERT' THEN
-        v_emp_id := NEW.employee_id;
-        v_date_new := NEW.started_at::DATE;
-        PERFORM screentime.fn_recalculate_daily_employee_stat(v_emp_id, v_date_new);
-        RETURN NEW;
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(seconds), array_agg(cnt)
+        INTO v_employee_ids, v_dates, v_seconds, v_counts
+        FROM (
+            SELECT employee_id, started_at::DATE AS stat_date, SUM(active_seconds) AS seconds, COUNT(*) AS cnt
+            FROM new_rows
+            GROUP BY employee_id, started_at::DATE
+        ) d;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(seconds), array_agg(cnt)
+        INTO v_employee_ids, v_dates, v_seconds, v_counts
+        FROM (
+            SELECT employee_id, stat_date, SUM(seconds)::BIGINT AS seconds, SUM(cnt)::BIGINT AS cnt
+            FROM (
+                SELECT employee_id, started_at::DATE AS stat_date, active_seconds::BIGINT AS seconds, 1 AS cnt
+                FROM new_rows
+                UNION ALL
+                SELECT employee_id, started_at::DATE, -active_seconds::BIGINT, -1
+                FROM old_rows
+            ) x
+            GROUP BY employee_id, stat_date
+            HAVING SUM(seconds) <> 0 OR SUM(cnt) <> 0
+        ) d;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(seconds), array_agg(cnt)
+        INTO v_employee_ids, v_dates, v_seconds, v_counts
+        FROM (
+            SELECT employee_id, started_at::DATE AS stat_date, -SUM(active_seconds) AS seconds, -COUNT(*) AS cnt
+            FROM old_rows
+            GROUP BY employee_id, started_at::DATE
+        ) d;
+    END IF;
+
+    IF v_employee_ids IS NOT NULL THEN
+        PERFORM screentime.fn_apply_daily_stats_delta(v_employee_ids, v_dates, v_seconds, v_counts);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Таблицы переходов нельзя объявить для триггера на несколько событий, поэтому три триггера
+DROP TRIGGER IF EXISTS trg_screen_sessions_daily_stats ON screentime.screen_sessions;
+DROP TRIGGER IF EXISTS trg_screen_sessions_daily_stats_ins ON screentime.screen_sessions;
+CREATE TRIGGER trg_screen_sessions_daily_stats_ins
+AFTER INSERT ON screentime.screen_sessions
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_daily_stats();
+
+DROP TRIGGER IF EXISTS trg_screen_sessions_daily_stats_upd ON screentime.screen_sessions;
+CREATE TRIGGER trg_screen_sessions_daily_stats_upd
+AFTER UPDATE ON screentime.screen_sessions
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_daily_stats();
+
+DROP TRIGGER IF EXISTS trg_screen_sessions_daily_stats_del ON screentime.screen_sessions;
+CREATE TRIGGER trg_screen_sessions_daily_stats_del
+AFTER DELETE ON screentime.screen_sessions
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_daily_stats();
+
+-- Функции и триггеры для агрегатов daily_department_stats
+
+-- Применение приращений к daily_department_stats; employee_days — число строк daily_employee_stats
+-- (пар сотрудник-день) в отделе за день, строка удаляется, когда оно становится нулевым.
+CREATE OR REPLACE FUNCTION screentime.fn_apply_department_stats_delta(
+    p_department_ids INT[],
+    p_dates          DATE[],
+    p_seconds        BIGINT[],
+    p_counts         BIGINT[],
+    p_employee_days  BIGINT[]
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO screentime.daily_department_stats AS dds(department_id, stat_date, total_seconds, sessions_count, employee_days)
+    SELECT d.department_id, d.stat_date, d.seconds, d.cnt, d.days
+    FROM unnest(p_department_ids, p_dates, p_seconds, p_counts, p_employee_days)
+         AS d(department_id, stat_date, seconds, cnt, days)
+    WHERE d.seconds >= 0 AND d.cnt >= 0 AND d.days >= 0
+    ON CONFLICT (department_id, stat_date) DO UPDATE
+    SET total_seconds = dds.total_seconds + EXCLUDED.total_seconds,
+        sessions_count = dds.sessions_count + EXCLUDED.sessions_count,
+        employee_days = dds.employee_days + EXCLUDED.employee_days;
+
+    UPDATE screentime.daily_department_stats dds
+    SET total_seconds = dds.total_seconds + d.seconds,
+        sessions_count = dds.sessions_count + d.cnt,
+        employee_days = dds.employee_days + d.days
+    FROM unnest(p_department_ids, p_dates, p_seconds, p_counts, p_employee_days)
+         AS d(department_id, stat_date, seconds, cnt, days)
+    WHERE (d.seconds < 0 OR d.cnt < 0 OR d.days < 0)
+      AND dds.department_id = d.department_id
+      AND dds.stat_date = d.stat_date;
+
+    DELETE FROM screentime.daily_department_stats dds
+    USING unnest(p_department_ids, p_dates) AS d(department_id, stat_date)
+    WHERE dds.department_id = d.department_id
+      AND dds.stat_date = d.stat_date
+      AND dds.employee_days = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Пересчет daily_department_stats из daily_employee_stats за период (текущие отделы сотрудников)
+CREATE OR REPLACE FUNCTION screentime.fn_rebuild_daily_department_stats(p_date_from DATE, p_date_to DATE)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM screentime.daily_department_stats
+    WHERE stat_date BETWEEN p_date_from AND p_date_to;
+
+    INSERT INTO screentime.daily_department_stats(department_id, stat_date, total_seconds, sessions_count, employee_days)
+    SELECT e.department_id, des.stat_date, SUM(des.total_seconds), SUM(des.sessions_count), COUNT(*)
+    FROM screentime.daily_employee_stats des
+    JOIN screentime.employees e ON e.id = des.employee_id
+    WHERE e.department_id IS NOT NULL
+      AND des.stat_date BETWEEN p_date_from AND p_date_to
+    GROUP BY e.department_id, des.stat_date;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Приращения от изменений daily_employee_stats: отдел берется из employees на момент оператора.
+CREATE OR REPLACE FUNCTION screentime.trg_update_department_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_employee_ids   INT[];
+    v_dates          DATE[];
+    v_seconds        BIGINT[];
+    v_counts         BIGINT[];
+    v_days           BIGINT[];
+    v_department_ids INT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(total_seconds), array_agg(sessions_count), array_agg(1)
+        INTO v_employee_ids, v_dates, v_seconds, v_counts, v_days
+        FROM new_rows;
     ELSIF TG_OP = 'UPDATE' THEN
-        v_emp_id := NEW.employee_id;
-        v_date_new := NEW.started_at::DATE;
-        v_date_old := OLD.started_at::DATE;
-        IF v_emp_id = OLD.employee_id AND v_date_new = v_date_old THEN
-            PERFORM screentime.fn_recalculate_daily_employee_stat(v_emp_id, v_date_new);
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(seconds), array_agg(cnt), array_agg(days)
+        INTO v_employee_ids, v_dates, v_seconds, v_counts, v_days
+        FROM (
+            SELECT employee_id, stat_date, total_seconds::BIGINT AS seconds, sessions_count::BIGINT AS cnt, 1 AS days
+            FROM new_rows
+            UNION ALL
+            SELECT employee_id, stat_date, -total_seconds::BIGINT, -sessions_count::BIGINT, -1
+            FROM old_rows
+        ) x;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(-total_seconds), array_agg(-sessions_count), array_agg(-1)
+        INTO v_employee_ids, v_dates, v_seconds, v_counts, v_days
+        FROM old_rows;
+    END IF;
+
+    IF v_employee_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT array_agg(department_id), array_agg(stat_date), array_agg(seconds), array_agg(cnt), array_agg(days)
+    INTO v_department_ids, v_dates, v_seconds, v_counts, v_days
+    FROM (
+        SELECT e.department_id, c.stat_date, SUM(c.seconds)::BIGINT AS seconds, SUM(c.cnt)::BIGINT AS cnt, SUM(c.days)::BIGINT AS days
+        FROM unnest(v_employee_ids, v_dates, v_seconds, v_counts, v_days) AS c(employee_id, stat_date, seconds, cnt, days)
+        JOIN screentime.employees e ON e.id = c.employee_id
+        WHERE e.department_id IS NOT NULL
+        GROUP BY e.department_id, c.stat_date
+        HAVING SUM(c.seconds) <> 0 OR SUM(c.cnt) <> 0 OR SUM(c.days) <> 0
+    ) d;
+
+    IF v_department_ids IS NOT NULL THEN
+        PERFORM screentime.fn_apply_department_stats_delta(v_department_ids, v_dates, v_seconds, v_counts, v_days);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Перевод сотрудника в другой отдел: его суточная статистика переносится целиком.
+-- При удалении сотрудника его статистика вычитается до каскадного удаления daily_employee_stats,
+-- потому что в AFTER-триггере отдел удаленного сотрудника уже не найти.
+CREATE OR REPLACE FUNCTION screentime.trg_move_employee_department_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_new_department_id INT;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        v_new_department_id := NEW.department_id;
+    END IF;
+
+    PERFORM screentime.fn_apply_department_stats_delta(
+        array_agg(m.department_id), array_agg(m.stat_date), array_agg(m.seconds), array_agg(m.cnt), array_agg(m.days))
+    FROM (
+        SELECT OLD.department_id AS department_id, stat_date, -total_seconds::BIGINT AS seconds, -sessions_count::BIGINT AS cnt, -1::BIGINT AS days
+        FROM screentime.daily_employee_stats
+        WHERE employee_id = OLD.id AND OLD.department_id IS NOT NULL
+        UNION ALL
+        SELECT v_new_department_id, stat_date, total_seconds::BIGINT, sessions_count::BIGINT, 1::BIGINT
+        FROM screentime.daily_employee_stats
+        WHERE employee_id = OLD.id AND v_new_department_id IS NOT NULL
+    ) m
+    HAVING COUNT(*) > 0;
+
+    IF TG_OP = 'DELETE' THEN
+        RETURN OLD;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_daily_employee_stats_department_ins ON screentime.daily_employee_stats;
+CREATE TRIGGER trg_daily_employee_stats_department_ins
+AFTER INSERT ON screentime.daily_employee_stats
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_department_stats();
+
+DROP TRIGGER IF EXISTS trg_daily_employee_stats_department_upd ON screentime.daily_employee_stats;
+CREATE TRIGGER trg_daily_employee_stats_department_upd
+AFTER UPDATE ON screentime.daily_employee_stats
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_department_stats();
+
+DROP TRIGGER IF EXISTS trg_daily_employee_stats_department_del ON screentime.daily_employee_stats;
+CREATE TRIGGER trg_daily_employee_stats_department_del
+AFTER DELETE ON screentime.daily_employee_stats
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_department_stats();
+
+DROP TRIGGER IF EXISTS trg_employees_department_stats_upd ON screentime.employees;
+CREATE TRIGGER trg_employees_department_stats_upd
+AFTER UPDATE OF department_id ON screentime.employees
+FOR EACH ROW
+WHEN (OLD.department_id IS DISTINCT FROM NEW.department_id)
+EXECUTE FUNCTION screentime.trg_move_employee_department_stats();
+
+DROP TRIGGER IF EXISTS trg_employees_department_stats_del ON screentime.employees;
+CREATE TRIGGER trg_employees_department_stats_del
+BEFORE DELETE ON screentime.employees
+FOR EACH ROW
+EXECUTE FUNCTION screentime.trg_move_employee_department_stats();
+
+-- Заполнение по уже существующей статистике (повторный запуск скрипта)
+INSERT INTO screentime.daily_department_stats(department_id, stat_date, total_seconds, sessions_count, employee_days)
+SELECT e.department_id, des.stat_date, SUM(des.total_seconds), SUM(des.sessions_count), COUNT(*)
+FROM screentime.daily_employee_stats des
+JOIN screentime.employees e ON e.id = des.employee_id
+WHERE e.department_id IS NOT NULL
+GROUP BY e.department_id, des.stat_date
+ON CONFLICT (department_id, stat_date) DO NOTHING;
+
+-- Использование приложений: daily_employee_app_stats и daily_department_app_stats
+
+-- Применение приращений к daily_employee_app_stats: по одной строке на тройку (сотрудник, день,
+-- приложение), как в fn_apply_daily_stats_delta; строка удаляется, когда sessions_count становится нулевым.
+CREATE OR REPLACE FUNCTION screentime.fn_apply_employee_app_stats_delta(
+    p_employee_ids    INT[],
+    p_dates           DATE[],
+    p_application_ids INT[],
+    p_seconds         BIGINT[],
+    p_counts          BIGINT[]
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO screentime.daily_employee_app_stats AS eas(employee_id, stat_date, application_id, total_seconds, sessions_count)
+    SELECT d.employee_id, d.stat_date, d.application_id, d.seconds, d.cnt
+    FROM unnest(p_employee_ids, p_dates, p_application_ids, p_seconds, p_counts)
+         AS d(employee_id, stat_date, application_id, seconds, cnt)
+    WHERE d.seconds >= 0 AND d.cnt >= 0
+    ON CONFLICT (employee_id, stat_date, application_id) DO UPDATE
+    SET total_seconds = eas.total_seconds + EXCLUDED.total_seconds,
+        sessions_count = eas.sessions_count + EXCLUDED.sessions_count;
+
+    UPDATE screentime.daily_employee_app_stats eas
+    SET total_seconds = eas.total_seconds + d.seconds,
+        sessions_count = eas.sessions_count + d.cnt
+    FROM unnest(p_employee_ids, p_dates, p_application_ids, p_seconds, p_counts)
+         AS d(employee_id, stat_date, application_id, seconds, cnt)
+    WHERE (d.seconds < 0 OR d.cnt < 0)
+      AND eas.employee_id = d.employee_id
+      AND eas.stat_date = d.stat_date
+      AND eas.application_id = d.application_id;
+
+    DELETE FROM screentime.daily_employee_app_stats eas
+    USING unnest(p_employee_ids, p_dates, p_application_ids) AS d(employee_id, stat_date, application_id)
+    WHERE eas.employee_id = d.employee_id
+      AND eas.stat_date = d.stat_date
+      AND eas.application_id = d.application_id
+      AND eas.sessions_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Сессии, удаленные или сменившие ключ (id, started_at) в текущей транзакции, со своим прежним
+-- сотрудником. Строки session_application_usage таких сессий удаляются или меняются каскадом, а
+-- триггеры каскадного оператора выполняются уже после триггеров screen_sessions, когда сессии
+-- под прежним ключом не видно, — сотрудника для них триггер берет отсюда. Временная таблица
+-- очищается при COMMIT и создается только в соединениях, которые меняют или удаляют сессии.
+CREATE OR REPLACE FUNCTION screentime.fn_ensure_moved_sessions_table()
+RETURNS VOID AS $$
+BEGIN
+    IF to_regclass('pg_temp.app_stats_moved_sessions') IS NULL THEN
+        CREATE TEMP TABLE app_stats_moved_sessions (
+            session_id          BIGINT NOT NULL,
+            session_started_at  TIMESTAMP NOT NULL,
+            employee_id         INTEGER NOT NULL
+        ) ON COMMIT DELETE ROWS;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Приращения по строкам использования (сотрудник, время начала сессии, приложение, секунды,
+-- число сессий): группировка по (сотрудник, день, приложение) и применение к daily_employee_app_stats
+CREATE OR REPLACE FUNCTION screentime.fn_apply_usage_delta(
+    p_employee_ids    INT[],
+    p_started_at      TIMESTAMP[],
+    p_application_ids INT[],
+    p_seconds         BIGINT[],
+    p_counts          BIGINT[]
+)
+RETURNS VOID AS $$
+DECLARE
+    v_employee_ids    INT[];
+    v_dates           DATE[];
+    v_application_ids INT[];
+    v_seconds         BIGINT[];
+    v_counts          BIGINT[];
+BEGIN
+    SELECT array_agg(employee_id), array_agg(stat_date), array_agg(application_id), array_agg(seconds), array_agg(cnt)
+    INTO v_employee_ids, v_dates, v_application_ids, v_seconds, v_counts
+    FROM (
+        SELECT c.employee_id, c.started_at::DATE AS stat_date, c.application_id,
+               SUM(c.seconds)::BIGINT AS seconds, SUM(c.cnt)::BIGINT AS cnt
+        FROM unnest(p_employee_ids, p_started_at, p_application_ids, p_seconds, p_counts)
+             AS c(employee_id, started_at, application_id, seconds, cnt)
+        WHERE c.employee_id IS NOT NULL
+        GROUP BY c.employee_id, c.started_at::DATE, c.application_id
+        HAVING SUM(c.seconds) <> 0 OR SUM(c.cnt) <> 0
+    ) d;
+
+    IF v_employee_ids IS NOT NULL THEN
+        PERFORM screentime.fn_apply_employee_app_stats_delta(v_employee_ids, v_dates, v_application_ids, v_seconds, v_counts);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Сотрудник строки использования — из ее сессии, а если сессия уже удалена или сменила ключ
+-- (каскад) — из app_stats_moved_sessions. Вставка (горячий путь загрузки) временную таблицу не трогает:
+-- новая строка всегда ссылается на существующую сессию.
+CREATE OR REPLACE FUNCTION screentime.trg_update_employee_app_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_employee_ids    INT[];
+    v_started_at      TIMESTAMP[];
+    v_application_ids INT[];
+    v_seconds         BIGINT[];
+    v_counts          BIGINT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(s.employee_id), array_agg(u.session_started_at), array_agg(u.application_id),
+               array_agg(u.active_seconds::BIGINT), array_agg(1::BIGINT)
+        INTO v_employee_ids, v_started_at, v_application_ids, v_seconds, v_counts
+        FROM new_rows u
+        JOIN screentime.screen_sessions s ON s.id = u.session_id AND s.started_at = u.session_started_at;
+    ELSE
+        PERFORM screentime.fn_ensure_moved_sessions_table();
+        IF TG_OP = 'UPDATE' THEN
+            SELECT array_agg(COALESCE(s.employee_id, m.employee_id)), array_agg(u.session_started_at),
+                   array_agg(u.application_id), array_agg(u.seconds), array_agg(u.cnt)
+            INTO v_employee_ids, v_started_at, v_application_ids, v_seconds, v_counts
+            FROM (
+                SELECT session_id, session_started_at, application_id, active_seconds::BIGINT AS seconds, 1::BIGINT AS cnt
+                FROM new_rows
+                UNION ALL
+                SELECT session_id, session_started_at, application_id, -active_seconds::BIGINT, -1::BIGINT
+                FROM old_rows
+            ) u
+            LEFT JOIN screentime.screen_sessions s ON s.id = u.session_id AND s.started_at = u.session_started_at
+            LEFT JOIN pg_temp.app_stats_moved_sessions m
+                   ON s.id IS NULL AND m.session_id = u.session_id AND m.session_started_at = u.session_started_at;
         ELSE
-            PERFORM screentime.fn_recalculate_daily_employee_stat(OLD.employee_id, v_date_old);
-            PERFORM screentime.fn_recalculate_daily_employee_stat(v_emp_id, v_date_new);
+            SELECT array_agg(COALESCE(s.employee_id, m.employee_id)), array_agg(u.session_started_at),
+                   array_agg(u.application_id), array_agg(-u.active_seconds::BIGINT), array_agg(-1::BIGINT)
+            INTO v_employee_ids, v_started_at, v_application_ids, v_seconds, v_counts
+            FROM old_rows u
+            LEFT JOIN screentime.screen_sessions s ON s.id = u.session_id AND s.started_at = u.session_started_at
+            LEFT JOIN pg_temp.app_stats_moved_sessions m
+                   ON s.id IS NULL AND m.session_id = u.session_id AND m.session_started_at = u.session_started_at;
         END IF;
-        RETURN NEW;
+
+        -- Использованные записи удаляются: ключ может снова появиться у другой сессии в той же транзакции
+        DELETE FROM pg_temp.app_stats_moved_sessions m
+        USING old_rows o
+        WHERE m.session_id = o.session_id AND m.session_started_at = o.session_started_at;
+    END IF;
+
+    IF v_employee_ids IS NOT NULL THEN
+        PERFORM screentime.fn_apply_usage_delta(v_employee_ids, v_started_at, v_application_ids, v_seconds, v_counts);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_session_application_usage_app_stats_ins ON screentime.session_application_usage;
+CREATE TRIGGER trg_session_application_usage_app_stats_ins
+AFTER INSERT ON screentime.session_application_usage
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_employee_app_stats();
+
+DROP TRIGGER IF EXISTS trg_session_application_usage_app_stats_upd ON screentime.session_application_usage;
+CREATE TRIGGER trg_session_application_usage_app_stats_upd
+AFTER UPDATE ON screentime.session_application_usage
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_employee_app_stats();
+
+DROP TRIGGER IF EXISTS trg_session_application_usage_app_stats_del ON screentime.session_application_usage;
+CREATE TRIGGER trg_session_application_usage_app_stats_del
+AFTER DELETE ON screentime.session_application_usage
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_employee_app_stats();
+
+-- Изменения сессий: удаленные и сменившие ключ сессии запоминаются в app_stats_moved_sessions
+-- для каскадных изменений их строк использования (см. выше), а статистика сессий, у которых при
+-- том же ключе сменился сотрудник, переносится здесь — строки использования при этом не меняются.
+CREATE OR REPLACE FUNCTION screentime.trg_update_session_app_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_employee_ids    INT[];
+    v_started_at      TIMESTAMP[];
+    v_application_ids INT[];
+    v_seconds         BIGINT[];
+    v_counts          BIGINT[];
+BEGIN
+    PERFORM screentime.fn_ensure_moved_sessions_table();
+
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO pg_temp.app_stats_moved_sessions(session_id, session_started_at, employee_id)
+        SELECT id, started_at, employee_id
+        FROM old_rows;
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO pg_temp.app_stats_moved_sessions(session_id, session_started_at, employee_id)
+    SELECT o.id, o.started_at, o.employee_id
+    FROM old_rows o
+    WHERE NOT EXISTS (SELECT 1 FROM new_rows n WHERE n.id = o.id AND n.started_at = o.started_at);
+
+    SELECT array_agg(m.employee_id), array_agg(m.started_at), array_agg(u.application_id),
+           array_agg(m.sign * u.active_seconds), array_agg(m.sign)
+    INTO v_employee_ids, v_started_at, v_application_ids, v_seconds, v_counts
+    FROM (
+        SELECT n.id, n.started_at, o.employee_id, -1::BIGINT AS sign
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id AND n.started_at = o.started_at AND n.employee_id <> o.employee_id
+        UNION ALL
+        SELECT n.id, n.started_at, n.employee_id, 1::BIGINT
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id AND n.started_at = o.started_at AND n.employee_id <> o.employee_id
+    ) m
+    JOIN screentime.session_application_usage u ON u.session_id = m.id AND u.session_started_at = m.started_at;
+
+    IF v_employee_ids IS NOT NULL THEN
+        PERFORM screentime.fn_apply_usage_delta(v_employee_ids, v_started_at, v_application_ids, v_seconds, v_counts);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_screen_sessions_app_stats_upd ON screentime.screen_sessions;
+CREATE TRIGGER trg_screen_sessions_app_stats_upd
+AFTER UPDATE ON screentime.screen_sessions
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_session_app_stats();
+
+DROP TRIGGER IF EXISTS trg_screen_sessions_app_stats_del ON screentime.screen_sessions;
+CREATE TRIGGER trg_screen_sessions_app_stats_del
+AFTER DELETE ON screentime.screen_sessions
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_session_app_stats();
+
+-- Применение приращений к daily_department_app_stats
+CREATE OR REPLACE FUNCTION screentime.fn_apply_department_app_stats_delta(
+    p_department_ids  INT[],
+    p_dates           DATE[],
+    p_application_ids INT[],
+    p_seconds         BIGINT[],
+    p_counts          BIGINT[]
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO screentime.daily_department_app_stats AS das(department_id, stat_date, application_id, total_seconds, sessions_count)
+    SELECT d.department_id, d.stat_date, d.application_id, d.seconds, d.cnt
+    FROM unnest(p_department_ids, p_dates, p_application_ids, p_seconds, p_counts)
+         AS d(department_id, stat_date, application_id, seconds, cnt)
+    WHERE d.seconds >= 0 AND d.cnt >= 0
+    ON CONFLICT (department_id, stat_date, application_id) DO UPDATE
+    SET total_seconds = das.total_seconds + EXCLUDED.total_seconds,
+        sessions_count = das.sessions_count + EXCLUDED.sessions_count;
+
+    UPDATE screentime.daily_department_app_stats das
+    SET total_seconds = das.total_seconds + d.seconds,
+        sessions_count = das.sessions_count + d.cnt
+    FROM unnest(p_department_ids, p_dates, p_application_ids, p_seconds, p_counts)
+         AS d(department_id, stat_date, application_id, seconds, cnt)
+    WHERE (d.seconds < 0 OR d.cnt < 0)
+      AND das.department_id = d.department_id
+      AND das.stat_date = d.stat_date
+      AND das.application_id = d.application_id;
+
+    DELETE FROM screentime.daily_department_app_stats das
+    USING unnest(p_department_ids, p_dates, p_application_ids) AS d(department_id, stat_date, application_id)
+    WHERE das.department_id = d.department_id
+      AND das.stat_date = d.stat_date
+      AND das.application_id = d.application_id
+      AND das.sessions_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Приращения от изменений daily_employee_app_stats: отдел берется из employees на момент оператора
+CREATE OR REPLACE FUNCTION screentime.trg_update_department_app_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_employee_ids    INT[];
+    v_dates           DATE[];
+    v_application_ids INT[];
+    v_seconds         BIGINT[];
+    v_counts          BIGINT[];
+    v_department_ids  INT[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(application_id), array_agg(total_seconds), array_agg(sessions_count::BIGINT)
+        INTO v_employee_ids, v_dates, v_application_ids, v_seconds, v_counts
+        FROM new_rows;
+    ELSIF TG_OP = 'UPDATE' THEN
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(application_id), array_agg(seconds), array_agg(cnt)
+        INTO v_employee_ids, v_dates, v_application_ids, v_seconds, v_counts
+        FROM (
+            SELECT employee_id, stat_date, application_id, total_seconds AS seconds, sessions_count::BIGINT AS cnt
+            FROM new_rows
+            UNION ALL
+            SELECT employee_id, stat_date, application_id, -total_seconds, -sessions_count::BIGINT
+            FROM old_rows
+        ) x;
     ELSIF TG_OP = 'DELETE' THEN
-        v_emp_id := OLD.employee_id;
-        v_date_old := OLD.started_at::DATE;
-        PERFORM screentime.fn_recalculate_daily_employee_stat(v_emp_id, v_date_old);
+        SELECT array_agg(employee_id), array_agg(stat_date), array_agg(application_id), array_agg(-total_seconds), array_agg(-sessions_count::BIGINT)
+        INTO v_employee_ids, v_dates, v_application_ids, v_seconds, v_counts
+        FROM old_rows;
+    END IF;
+
+    IF v_employee_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT array_agg(department_id), array_agg(stat_date), array_agg(application_id), array_agg(seconds), array_agg(cnt)
+    INTO v_department_ids, v_dates, v_application_ids, v_seconds, v_counts
+    FROM (
+        SELECT e.department_id, c.stat_date, c.application_id, SUM(c.seconds)::BIGINT AS seconds, SUM(c.cnt)::BIGINT AS cnt
+        FROM unnest(v_employee_ids, v_dates, v_application_ids, v_seconds, v_counts)
+             AS c(employee_id, stat_date, application_id, seconds, cnt)
+        JOIN screentime.employees e ON e.id = c.employee_id
+        WHERE e.department_id IS NOT NULL
+        GROUP BY e.department_id, c.stat_date, c.application_id
+        HAVING SUM(c.seconds) <> 0 OR SUM(c.cnt) <> 0
+    ) d;
+
+    IF v_department_ids IS NOT NULL THEN
+        PERFORM screentime.fn_apply_department_app_stats_delta(v_department_ids, v_dates, v_application_ids, v_seconds, v_counts);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_daily_employee_app_stats_department_ins ON screentime.daily_employee_app_stats;
+CREATE TRIGGER trg_daily_employee_app_stats_department_ins
+AFTER INSERT ON screentime.daily_employee_app_stats
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_department_app_stats();
+
+DROP TRIGGER IF EXISTS trg_daily_employee_app_stats_department_upd ON screentime.daily_employee_app_stats;
+CREATE TRIGGER trg_daily_employee_app_stats_department_upd
+AFTER UPDATE ON screentime.daily_employee_app_stats
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_department_app_stats();
+
+DROP TRIGGER IF EXISTS trg_daily_employee_app_stats_department_del ON screentime.daily_employee_app_stats;
+CREATE TRIGGER trg_daily_employee_app_stats_department_del
+AFTER DELETE ON screentime.daily_employee_app_stats
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_department_app_stats();
+
+-- Перевод сотрудника в другой отдел и удаление сотрудника — как trg_move_employee_department_stats
+CREATE OR REPLACE FUNCTION screentime.trg_move_employee_department_app_stats()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_new_department_id INT;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        v_new_department_id := NEW.department_id;
+    END IF;
+
+    PERFORM screentime.fn_apply_department_app_stats_delta(
+        array_agg(m.department_id), array_agg(m.stat_date), array_agg(m.application_id), array_agg(m.seconds), array_agg(m.cnt))
+    FROM (
+        SELECT OLD.department_id AS department_id, stat_date, application_id, -total_seconds AS seconds, -sessions_count::BIGINT AS cnt
+        FROM screentime.daily_employee_app_stats
+        WHERE employee_id = OLD.id AND OLD.department_id IS NOT NULL
+        UNION ALL
+        SELECT v_new_department_id, stat_date, application_id, total_seconds, sessions_count::BIGINT
+        FROM screentime.daily_employee_app_stats
+        WHERE employee_id = OLD.id AND v_new_department_id IS NOT NULL
+    ) m
+    HAVING COUNT(*) > 0;
+
+    IF TG_OP = 'DELETE' THEN
         RETURN OLD;
     END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_employees_department_app_stats_upd ON screentime.employees;
+CREATE TRIGGER trg_employees_department_app_stats_upd
+AFTER UPDATE OF department_id ON screentime.employees
+FOR EACH ROW
+WHEN (OLD.department_id IS DISTINCT FROM NEW.department_id)
+EXECUTE FUNCTION screentime.trg_move_employee_department_app_stats();
+
+DROP TRIGGER IF EXISTS trg_employees_department_app_stats_del ON screentime.employees;
+CREATE TRIGGER trg_employees_department_app_stats_del
+BEFORE DELETE ON screentime.employees
+FOR EACH ROW
+EXECUTE FUNCTION screentime.trg_move_employee_department_app_stats();
+
+-- Заполнение по уже загруженному использованию приложений (первый запуск после появления таблиц);
+-- daily_department_app_stats заполняют триггеры daily_employee_app_stats
+INSERT INTO screentime.daily_employee_app_stats(employee_id, stat_date, application_id, total_seconds, sessions_count)
+SELECT s.employee_id, s.started_at::DATE, u.application_id, SUM(u.active_seconds), COUNT(*)
+FROM screentime.session_application_usage u
+JOIN screentime.screen_sessions s ON s.id = u.session_id AND s.started_at = u.session_started_at
+WHERE NOT EXISTS (SELECT 1 FROM screentime.daily_employee_app_stats)
+GROUP BY s.employee_id, s.started_at::DATE, u.application_id;
+
+-- Последняя активность сотрудников (employee_last_activity)
+
+-- Пересчет последней сессии для перечисленных сотрудников: по одному индексному поиску на сотрудника
+CREATE OR REPLACE FUNCTION screentime.fn_refresh_last_activity(p_employee_ids INT[])
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM screentime.employee_last_activity
+    WHERE employee_id = ANY(p_employee_ids);
+
+    INSERT INTO screentime.employee_last_activity(employee_id, session_id, workstation_id, started_at, ended_at, active_seconds)
+    SELECT e.id, s.id, s.workstation_id, s.started_at, s.ended_at, s.active_seconds
+    FROM unnest(p_employee_ids) AS e(id)
+    CROSS JOIN LATERAL (
+        SELECT ss.id, ss.workstation_id, ss.started_at, ss.ended_at, ss.active_seconds
+        FROM screentime.screen_sessions ss
+        WHERE ss.employee_id = e.id
+        ORDER BY ss.ended_at DESC, ss.id DESC
+        LIMIT 1
+    ) s;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION screentime.trg_update_last_activity()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_employee_ids INT[];
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        -- Изменена или удалена текущая последняя сессия — откат к предыдущей сессии сотрудника
+        SELECT array_agg(DISTINCT o.employee_id)
+        INTO v_employee_ids
+        FROM old_rows o
+        JOIN screentime.employee_last_activity la
+          ON la.employee_id = o.employee_id AND la.session_id = o.id;
+
+        IF v_employee_ids IS NOT NULL THEN
+            PERFORM screentime.fn_refresh_last_activity(v_employee_ids);
+        END IF;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO screentime.employee_last_activity AS la(employee_id, session_id, workstation_id, started_at, ended_at, active_seconds)
+        SELECT DISTINCT ON (employee_id) employee_id, id, workstation_id, started_at, ended_at, active_seconds
+        FROM new_rows
+        ORDER BY employee_id, ended_at DESC, id DESC
+        ON CONFLICT (employee_id) DO UPDATE
+        SET session_id = EXCLUDED.session_id,
+            workstation_id = EXCLUDED.workstation_id,
+            started_at = EXCLUDED.started_at,
+            ended_at = EXCLUDED.ended_at,
+            active_seconds = EXCLUDED.active_seconds
+        WHERE (EXCLUDED.ended_at, EXCLUDED.session_id) > (la.ended_at, la.session_id);
+    END IF;
     RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
-DROP TRIGGER IF EXISTS trg_screen_sessions_daily_stats ON screentime.screen_sessions;
-CREATE TRIGGER trg_screen_sessions_daily_stats
-AFTER INSERT OR UPDATE OR DELETE ON screentime.screen_sessions
-FOR EACH ROW EXECUTE FUNCTION screentime.trg_update_daily_stats();
+DROP TRIGGER IF EXISTS trg_screen_sessions_last_activity_ins ON screentime.screen_sessions;
+CREATE TRIGGER trg_screen_sessions_last_activity_ins
+AFTER INSERT ON screentime.screen_sessions
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_last_activity();
+
+DROP TRIGGER IF EXISTS trg_screen_sessions_last_activity_upd ON screentime.screen_sessions;
+CREATE TRIGGER trg_screen_sessions_last_activity_upd
+AFTER UPDATE ON screentime.screen_sessions
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_last_activity();
+
+DROP TRIGGER IF EXISTS trg_screen_sessions_last_activity_del ON screentime.screen_sessions;
+CREATE TRIGGER trg_screen_sessions_last_activity_del
+AFTER DELETE ON screentime.screen_sessions
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION screentime.trg_update_last_activity();
+
+-- Заполнение для уже существующих сессий (повторный запуск скрипта)
+INSERT INTO screentime.employee_last_activity(employee_id, session_id, workstation_id, started_at, ended_at, active_seconds)
+SELECT DISTINCT ON (employee_id) employee_id, id, workstation_id, started_at, ended_at, active_seconds
+FROM screentime.screen_sessions
+ORDER BY employee_id, ended_at DESC, id DESC
+ON CONFLICT (employee_id) DO NOTHING;
 
 -- Скалярная и табличные функции для отчетов
 
@@ -282,12 +1524,16 @@ BEGIN
     INTO v_total_seconds
     FROM screentime.screen_sessions
     WHERE employee_id = p_employee_id
-      AND started_at::DATE = p_date;
+      AND started_at >= p_date
+      AND started_at < p_date + 1;
 
     RETURN v_total_seconds / 3600.0;
 END;
 $$ LANGUAGE plpgsql STABLE;
 
+-- RETURN QUERY требует точного совпадения типов с RETURNS TABLE: COUNT возвращает BIGINT,
+-- поэтому total_days и среднее приводятся к объявленным типам (иначе вызов падает с
+-- "structure of query does not match function result type").
 CREATE OR REPLACE FUNCTION screentime.fn_top_overworked_employees(
     p_date_from DATE,
     p_date_to   DATE,
@@ -302,8 +1548,8 @@ BEGIN
     RETURN QUERY
     SELECT
         des.employee_id,
-        (SUM(des.total_seconds) / 3600.0) / COUNT(DISTINCT des.stat_date) AS avg_hours_per_day,
-        COUNT(DISTINCT des.stat_date) AS total_days
+        ((SUM(des.total_seconds) / 3600.0) / COUNT(DISTINCT des.stat_date))::NUMERIC(10,2) AS avg_hours_per_day,
+        COUNT(DISTINCT des.stat_date)::INT AS total_days
     FROM screentime.daily_employee_stats des
     WHERE des.stat_date BETWEEN p_date_from AND p_date_to
     GROUP BY des.employee_id
@@ -324,17 +1570,148 @@ RETURNS TABLE (
 BEGIN
     RETURN QUERY
     SELECT
-        e.department_id,
-        SUM(des.total_seconds) AS total_seconds,
-        AVG(des.total_seconds)::NUMERIC(10,2) AS avg_seconds_per_employee
-    FROM screentime.daily_employee_stats des
-    JOIN screentime.employees e ON e.id = des.employee_id
-    WHERE des.stat_date BETWEEN p_date_from AND p_date_to
-    GROUP BY e.department_id
+        dds.department_id,
+        SUM(dds.total_seconds)::BIGINT AS total_seconds,
+        -- Среднее по парам (сотрудник, день), как AVG по daily_employee_stats
+        ROUND(SUM(dds.total_seconds)::NUMERIC / NULLIF(SUM(dds.employee_days), 0), 2)::NUMERIC(10,2) AS avg_seconds_per_employee
+    FROM screentime.daily_department_stats dds
+    WHERE dds.stat_date BETWEEN p_date_from AND p_date_to
+    GROUP BY dds.department_id
     ORDER BY total_seconds DESC;
 END;
 $$ LANGUAGE plpgsql STABLE;
 
+-- Отчеты по использованию приложений читают только daily_employee_app_stats / daily_department_app_stats
+-- (не больше дней периода × числа приложений строк); признак is_productive берется из applications
+-- на момент запроса, поэтому его изменение сразу отражается в отчетах.
+
+CREATE OR REPLACE FUNCTION screentime.fn_employee_productivity(
+    p_employee_id INT,
+    p_date_from   DATE,
+    p_date_to     DATE
+)
+RETURNS TABLE (
+    employee_id          INT,
+    productive_seconds   BIGINT,
+    unproductive_seconds BIGINT,
+    total_seconds        BIGINT,
+    productivity_ratio   NUMERIC(5,4)
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        p_employee_id,
+        COALESCE(SUM(eas.total_seconds) FILTER (WHERE a.is_productive), 0)::BIGINT,
+        COALESCE(SUM(eas.total_seconds) FILTER (WHERE NOT a.is_productive), 0)::BIGINT,
+        SUM(eas.total_seconds)::BIGINT,
+        ROUND(COALESCE(SUM(eas.total_seconds) FILTER (WHERE a.is_productive), 0)::NUMERIC
+              / NULLIF(SUM(eas.total_seconds), 0), 4)::NUMERIC(5,4)
+    FROM screentime.daily_employee_app_stats eas
+    JOIN screentime.applications a ON a.id = eas.application_id
+    WHERE eas.employee_id = p_employee_id
+      AND eas.stat_date BETWEEN p_date_from AND p_date_to
+    HAVING COUNT(*) > 0;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION screentime.fn_department_productivity(
+    p_date_from     DATE,
+    p_date_to       DATE,
+    p_department_id INT DEFAULT NULL
+)
+RETURNS TABLE (
+    department_id        INT,
+    department_name      TEXT,
+    productive_seconds   BIGINT,
+    unproductive_seconds BIGINT,
+    total_seconds        BIGINT,
+    productivity_ratio   NUMERIC(5,4)
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        das.department_id,
+        d.name::TEXT,
+        COALESCE(SUM(das.total_seconds) FILTER (WHERE a.is_productive), 0)::BIGINT,
+        COALESCE(SUM(das.total_seconds) FILTER (WHERE NOT a.is_productive), 0)::BIGINT,
+        SUM(das.total_seconds)::BIGINT,
+        ROUND(COALESCE(SUM(das.total_seconds) FILTER (WHERE a.is_productive), 0)::NUMERIC
+              / NULLIF(SUM(das.total_seconds), 0), 4)::NUMERIC(5,4) AS ratio
+    FROM screentime.daily_department_app_stats das
+    JOIN screentime.applications a ON a.id = das.application_id
+    JOIN screentime.departments d ON d.id = das.department_id
+    WHERE das.stat_date BETWEEN p_date_from AND p_date_to
+      AND (p_department_id IS NULL OR das.department_id = p_department_id)
+    GROUP BY das.department_id, d.name
+    ORDER BY ratio DESC NULLS LAST, das.department_id;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Приложения по убыванию времени; share — доля в общем времени приложений за период (до LIMIT)
+CREATE OR REPLACE FUNCTION screentime.fn_employee_top_applications(
+    p_employee_id INT,
+    p_date_from   DATE,
+    p_date_to     DATE,
+    p_limit       INT DEFAULT 10
+)
+RETURNS TABLE (
+    application_id   INT,
+    application_name TEXT,
+    category         TEXT,
+    is_productive    BOOLEAN,
+    total_seconds    BIGINT,
+    sessions_count   BIGINT,
+    share            NUMERIC(5,4)
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT t.application_id, a.name::TEXT, a.category::TEXT, a.is_productive, t.seconds, t.cnt,
+           ROUND(t.seconds::NUMERIC / NULLIF(SUM(t.seconds) OVER (), 0), 4)::NUMERIC(5,4)
+    FROM (
+        SELECT eas.application_id, SUM(eas.total_seconds)::BIGINT AS seconds, SUM(eas.sessions_count)::BIGINT AS cnt
+        FROM screentime.daily_employee_app_stats eas
+        WHERE eas.employee_id = p_employee_id
+          AND eas.stat_date BETWEEN p_date_from AND p_date_to
+        GROUP BY eas.application_id
+    ) t
+    JOIN screentime.applications a ON a.id = t.application_id
+    ORDER BY t.seconds DESC, t.application_id
+    LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION screentime.fn_department_top_applications(
+    p_department_id INT,
+    p_date_from     DATE,
+    p_date_to       DATE,
+    p_limit         INT DEFAULT 10
+)
+RETURNS TABLE (
+    application_id   INT,
+    application_name TEXT,
+    category         TEXT,
+    is_productive    BOOLEAN,
+    total_seconds    BIGINT,
+    sessions_count   BIGINT,
+    share            NUMERIC(5,4)
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT t.application_id, a.name::TEXT, a.category::TEXT, a.is_productive, t.seconds, t.cnt,
+           ROUND(t.seconds::NUMERIC / NULLIF(SUM(t.seconds) OVER (), 0), 4)::NUMERIC(5,4)
+    FROM (
+        SELECT das.application_id, SUM(das.total_seconds)::BIGINT AS seconds, SUM(das.sessions_count)::BIGINT AS cnt
+        FROM screentime.daily_department_app_stats das
+        WHERE das.department_id = p_department_id
+          AND das.stat_date BETWEEN p_date_from AND p_date_to
+        GROUP BY das.application_id
+    ) t
+    JOIN screentime.applications a ON a.id = t.application_id
+    ORDER BY t.seconds DESC, t.application_id
+    LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
 -- Представления
 
 CREATE OR REPLACE VIEW screentime.v_employee_daily_stats AS
@@ -357,25 +1734,24 @@ CREATE OR REPLACE VIEW screentime.v_department_daily_stats AS
 SELECT
     d.id AS department_id,
     d.name AS department_name,
-    des.stat_date,
-    SUM(des.total_seconds) AS total_seconds,
-    SUM(des.sessions_count) AS sessions_count
-FROM screentime.daily_employee_stats des
-JOIN screentime.employees e ON e.id = des.employee_id
-JOIN screentime.departments d ON d.id = e.department_id
-GROUP BY d.id, d.name, des.stat_date;
+    dds.stat_date,
+    dds.total_seconds,
+    dds.sessions_count::BIGINT AS sessions_count
+FROM screentime.daily_department_stats dds
+JOIN screentime.departments d ON d.id = dds.department_id;
 
+-- Читает одну строку на сотрудника из employee_last_activity вместо DISTINCT ON по всем сессиям
 CREATE OR REPLACE VIEW screentime.v_employee_last_activity AS
-SELECT DISTINCT ON (e.id)
+SELECT
     e.id AS employee_id,
     e.first_name,
     e.last_name,
-    s.workstation_id,
+    la.workstation_id,
     w.hostname,
-    s.started_at,
-    s.ended_at,
-    s.active_seconds
-FROM screentime.employees e
-JOIN screentime.screen_sessions s ON s.employee_id = e.id
-JOIN screentime.workstations w ON w.id = s.workstation_id
-ORDER BY e.id, s.ended_at DESC;
\ No newline at end of file
+    la.started_at,
+    la.ended_at,
+    la.active_seconds
+FROM screentime.employee_last_activity la
+JOIN screentime.employees e ON e.id = la.employee_id
+JOIN screentime.workstations w ON w.id = la.workstation_id
+ORDER BY e.id;
\ No newline at end of file